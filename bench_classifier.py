@@ -0,0 +1,87 @@
+import argparse
+import copy
+import re
+import time
+
+from ds import CODE_PATTERNS, CodeClassifier
+from sample_emails import build_corpus
+
+
+def legacy_classify(table, text, subject, body):
+
+    if not any(re.search(p, text, re.IGNORECASE) for p in table['sender'].values()):
+        return None
+    if any(re.search(p, text, re.IGNORECASE) for p in table['exclude'].values()):
+        return None
+
+    patterns = [p for rules in table['codes'].values() for p in rules.values()]
+    for source in (body, subject):
+        for pattern in patterns:
+            match = re.search(pattern, source, re.IGNORECASE)
+            if match:
+                return match.group(1)
+    return None
+
+
+def compiled_classify(classifier, text, subject, body):
+
+    if not classifier.match_sender(text) or classifier.match_exclude(text):
+        return None
+    match = classifier.match_code(body) or classifier.match_code(subject)
+    return match['code'] if match else None
+
+
+def with_extra_locales(table, count):
+
+    table = copy.deepcopy(table)
+    for i in range(count):
+        table['codes'][f"x{i}"] = {
+            "labelled_code": rf"(?:kodu{i}|verifikim{i})\s*(?:eshte)?[:;\s]*(\d{{6}})",
+            "enter_code": rf"shkruani{i}\s*kodin[:;\s]*(\d{{6}})",
+        }
+    return table
+
+
+def run(classify, corpus, rounds):
+
+    best = float('inf')
+    hits = 0
+    for _ in range(rounds):
+        start = time.perf_counter()
+        hits = 0
+        for sample in corpus:
+            text = f"From: {sample['sender']}\nSubject: {sample['subject']}\n{sample['body']}"
+            code = classify(text, sample['subject'], sample['body'])
+            hits += code == sample['expected_code']
+        best = min(best, time.perf_counter() - start)
+    return best, hits
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Throughput benchmark for the email code classifier")
+    parser.add_argument('--size', type=int, default=2000, help="number of sample emails")
+    parser.add_argument('--rounds', type=int, default=5, help="timed rounds, best is reported")
+    parser.add_argument('--locales', default="0,8,32,128", help="extra synthetic locales to add, comma separated")
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.size)
+    print(f"{len(corpus)} emails, {sum(1 for s in corpus if s['expected_code'])} carrying a code")
+    print(f"{'locales':>8} {'rules':>6} {'legacy msg/s':>14} {'compiled msg/s':>15} {'speedup':>8} {'accuracy':>9}")
+
+    for extra in (int(n) for n in args.locales.split(',')):
+        table = with_extra_locales(CODE_PATTERNS, extra)
+        classifier = CodeClassifier(table)
+        rules = sum(len(r) for r in table['codes'].values())
+
+        legacy_time, _ = run(lambda t, s, b: legacy_classify(table, t, s, b), corpus, args.rounds)
+        compiled_time, hits = run(lambda t, s, b: compiled_classify(classifier, t, s, b), corpus, args.rounds)
+
+        print(
+            f"{len(table['codes']):>8} {rules:>6} {len(corpus) / legacy_time:>14,.0f} "
+            f"{len(corpus) / compiled_time:>15,.0f} {legacy_time / compiled_time:>7.1f}x {hits / len(corpus):>8.1%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
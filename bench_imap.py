@@ -0,0 +1,129 @@
+import argparse
+import asyncio
+import logging
+import random
+import re
+import tempfile
+import time
+
+import numpy as np
+
+import ds
+from imap_standin import IMAPStandIn
+from sample_emails import build_corpus, build_message
+
+
+class RecordingChannel:
+
+    name = "bench-codes"
+
+    def __init__(self):
+        self.received = {}
+        self.duplicates = 0
+
+    async def send(self, embed=None, **kwargs):
+        code = re.search(r"`(\d{6})`", embed.description).group(1)
+        if code in self.received:
+            self.duplicates += 1
+        self.received.setdefault(code, time.perf_counter())
+
+
+async def inject(server, corpus, rate, attachment_bytes, injected, rng):
+
+    for sample in corpus:
+        raw = build_message(sample, attachment_bytes, rng)
+        await asyncio.sleep(rng.expovariate(rate))
+        if sample['expected_code']:
+            injected[sample['expected_code']] = time.perf_counter()
+        await asyncio.to_thread(server.append, raw)
+
+
+async def run(args):
+
+    rng = random.Random(args.seed)
+    server = IMAPStandIn(drop_rate=args.drop_rate, eof_rate=args.eof_rate, latency=args.server_latency, seed=args.seed).start()
+
+    ds.USE_IMAP_IDLE = args.mode == 'idle'
+    ds.CHECK_INTERVAL = args.poll_interval
+    ds.IDLE_RECONNECT_DELAY = args.reconnect_delay
+
+    state_dir = tempfile.TemporaryDirectory(prefix="bench-imap-")
+    ds.DB_FILE = f"{state_dir.name}/bench_state.db"
+    bot = ds.ValorantBot()
+    await bot.open_state()
+    bot.mailboxes = ds.MailboxPool([{
+        'name': 'standin',
+        'address': 'bench@standin.local',
+        'password': 'standin',
+        'imap_server': server.host,
+        'imap_port': server.port,
+        'imap_ssl': False,
+    }])
+    channel = RecordingChannel()
+    bot.codes_channel = channel
+
+    corpus = build_corpus(int(args.rate * args.duration), code_ratio=args.code_ratio, seed=args.seed)
+    codes = rng.sample(range(1000000), len(corpus))
+    for sample, code in zip(corpus, codes):
+        if sample['expected_code']:
+            sample['body'] = sample['body'].replace(sample['expected_code'], f"{code:06d}")
+            sample['expected_code'] = f"{code:06d}"
+
+    injected = {}
+    watcher = asyncio.create_task(bot.check_email_for_codes())
+    await asyncio.sleep(1)
+
+    started = time.perf_counter()
+    await inject(server, corpus, args.rate, args.attachment_bytes, injected, rng)
+    deadline = time.perf_counter() + args.drain
+    while time.perf_counter() < deadline and not set(injected) <= set(channel.received):
+        await asyncio.sleep(0.05)
+    elapsed = time.perf_counter() - started
+
+    watcher.cancel()
+    await bot.mailboxes.close()
+    await bot.db.close()
+    state_dir.cleanup()
+    server.stop()
+
+    latencies = np.array([(channel.received[code] - sent) * 1000 for code, sent in injected.items() if code in channel.received])
+    raw_bytes = sum(len(m.raw) for m in server.messages.values())
+
+    print(f"mode={args.mode} messages={len(corpus)} codes={len(injected)} elapsed={elapsed:.1f}s")
+    print(f"delivered={len(latencies)} missing={len(injected) - len(latencies)} duplicates={channel.duplicates}")
+    if len(latencies):
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+        print(f"latency ms: p50={p50:.1f} p95={p95:.1f} p99={p99:.1f} max={latencies.max():.1f}")
+    print(f"imap bytes/message={server.bytes_sent / max(1, len(corpus)):,.0f} (full RFC822 avg {raw_bytes / max(1, len(corpus)):,.0f})")
+    print(f"imap commands={server.commands} faults injected={server.faults}")
+    for stage, histogram in bot.code_latency.items():
+        summary = histogram.summary()
+        if summary['count']:
+            print(f"  stage {stage:<13} p50={summary['p50'] * 1000:8.1f} ms  p95={summary['p95'] * 1000:8.1f} ms  p99={summary['p99'] * 1000:8.1f} ms")
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="End-to-end code latency benchmark against a local IMAP stand-in")
+    parser.add_argument('--mode', choices=('idle', 'poll'), default='idle')
+    parser.add_argument('--duration', type=float, default=20, help="seconds of mail injection")
+    parser.add_argument('--rate', type=float, default=2, help="messages per second (Poisson arrivals)")
+    parser.add_argument('--code-ratio', type=float, default=0.3, help="share of Riot code mails, the rest is noise")
+    parser.add_argument('--attachment-bytes', type=int, default=20000, help="attachment size added to every message")
+    parser.add_argument('--poll-interval', type=float, default=ds.CHECK_INTERVAL)
+    parser.add_argument('--drop-rate', type=float, default=0.0, help="probability of dropping the socket on a command")
+    parser.add_argument('--eof-rate', type=float, default=0.0, help="probability of EOF in the middle of a FETCH response")
+    parser.add_argument('--server-latency', type=float, default=0.0, help="seconds added before every server reply")
+    parser.add_argument('--reconnect-delay', type=float, default=ds.IDLE_RECONNECT_DELAY)
+    parser.add_argument('--drain', type=float, default=30, help="seconds to wait for outstanding codes")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logging.getLogger('ValorantTracker').setLevel(logging.WARNING)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
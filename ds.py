@@ -4,6 +4,9 @@ from discord import app_commands
 import asyncio
 import aiohttp
 import logging
+import logging.handlers
+import queue
+import atexit
 from PIL import Image, ImageDraw, ImageFont, ImageOps, ImageColor
 
 from pilmoji import Pilmoji
@@ -14,14 +17,22 @@ from datetime import datetime, timedelta
 import json
 import time
 import random
+import functools
+import itertools
+import heapq
+import sqlite3
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
 import numpy as np
 from zoneinfo import ZoneInfo
 import re
 import ssl
+import base64
+import quopri
 from imapclient import IMAPClient, exceptions as imap_exceptions
-import email
 from email.header import decode_header
-from email.utils import parsedate_to_datetime
 from dotenv import load_dotenv
 import traceback 
 import psutil 
@@ -48,24 +59,76 @@ EMAIL_PASSWORD = os.getenv("EMAIL_PASSWORD", CONFIG['email']['password'])
 IMAP_SERVER = os.getenv("IMAP_SERVER", CONFIG['email']['imap_server'])
 IMAP_PORT = int(os.getenv("IMAP_PORT", CONFIG['email']['imap_port']))
 CHECK_INTERVAL = CONFIG['email']['check_interval']
+USE_IMAP_IDLE = CONFIG['email'].get('use_idle', True)
+IDLE_RENEW_SECONDS = CONFIG['email'].get('idle_renew_seconds', 540)
+IDLE_CHECK_TIMEOUT = 5
+IDLE_RECONNECT_DELAY = 5
+MAILBOX_HEALTH_CHECK_SECONDS = CONFIG['email'].get('health_check_seconds', 60)
+MAILBOXES = CONFIG['email'].get('mailboxes') or [{'address': EMAIL_ADDRESS, 'password': EMAIL_PASSWORD}]
+EXECUTOR_SETTINGS = CONFIG['settings'].get('executors', {})
+LOOP_LAG_SETTINGS = CONFIG['settings'].get('loop_lag', {})
+WATCHDOG_SETTINGS = CONFIG['settings'].get('watchdog', {})
+HEARTBEAT_CHECK_SECONDS = WATCHDOG_SETTINGS.get('check_seconds', 5)
+STAGE_DEADLINES = {
+    'http': 30, 'fetch': 120, 'render': 30, 'publish': 60, 'leaderboard': 60,
+    'refresh': 180, 'imap_sync': 90, 'imap_idle': 60, 'mailbox': 180,
+    **WATCHDOG_SETTINGS.get('deadlines', {}),
+}
 CODE_MAX_AGE_MINUTES = CONFIG['email']['code_max_age_minutes']
+CODE_SENDER_FILTER = CONFIG['email'].get('sender_filter', 'riotgames.com')
+BODY_FETCH_BYTES = CONFIG['email'].get('body_fetch_bytes', 16384)
 CARD_WIDTH, CARD_HEIGHT = CONFIG['settings']['card_width'], CONFIG['settings']['card_height']
 UPDATE_INTERVAL = CONFIG['settings']['update_interval']
+PUBLISH_CONCURRENCY = CONFIG['settings'].get('publish_concurrency', 4)
+MATCH_HISTORY_SIZE = CONFIG['settings'].get('match_history_size', 5)
+PIPELINE_SETTINGS = CONFIG['settings'].get('pipeline', {})
+PERSIST_INTERVAL = CONFIG['settings'].get('persist_interval', 10)
+WEBHOOKS = CONFIG.get('webhooks', {})
+USE_WEBHOOKS = bool(WEBHOOKS.get('enabled'))
 CACHE_FILE = CONFIG['file_paths']['cache_file']
-CODES_HISTORY_FILE = CONFIG['file_paths']['codes_history_file']
+CODES_LOG_FILE = CONFIG['file_paths'].get('codes_log_file', 'codes_log.jsonl')
+CODE_DEDUPE_WINDOW_MINUTES = CONFIG['email'].get('dedupe_window_minutes', 60)
+MATCHES_FILE = CONFIG['file_paths'].get('matches_file', 'matches.jsonl')
+STATE_FILE = CONFIG['file_paths'].get('state_file', 'bot_state.json')
+DB_FILE = CONFIG['file_paths'].get('db_file', 'bot_state.db')
+METRICS_FILE = CONFIG['file_paths'].get('metrics_file', 'metrics.prom')
+LATENCY_WINDOW_MINUTES = CONFIG['settings'].get('latency_window_minutes', 60)
+CODE_LATENCY_STAGES = (
+    ('delivery', 'email', 'visible'),
+    ('imap_fetch', 'visible', 'fetched'),
+    ('classify', 'fetched', 'classified'),
+    ('discord_send', 'classified', 'sent'),
+    ('end_to_end', 'email', 'sent'),
+)
 HARDCODED_MESSAGE_IDS = CONFIG['messages']['hardcoded_slot_ids']
 RANK_COLORS = CONFIG['rank_colors']
 USERS = CONFIG['users']
+USERS_BY_NAME = {u['name'].lower(): u for u in USERS}
+USERS_BY_PUUID = {u['puuid']: u for u in USERS}
+USERS_INDEX = {u['puuid']: i for i, u in enumerate(USERS)}
+SNAPSHOT_FIELDS = (
+    'rank_name', 'elo', 'ranking_in_tier', 'current_tier', 'account_level',
+    'icon_url', 'agent_icon_url', 'last_agent_name', 'data_signature'
+)
+BAN_PATTERN = re.compile(r"^(.+?#\w+)\s+ban\s+(\d+)h", re.IGNORECASE)
 
 
+LOG_HANDLERS = [
+    logging.FileHandler("valorant_tracker.log", encoding='utf-8'),
+    logging.StreamHandler()
+]
+for log_handler in LOG_HANDLERS:
+    log_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+LOG_QUEUE = queue.SimpleQueue()
+LOG_LISTENER = logging.handlers.QueueListener(LOG_QUEUE, *LOG_HANDLERS, respect_handler_level=True)
+queue_handler = logging.handlers.QueueHandler(LOG_QUEUE)
+queue_handler.setFormatter(logging.Formatter('%(message)s'))
 logging.basicConfig(
     level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("valorant_tracker.log", encoding='utf-8'),
-        logging.StreamHandler()
-    ]
+    handlers=[queue_handler]
 )
+LOG_LISTENER.start()
+atexit.register(LOG_LISTENER.stop)
 logger = logging.getLogger('ValorantTracker')
 
 
@@ -158,6 +221,12 @@ def get_dominant_color(pil_img, default_color="#FFFFFF"):
 
 
 
+def rank_sort_key(user):
+    
+    score = (user.get('current_tier', 0) * 100) + user.get('ranking_in_tier', 0)
+    return score, -USERS_INDEX.get(user.get('puuid'), len(USERS_INDEX))
+
+
 def get_rome_time():
     
     try:
@@ -215,7 +284,7 @@ class AsyncAssetManager:
                     async with session.get(url, timeout=10) as response:
                         if response.status == 200:
                             data = await response.read()
-                            base_img = Image.open(BytesIO(data)).convert("RGBA")
+                            base_img = await RENDER_EXECUTOR.run(self._decode, data)
                             
                             self._cache[original_key] = base_img
                         else:
@@ -225,7 +294,7 @@ class AsyncAssetManager:
                 
                 if width and height:
                     
-                    final_img = base_img.resize((width, height), Image.Resampling.LANCZOS)
+                    final_img = await RENDER_EXECUTOR.run(base_img.resize, (width, height), Image.Resampling.LANCZOS)
                 else:
                     final_img = base_img
 
@@ -236,6 +305,10 @@ class AsyncAssetManager:
                 logger.error(f"Error processing asset {url}: {e}")
                 return None
 
+    @staticmethod
+    def _decode(data):
+        return Image.open(BytesIO(data)).convert("RGBA")
+
 
 ASSETS = AsyncAssetManager()
 
@@ -264,91 +337,758 @@ class FontManager:
 FONTS = FontManager()
 
 
-def create_leaderboard_image(users_data_list):
+class RollingHistogram:
     
-    if not users_data_list:
-        return None
+    def __init__(self, window_minutes, maxlen=2000):
+        self.window = window_minutes * 60
+        self._samples = deque(maxlen=maxlen)
+        self.total_count = 0
+        self.total_sum = 0.0
+
+    def record(self, seconds):
         
-    row_height = 70
-    header_height = 80
-    width = 650
-    total_height = header_height + (len(users_data_list) * row_height) + 20
-    
-    
-    base_color = (25, 25, 35)
-    img = Image.new('RGB', (width, total_height), base_color)
-    
-    
-    draw = ImageDraw.Draw(img)
-    
+        seconds = max(0.0, seconds)
+        self._samples.append((time.time(), seconds))
+        self.total_count += 1
+        self.total_sum += seconds
+
+    def values(self):
+        
+        cutoff = time.time() - self.window
+        while self._samples and self._samples[0][0] < cutoff:
+            self._samples.popleft()
+        return np.fromiter((value for _, value in self._samples), dtype=np.float64, count=len(self._samples))
+
+    def summary(self):
+        
+        values = self.values()
+        if not len(values):
+            return {'count': 0}
+        p50, p95, p99 = np.percentile(values, [50, 95, 99])
+        return {'count': len(values), 'p50': p50, 'p95': p95, 'p99': p99, 'max': values.max()}
+
+
+class WorkloadExecutor:
     
-    with Pilmoji(img, source=TwitterEmojiSource) as pilmoji:
+    def __init__(self, name, max_workers, max_queue=64):
+        self.name = name
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._slots = asyncio.Semaphore(max_workers + max_queue)
+        self._inflight = {}
+        self.peak_queued = 0
+        self.completed = 0
+        self.wait_time = RollingHistogram(LATENCY_WINDOW_MINUTES)
+        self.run_time = RollingHistogram(LATENCY_WINDOW_MINUTES)
+
+    @property
+    def queued(self):
+        return sum(1 for timing in list(self._inflight.values()) if 'started' not in timing)
+
+    @property
+    def active(self):
+        return sum(1 for timing in list(self._inflight.values()) if 'started' in timing and 'finished' not in timing)
+
+    @staticmethod
+    def _call(timing, fn, args):
         
+        timing['started'] = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            timing['finished'] = time.perf_counter()
+
+    async def run(self, fn, *args):
         
-        draw.rectangle([(0, 0), (width, header_height)], fill=(40, 40, 55))
+        timing = {'submitted': time.perf_counter()}
+        self._inflight[id(timing)] = timing
+        self.peak_queued = max(self.peak_queued, self.queued)
+        try:
+            
+            
+            async with self._slots:
+                return await asyncio.get_running_loop().run_in_executor(self._executor, self._call, timing, fn, args)
+        finally:
+            del self._inflight[id(timing)]
+            if 'started' in timing:
+                self.completed += 1
+                self.wait_time.record(timing['started'] - timing['submitted'])
+                self.run_time.record(timing.get('finished', timing['started']) - timing['started'])
+
+    def shutdown(self, wait=False):
+        self._executor.shutdown(wait=wait, cancel_futures=not wait)
+
+
+class StagedPipeline:
+
+    DONE = object()
+
+    def __init__(self, name, stages, queue_size=4, batch_sizes=None):
+        self.name = name
+        self.stages = stages
+        self.queue_size = max(1, int(queue_size))
+        self.batch_sizes = {stage: max(1, int(size)) for stage, size in (batch_sizes or {}).items()}
+        self.busy_time = {stage: RollingHistogram(LATENCY_WINDOW_MINUTES) for stage, _, _ in stages}
+        self.wait_time = {stage: RollingHistogram(LATENCY_WINDOW_MINUTES) for stage, _, _ in stages}
+        self.last_run = {}
+
+    async def run(self, items, context=None, feed_interval=0):
+        
+        queues = [asyncio.Queue(maxsize=self.queue_size) for _ in self.stages]
+        results = []
+        run_stats = {stage: {'count': 0, 'busy': 0.0, 'wait': 0.0} for stage, _, _ in self.stages}
+        
+        async def feed():
+            for i, item in enumerate(items):
+                if i and feed_interval:
+                    await asyncio.sleep(feed_interval)
+                await queues[0].put((item, time.perf_counter()))
+            for _ in range(self.stages[0][2]):
+                await queues[0].put(self.DONE)
+        
+        async def worker(index, stage, handler):
+            inbox = queues[index]
+            outbox = queues[index + 1] if index + 1 < len(queues) else None
+            batch_size = self.batch_sizes.get(stage)
+            done = False
+            while not done:
+                entries = []
+                while len(entries) < (batch_size or 1):
+                    entry = await inbox.get()
+                    if entry is self.DONE:
+                        done = True
+                        break
+                    entries.append(entry)
+                if not entries:
+                    return
+                
+                started = time.perf_counter()
+                items = [item for item, _ in entries]
+                try:
+                    if batch_size:
+                        outputs = await handler(items, context) or []
+                    else:
+                        output = await handler(items[0], context)
+                        outputs = [] if output is None else [output]
+                except Exception as e:
+                    logger.error(f"❌ Pipeline '{self.name}' stage {stage} error: {e}")
+                    outputs = []
+                finished = time.perf_counter()
+                
+                stats = run_stats[stage]
+                stats['count'] += len(entries)
+                stats['busy'] += finished - started
+                self.busy_time[stage].record(finished - started)
+                for _, queued_at in entries:
+                    stats['wait'] += started - queued_at
+                    self.wait_time[stage].record(started - queued_at)
+                
+                for item in outputs:
+                    if outbox is None:
+                        results.append(item)
+                    else:
+                        await outbox.put((item, finished))
+        
+        async def stage_group(index, stage, handler, concurrency):
+            await asyncio.gather(*(worker(index, stage, handler) for _ in range(concurrency)))
+            if index + 1 < len(queues):
+                for _ in range(self.stages[index + 1][2]):
+                    await queues[index + 1].put(self.DONE)
+        
+        start = time.perf_counter()
+        await asyncio.gather(
+            feed(),
+            *(stage_group(i, stage, handler, concurrency) for i, (stage, handler, concurrency) in enumerate(self.stages))
+        )
+        run_stats['wall'] = time.perf_counter() - start
+        self.last_run = run_stats
+        return results
+
+    def describe(self):
+        
+        if not self.last_run:
+            return "no run yet"
+        parts = [f"{self.last_run['wall']:.1f}s wall"]
+        for stage, _, concurrency in self.stages:
+            stats = self.last_run[stage]
+            parts.append(f"{stage}×{concurrency} busy {stats['busy']:.1f}s wait {stats['wait']:.1f}s ({stats['count']})")
+        return " | ".join(parts)
+
+
+class LoopLagMonitor:
+    
+    def __init__(self, interval=0.5, threshold=0.25, max_stalls=5, stack_depth=8):
+        self.interval = interval
+        self.threshold = threshold
+        self.stack_depth = stack_depth
+        self.lag = RollingHistogram(LATENCY_WINDOW_MINUTES, maxlen=int(LATENCY_WINDOW_MINUTES * 60 / interval) + 1)
+        self.stalls = deque(maxlen=max_stalls)
+        self.stall_count = 0
+        self._loop_thread = None
+        self._last_tick = time.monotonic()
+        self._sample = None
+        self._task = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    @property
+    def running(self):
+        return self._task is not None and not self._task.done()
+
+    def start(self):
         
+        if self.running:
+            return
+        self._loop_thread = threading.get_ident()
+        self._last_tick = time.monotonic()
+        self._task = asyncio.create_task(self._tick())
+        if not self._thread or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._watch, name="loop-lag-sampler", daemon=True)
+            self._thread.start()
+
+    def stop(self):
         
-        pilmoji.text((20, 25), "🏆 SERVER LEADERBOARD", fill="white", font=FONTS.header)
+        self._stop.set()
+        if self._task:
+            self._task.cancel()
+
+    async def _tick(self):
+        
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(0.0, now - expected)
+            self._last_tick = now
+            self.lag.record(lag)
+            
+            sample, self._sample = self._sample, None
+            if lag >= self.threshold:
+                self.stall_count += 1
+                stall = {'at': time.time(), 'lag': lag, 'task': None, 'stack': []}
+                if sample:
+                    stall.update(sample)
+                self.stalls.append(stall)
+                where = stall['stack'][-1] if stall['stack'] else "unknown frame"
+                logger.warning(f"🐢 Event loop blocked for {lag * 1000:.0f}ms (task {stall['task'] or '?'} at {where})")
+
+    def _watch(self):
+        
+        
+        while not self._stop.wait(self.threshold / 2):
+            if self._sample is not None or time.monotonic() - self._last_tick < self.interval + self.threshold:
+                continue
+            frame = sys._current_frames().get(self._loop_thread)
+            if frame is None:
+                continue
+            full_stack = traceback.extract_stack(frame)
+            stack = full_stack[-self.stack_depth:]
+            self._sample = {
+                'task': self._entry_point(full_stack),
+                'stack': [f"{os.path.basename(f.filename)}:{f.lineno} {f.name}" for f in stack],
+                'code': stack[-1].line if stack else None,
+            }
+
+    @staticmethod
+    def _entry_point(stack):
         
+        handle_run = os.path.join(os.path.dirname(asyncio.__file__), "events.py")
+        for i, f in enumerate(stack[:-1]):
+            if f.filename == handle_run and f.name == '_run':
+                return stack[i + 1].name
+        return None
+
+    def summary(self):
+        return self.lag.summary()
+
+    def describe_stall(self, stall, limit=900):
+        
+        age = int(time.time() - stall['at'])
+        lines = [f"{stall['lag'] * 1000:.0f}ms, {age}s ago, task `{stall['task'] or '?'}`"]
+        if stall['stack']:
+            stack = "\n".join(reversed(stall['stack']))
+            if stall.get('code'):
+                stack = f"{stall['code']}\n{stack}"
+            lines.append(f"```\n{stack[:limit]}\n```")
+        return "\n".join(lines)
+
+
+class HeartbeatMonitor:
+    
+    def __init__(self, deadlines, default_deadline=120, max_events=10):
+        self.deadlines = deadlines
+        self.default_deadline = default_deadline
+        self.units = {}
+        self.heartbeats = {}
+        self.stage_time = {}
+        self.stalls = deque(maxlen=max_events)
+        self.stall_count = 0
+        self._ids = itertools.count()
+
+    def beat(self, stage):
+        self.heartbeats[stage] = time.time()
+
+    def age(self, stage):
         
-        update_time = get_rome_time().strftime("%H:%M")
-        draw.text((width - 100, 30), f"Agg: {update_time}", fill="#888888", font=FONTS.stats)
+        last = self.heartbeats.get(stage)
+        return None if last is None else time.time() - last
 
-        for idx, user in enumerate(users_data_list):
-            y = header_height + (idx * row_height) + 10
-            
-            
-            is_first = (idx == 0)
-            is_last = (idx == len(users_data_list) - 1) and (len(users_data_list) > 1)
-            
-            row_bg = (35, 35, 45)
-            text_color = (220, 220, 220)
-            rank_text_color = get_rank_color(user['rank'])
-            
-            if is_first:
-                row_bg = (255, 215, 0)  
-                text_color = (0, 0, 0)
-                
-                rank_text_color = (50, 50, 50) 
-            elif is_last:
-                row_bg = (80, 20, 20)   
-                text_color = (255, 200, 200)
-            
-            
-            draw.rounded_rectangle([(10, y), (width-10, y + row_height - 5)], radius=10, fill=row_bg)
-            
+    def in_flight(self, stage=None):
+        return [u for u in self.units.values() if stage is None or u['stage'] == stage]
+
+    async def run(self, stage, label, fn, *args, retries=0, on_stall=None):
+        
+        deadline = self.deadlines.get(stage, self.default_deadline)
+        for attempt in range(retries + 1):
+            key = next(self._ids)
+            unit = {
+                'stage': stage, 'label': label, 'attempt': attempt + 1, 'started': time.time(),
+                'deadline': deadline, 'stalled': False, 'on_stall': on_stall,
+                'task': asyncio.ensure_future(fn(*args)),
+            }
+            self.units[key] = unit
+            try:
+                try:
+                    await asyncio.wait({unit['task']})
+                except asyncio.CancelledError:
+                    unit['task'].cancel()
+                    raise
+            finally:
+                del self.units[key]
+                self.stage_time.setdefault(stage, RollingHistogram(LATENCY_WINDOW_MINUTES)).record(time.time() - unit['started'])
             
-            pos_text = f"#{idx + 1}"
-            draw.text((30, y + 22), pos_text, fill=text_color, font=FONTS.name)
+            if not unit['task'].cancelled():
+                result = unit['task'].result()
+                self.beat(stage)
+                return result
+            if not unit['stalled']:
+                raise asyncio.CancelledError()
             
+            if attempt < retries:
+                logger.warning(f"🔁 Retrying stalled {stage} unit '{label}' (attempt {attempt + 2}/{retries + 1})")
+        
+        raise asyncio.TimeoutError(f"{stage} unit '{label}' stalled past its {deadline}s deadline ({retries + 1} attempt(s))")
+
+    def reap(self):
+        
+        now = time.time()
+        reaped = []
+        for unit in list(self.units.values()):
+            if unit['stalled'] or now - unit['started'] <= unit['deadline']:
+                continue
             
-            icon_x = 100
-            if user.get('rank_icon'):
+            unit['stalled'] = True
+            self.stall_count += 1
+            if unit['on_stall']:
                 try:
-                    
-                    
-                    
-                    
-                    
-                    img.paste(user['rank_icon'], (icon_x, y + 8), user['rank_icon'])
+                    unit['on_stall']()
                 except Exception as e:
-                    logger.error(f"Leaderboard icon error {user['name']}: {e}")
-            
-            
-            name_x = 170
-            display_name = user['name']
-            if is_first: display_name += " 👑"
-            if is_last: display_name += " 🤡"
+                    logger.error(f"❌ Stall handler error for {unit['stage']} '{unit['label']}': {e}")
+            unit['task'].cancel()
+            
+            event = {'at': now, 'stage': unit['stage'], 'label': unit['label'], 'elapsed': now - unit['started'], 'attempt': unit['attempt']}
+            self.stalls.append(event)
+            reaped.append(event)
+            logger.warning(f"⏰ {unit['stage']} unit '{unit['label']}' stalled for {event['elapsed']:.0f}s (deadline {unit['deadline']}s), cancelled")
+        return reaped
+
+    def expire(self, label):
+        
+        for unit in self.units.values():
+            if unit['label'] == label:
+                unit['deadline'] = 0
+        return self.reap()
+
+    def stage_lines(self):
+        
+        lines = []
+        for stage in sorted(set(self.stage_time) | {u['stage'] for u in self.units.values()}):
+            summary = self.stage_time[stage].summary() if stage in self.stage_time else {'count': 0}
+            timing = f"p50 {summary['p50']:.1f}s · p95 {summary['p95']:.1f}s · max {summary['max']:.1f}s" if summary['count'] else "no samples"
+            busy = self.in_flight(stage)
+            oldest = max((time.time() - u['started'] for u in busy), default=0)
+            flight = f" · {len(busy)} in flight (oldest {oldest:.0f}s)" if busy else ""
+            lines.append(f"`{stage}` {timing}{flight}")
+        return lines
+
+
+IMAP_EXECUTOR = WorkloadExecutor("imap", max(EXECUTOR_SETTINGS.get('imap', 0), len(MAILBOXES) + 2))
+RENDER_EXECUTOR = WorkloadExecutor("render", EXECUTOR_SETTINGS.get('render', 2))
+IO_EXECUTOR = WorkloadExecutor("io", EXECUTOR_SETTINGS.get('io', 2))
+
+
+class StateDB:
+    
+    SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS kv (namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, PRIMARY KEY (namespace, key))",
+        "CREATE TABLE IF NOT EXISTS matches (puuid TEXT NOT NULL, match_id TEXT NOT NULL, record TEXT NOT NULL, game_start INTEGER NOT NULL DEFAULT 0, PRIMARY KEY (puuid, match_id))",
+        "CREATE TABLE IF NOT EXISTS codes (id INTEGER PRIMARY KEY AUTOINCREMENT, code TEXT NOT NULL, uid TEXT, email_ts REAL, ts REAL NOT NULL)",
+        "CREATE INDEX IF NOT EXISTS codes_ts ON codes (ts)",
+    )
+    
+    KV_DELETE = "DELETE FROM kv WHERE namespace = ? AND key = ?"
+    KV_UPSERT = "INSERT OR REPLACE INTO kv (namespace, key, value) VALUES (?, ?, ?)"
+    KV_SELECT = "SELECT key, value FROM kv WHERE namespace = ?"
+    MATCH_INSERT = "INSERT OR IGNORE INTO matches (puuid, match_id, record, game_start) VALUES (?, ?, ?, ?)"
+    MATCH_SELECT = "SELECT record FROM matches ORDER BY game_start"
+    CODE_INSERT = "INSERT INTO codes (code, uid, email_ts, ts) VALUES (?, ?, ?, ?)"
+    CODE_SELECT = "SELECT code, uid, email_ts, ts FROM codes WHERE ts >= ? ORDER BY ts"
+    CODE_PRUNE = "DELETE FROM codes WHERE ts < ?"
+
+    def __init__(self, path):
+        self.path = path
+        self.executor = WorkloadExecutor("state-db", 1)
+        self._pending = []
+        self._write_lock = threading.Lock()
+        self.conn = None
+        self.commits = 0
+
+    async def open(self):
+        
+        if self.conn is None:
+            await self.run(self._open)
+            await self.run(self._import_legacy_files)
+
+    def _open(self):
+        
+        self.conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, cached_statements=64)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        for statement in self.SCHEMA:
+            self.conn.execute(statement)
+        logger.info(f"✅ State DB opened ({self.path}, WAL)")
+
+    async def run(self, fn, *args):
+        return await self.executor.run(fn, *args)
+
+    async def fetch(self, sql, params=()):
+        return await self.run(lambda: self.conn.execute(sql, params).fetchall())
+
+    def queue(self, sql, params):
+        self._pending.append((sql, params))
+
+    @property
+    def pending(self):
+        return len(self._pending)
+
+    def _commit(self, batch):
+        
+        with self._write_lock:
+            self.conn.execute("BEGIN")
+            try:
+                for sql, group in itertools.groupby(batch, key=lambda item: item[0]):
+                    rows = [params for _, params in group]
+                    if sql == self.KV_UPSERT:
+                        rows = [(namespace, key, json.dumps(value)) for namespace, key, value in rows]
+                    self.conn.executemany(sql, rows)
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    async def commit(self):
+        
+        if not self._pending:
+            return 0
+        batch, self._pending = self._pending, []
+        try:
+            await self.run(self._commit, batch)
+        except Exception as e:
+            self._pending = batch + self._pending
+            logger.error(f"❌ State DB commit error: {e}")
+            return 0
+        self.commits += 1
+        return len(batch)
+
+    async def close(self):
+        
+        await self.commit()
+        if self.conn:
+            await self.run(self.conn.close)
+            self.conn = None
+        self.executor.shutdown(wait=True)
+
+    def _import_legacy_files(self):
+        
+        if self.conn.execute(self.KV_SELECT, ('meta',)).fetchall():
+            return
+        
+        batch = []
+        for path, namespace in ((CACHE_FILE, 'messages'), (STATE_FILE, 'state')):
+            try:
+                if os.path.exists(path):
+                    with open(path, 'r', encoding='utf-8') as f:
+                        for key, value in json.load(f).items():
+                            batch.append((self.KV_UPSERT, (namespace, key, value)))
+                    logger.info(f"📦 Imported legacy {path} into state DB")
+            except Exception as e:
+                logger.error(f"❌ Legacy import error for {path}: {e}")
+        
+        for path, sql, to_params in ((MATCHES_FILE, self.MATCH_INSERT, self._match_params), (CODES_LOG_FILE, self.CODE_INSERT, self._code_params)):
+            try:
+                if os.path.exists(path):
+                    with open(path, 'r', encoding='utf-8') as f:
+                        for line in f:
+                            try:
+                                batch.append((sql, to_params(json.loads(line))))
+                            except (json.JSONDecodeError, KeyError):
+                                continue
+                    logger.info(f"📦 Imported legacy {path} into state DB")
+            except Exception as e:
+                logger.error(f"❌ Legacy import error for {path}: {e}")
+        
+        batch.append((self.KV_UPSERT, ('meta', 'legacy_imported', time.time())))
+        self._commit(batch)
+
+    @staticmethod
+    def _match_params(record):
+        return (record['puuid'], str(record['match_id']), json.dumps(record), int(record.get('game_start') or 0))
+
+    @staticmethod
+    def _code_params(entry):
+        return (entry['code'], entry.get('uid') and str(entry['uid']), entry.get('email_ts'), entry['ts'])
+
+
+class StatsEngine:
+    
+    RESULT_CODES = {'W': 1, 'L': -1, 'D': 0}
+
+    def __init__(self, db):
+        self.db = db
+        self._seen = set()
+        self._puuids = []
+        self._results = []
+        self._rr = []
+        self._rr_known = []
+        self._agents = []
+        self._starts = []
+        self._competitive = []
+        self._version = 0
+        self._cache_version = -1
+        self._cache = {}
+
+    async def load(self):
+        
+        loaded = 0
+        try:
+            for (record,) in await self.db.fetch(StateDB.MATCH_SELECT):
+                if self._append(json.loads(record)):
+                    loaded += 1
+            logger.info(f"✅ Match store loaded ({loaded} matches)")
+        except Exception as e:
+            logger.error(f"❌ Match store loading error: {e}")
+
+    def _append(self, record):
+        
+        key = (record.get('puuid'), record.get('match_id'))
+        if not key[0] or not key[1] or key in self._seen:
+            return False
+        self._seen.add(key)
+        self._puuids.append(key[0])
+        self._results.append(self.RESULT_CODES.get(record.get('result'), 0))
+        self._rr.append(int(record.get('rr_change') or 0))
+        self._rr_known.append(record.get('rr_change') is not None)
+        self._agents.append(record.get('agent') or 'Unknown')
+        self._starts.append(int(record.get('game_start') or 0))
+        self._competitive.append(bool(record.get('competitive')))
+        self._version += 1
+        return True
+
+    def add_match(self, record):
+        
+        if not self._append(record):
+            return False
+        self.db.queue(StateDB.MATCH_INSERT, (record['puuid'], str(record['match_id']), json.dumps(record), int(record.get('game_start') or 0)))
+        logger.info(f"📥 Stored match {record['match_id']} for {record['puuid']}")
+        return True
+
+    def __len__(self):
+        return len(self._puuids)
+
+    def compute(self):
+        
+        if self._cache_version == self._version:
+            return self._cache
+
+        if not self._puuids:
+            self._cache = {}
+            self._cache_version = self._version
+            return self._cache
+
+        puuid_names, acc = np.unique(np.array(self._puuids), return_inverse=True)
+        agent_names, agent = np.unique(np.array(self._agents), return_inverse=True)
+        result = np.array(self._results, dtype=np.int8)
+        rr = np.array(self._rr, dtype=np.int32)
+        start = np.array(self._starts, dtype=np.int64)
+        competitive = np.array(self._competitive, dtype=bool)
+        rr_known = competitive & np.array(self._rr_known, dtype=bool)
+        n_acc, n_agents = len(puuid_names), len(agent_names)
+
+        games = np.bincount(acc, minlength=n_acc)
+        wins = np.bincount(acc, weights=(result == 1), minlength=n_acc)
+        losses = np.bincount(acc, weights=(result == -1), minlength=n_acc)
+        decided = wins + losses
+        win_rate = np.divide(wins * 100, decided, out=np.zeros(n_acc), where=decided > 0)
+
+        rr_games = np.bincount(acc, weights=rr_known, minlength=n_acc)
+        rr_total = np.bincount(acc, weights=rr * rr_known, minlength=n_acc)
+        avg_rr = np.divide(rr_total, rr_games, out=np.zeros(n_acc), where=rr_games > 0)
+
+        agent_counts = np.bincount(acc * n_agents + agent, minlength=n_acc * n_agents).reshape(n_acc, n_agents)
+        top_agent = agent_counts.argmax(axis=1)
+        top_agent_games = agent_counts[np.arange(n_acc), top_agent]
+
+        order = np.lexsort((start, acc))
+        s_acc, s_res = acc[order], result[order]
+        new_run = np.ones(len(order), dtype=bool)
+        new_run[1:] = (s_acc[1:] != s_acc[:-1]) | (s_res[1:] != s_res[:-1])
+        run_id = np.cumsum(new_run) - 1
+        run_len = np.bincount(run_id)
+        run_start = np.flatnonzero(new_run)
+        run_acc, run_res = s_acc[run_start], s_res[run_start]
+
+        last_idx = np.flatnonzero(np.append(s_acc[1:] != s_acc[:-1], True))
+        current_streak = run_len[run_id[last_idx]] * s_res[last_idx]
+
+        best_win_streak = np.zeros(n_acc, dtype=np.int64)
+        win_runs = run_res == 1
+        np.maximum.at(best_win_streak, run_acc[win_runs], run_len[win_runs])
+
+        self._cache = {
+            puuid: {
+                'games': int(games[i]),
+                'wins': int(wins[i]),
+                'losses': int(losses[i]),
+                'win_rate': float(win_rate[i]),
+                'avg_rr': float(avg_rr[i]),
+                'top_agent': str(agent_names[top_agent[i]]),
+                'top_agent_games': int(top_agent_games[i]),
+                'current_streak': int(current_streak[i]),
+                'best_win_streak': int(best_win_streak[i]),
+            }
+            for i, puuid in enumerate(puuid_names.tolist())
+        }
+        self._cache_version = self._version
+        return self._cache
+
+
+LEADERBOARD_ROW_HEIGHT = 70
+LEADERBOARD_HEADER_HEIGHT = 80
+LEADERBOARD_WIDTH = 650
+LEADERBOARD_BASE_COLOR = (25, 25, 35)
+
+
+def draw_leaderboard_header(draw, pilmoji):
+    
+    width = LEADERBOARD_WIDTH
+    draw.rectangle([(0, 0), (width, LEADERBOARD_HEADER_HEIGHT)], fill=(40, 40, 55))
+    
+    
+    pilmoji.text((20, 25), "🏆 SERVER LEADERBOARD", fill="white", font=FONTS.header)
+    
+    
+    update_time = get_rome_time().strftime("%H:%M")
+    draw.text((width - 100, 30), f"Agg: {update_time}", fill="#888888", font=FONTS.stats)
+
+
+def draw_leaderboard_row(img, draw, pilmoji, idx, user, count):
+    
+    width = LEADERBOARD_WIDTH
+    row_height = LEADERBOARD_ROW_HEIGHT
+    y = LEADERBOARD_HEADER_HEIGHT + (idx * row_height) + 10
+    
+    
+    is_first = (idx == 0)
+    is_last = (idx == count - 1) and (count > 1)
+    
+    row_bg = (35, 35, 45)
+    text_color = (220, 220, 220)
+    rank_text_color = get_rank_color(user['rank'])
+    
+    if is_first:
+        row_bg = (255, 215, 0)  
+        text_color = (0, 0, 0)
+        
+        rank_text_color = (50, 50, 50) 
+    elif is_last:
+        row_bg = (80, 20, 20)   
+        text_color = (255, 200, 200)
+    
+    
+    draw.rectangle([(0, y), (width, y + row_height - 1)], fill=LEADERBOARD_BASE_COLOR)
+    draw.rounded_rectangle([(10, y), (width-10, y + row_height - 5)], radius=10, fill=row_bg)
+    
+    
+    pos_text = f"#{idx + 1}"
+    draw.text((30, y + 22), pos_text, fill=text_color, font=FONTS.name)
+    
+    
+    icon_x = 100
+    if user.get('rank_icon'):
+        try:
             
             
-            pilmoji.text((name_x, y + 22), display_name, fill=text_color, font=FONTS.name)
             
             
-            stats_text = f"{user['rank']} - {user['elo']} RR"
             
-            stats_width = draw.textlength(stats_text, font=FONTS.stats)
-            draw.text((width - stats_width - 40, y + 25), stats_text, fill=rank_text_color, font=FONTS.stats)
+            img.paste(user['rank_icon'], (icon_x, y + 8), user['rank_icon'])
+        except Exception as e:
+            logger.error(f"Leaderboard icon error {user['name']}: {e}")
+    
+    
+    name_x = 170
+    display_name = user['name']
+    if is_first: display_name += " 👑"
+    if is_last: display_name += " 🤡"
+    
+    
+    pilmoji.text((name_x, y + 22), display_name, fill=text_color, font=FONTS.name)
+    
+    
+    stats_text = f"{user['rank']} - {user['elo']} RR"
+    
+    stats_width = draw.textlength(stats_text, font=FONTS.stats)
+    draw.text((width - stats_width - 40, y + 25), stats_text, fill=rank_text_color, font=FONTS.stats)
+
+
+def create_leaderboard_image(users_data_list):
+    
+    if not users_data_list:
+        return None
+        
+    total_height = LEADERBOARD_HEADER_HEIGHT + (len(users_data_list) * LEADERBOARD_ROW_HEIGHT) + 20
+    
+    
+    img = Image.new('RGB', (LEADERBOARD_WIDTH, total_height), LEADERBOARD_BASE_COLOR)
+    
+    
+    draw = ImageDraw.Draw(img)
+    
+    
+    with Pilmoji(img, source=TwitterEmojiSource) as pilmoji:
+        
+        
+        draw_leaderboard_header(draw, pilmoji)
+
+        for idx, user in enumerate(users_data_list):
+            draw_leaderboard_row(img, draw, pilmoji, idx, user, len(users_data_list))
+
+    bio = BytesIO()
+    img.save(bio, format="PNG", optimize=True)
+    bio.seek(0)
+    return bio
 
+
+def patch_leaderboard_image(png_bytes, users_data_list, idx):
+    
+    img = Image.open(BytesIO(png_bytes)).convert('RGB')
+    draw = ImageDraw.Draw(img)
+    
+    with Pilmoji(img, source=TwitterEmojiSource) as pilmoji:
+        draw_leaderboard_header(draw, pilmoji)
+        draw_leaderboard_row(img, draw, pilmoji, idx, users_data_list[idx], len(users_data_list))
+    
     bio = BytesIO()
     img.save(bio, format="PNG", optimize=True)
     bio.seek(0)
@@ -499,33 +1239,881 @@ def create_rank_card(user_data, rank_name="ERROR", elo=0, ranking_in_tier=0, ran
     return bio
 
 
-class ValorantBot(commands.Bot):
-    def __init__(self):
-        
-        intents = discord.Intents.default()
-        intents.messages = True
-        intents.message_content = True
-        intents.members = True 
-        super().__init__(
-            command_prefix='!',  
-            intents=intents,
-            help_command=None
-        )
+class DiscordPublisher:
+    
+    def __init__(self, concurrency):
+        self.concurrency = max(1, int(concurrency))
+        self.last_duration = 0.0
+        self._resume_at = 0.0
+
+    def pause(self, seconds):
         
+        self._resume_at = max(self._resume_at, time.monotonic() + seconds)
+
+    async def wait_ready(self):
         
-        self.message_cache = self.load_message_cache()
-        self.session = None
-        self.is_updating = False
-        self.channel = None
+        delay = self._resume_at - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def run(self, jobs):
         
+        results = [None] * len(jobs)
+        if not jobs:
+            self.last_duration = 0.0
+            return results
         
-        self.email_client = None
-        self.email_lock = asyncio.Lock() 
-        self.codes_channel = None
-        self.last_email_check_time = 0 
+        queue = asyncio.Queue()
+        for idx, job in enumerate(jobs):
+            queue.put_nowait((idx, job))
         
+        async def worker():
+            while True:
+                try:
+                    idx, job = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                try:
+                    await self.wait_ready()
+                    results[idx] = await job()
+                except Exception as e:
+                    logger.error(f"❌ Publish job error: {e}")
+                finally:
+                    queue.task_done()
+        
+        start = time.monotonic()
+        await asyncio.gather(*(worker() for _ in range(min(self.concurrency, len(jobs)))))
+        self.last_duration = time.monotonic() - start
+        return results
+
+
+class WebhookSink:
+    
+    def __init__(self, urls, pool_size=10):
+        self.urls = {kind: url for kind, url in urls.items() if url}
+        self.pool_size = pool_size
+        self.session = None
+        self.webhooks = {}
+
+    async def start(self):
         
-        self.codes_history = self.load_codes_history()
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(limit=self.pool_size)
+            self.session = aiohttp.ClientSession(connector=connector)
+            self.webhooks = {}
+            for kind, url in self.urls.items():
+                try:
+                    self.webhooks[kind] = discord.Webhook.from_url(url, session=self.session)
+                except ValueError as e:
+                    logger.error(f"❌ Invalid {kind} webhook URL, falling back to bot messages: {e}")
+            logger.info(f"✅ Webhook publishing enabled for: {', '.join(self.webhooks) or 'nothing'}")
+
+    def get(self, kind):
+        return self.webhooks.get(kind)
+
+    async def close(self):
+        
+        if self.session and not self.session.closed:
+            await self.session.close()
+            logger.info("✅ Webhook session closed")
+
+
+class WriteBehindStore:
+    
+    def __init__(self, db, namespace, label):
+        self.db = db
+        self.namespace = namespace
+        self.label = label
+        self.data = {}
+        self._stored = set()
+        self._dirty_keys = set()
+        self._dirty_all = False
+        self.writes = 0
+
+    async def load(self):
+        
+        try:
+            rows = await self.db.fetch(StateDB.KV_SELECT, (self.namespace,))
+            if rows:
+                logger.info(f"✅ {self.label} loaded from state DB")
+            self.data.update((key, json.loads(value)) for key, value in rows)
+            self._stored = {key for key, _ in rows}
+        except Exception as e:
+            logger.error(f"❌ {self.label} loading error: {e}")
+
+    @property
+    def dirty(self):
+        return self._dirty_all or bool(self._dirty_keys)
+
+    def mark_dirty(self, *keys):
+        
+        if keys:
+            self._dirty_keys.update(str(key) for key in keys)
+        else:
+            self._dirty_all = True
+
+    def flush(self):
+        
+        if not self.dirty:
+            return False
+        current = {str(key): value for key, value in self.data.items()}
+        changed = set(current) if self._dirty_all else self._dirty_keys & set(current)
+        for key in self._stored - set(current):
+            self.db.queue(StateDB.KV_DELETE, (self.namespace, key))
+        for key in changed:
+            self.db.queue(StateDB.KV_UPSERT, (self.namespace, key, current[key]))
+        self._stored = set(current)
+        self._dirty_keys = set()
+        self._dirty_all = False
+        self.writes += 1
+        return True
+
+
+class CodeDedupeLog:
+    
+    COMPACT_THRESHOLD = 200
+
+    def __init__(self, db, window_minutes):
+        self.db = db
+        self.window = window_minutes * 60
+        self._entries = deque()
+        self._codes = {}
+        self._uids = {}
+        self._stale_lines = 0
+
+    async def load(self):
+        
+        try:
+            cutoff = time.time() - self.window
+            for code, uid, email_ts, ts in await self.db.fetch(StateDB.CODE_SELECT, (cutoff,)):
+                self._index({'code': code, 'uid': uid, 'email_ts': email_ts, 'ts': ts})
+            logger.info(f"✅ Code dedupe log loaded ({len(self._entries)} codes in window)")
+            self.compact()
+        except Exception as e:
+            logger.error(f"❌ Code dedupe log loading error: {e}")
+
+    def _index(self, entry):
+        self._entries.append(entry)
+        self._codes[entry['code']] = entry['ts']
+        if entry.get('uid') is not None:
+            self._uids[str(entry['uid'])] = entry['ts']
+
+    def prune(self, now=None):
+        
+        cutoff = (now or time.time()) - self.window
+        while self._entries and self._entries[0]['ts'] < cutoff:
+            entry = self._entries.popleft()
+            if self._codes.get(entry['code']) == entry['ts']:
+                del self._codes[entry['code']]
+            uid = str(entry.get('uid'))
+            if self._uids.get(uid) == entry['ts']:
+                del self._uids[uid]
+            self._stale_lines += 1
+
+    def seen(self, code, uid=None):
+        
+        self.prune()
+        if uid is not None and str(uid) in self._uids:
+            return True
+        return code in self._codes
+
+    def add(self, code, uid=None, email_ts=None):
+        
+        entry = {'code': code, 'uid': uid, 'email_ts': email_ts, 'ts': time.time()}
+        self._index(entry)
+        self.db.queue(StateDB.CODE_INSERT, (code, None if uid is None else str(uid), email_ts, entry['ts']))
+        logger.info(f"💾 Code {code} appended to dedupe log")
+        
+        self.prune()
+        if self._stale_lines >= self.COMPACT_THRESHOLD:
+            self.compact()
+
+    def compact(self):
+        
+        self.db.queue(StateDB.CODE_PRUNE, (time.time() - self.window,))
+        if self._stale_lines:
+            logger.info(f"🧹 Code dedupe log compacted ({self._stale_lines} stale entries dropped)")
+        self._stale_lines = 0
+
+    def __len__(self):
+        self.prune()
+        return len(self._entries)
+
+
+class StateStore(WriteBehindStore):
+    
+    def __init__(self, db):
+        super().__init__(db, 'state', "State store")
+
+    async def load(self):
+        
+        await super().load()
+        self.seed_from_config()
+        self.migrate_email_sync()
+
+    def seed_from_config(self):
+        
+        changed = False
+        slots = self.data.setdefault('slots', {})
+        for i, msg_id in enumerate(HARDCODED_MESSAGE_IDS):
+            if msg_id and str(i) not in slots:
+                slots[str(i)] = msg_id
+                changed = True
+        if LEADERBOARD_MESSAGE_ID and 'leaderboard_message_id' not in self.data:
+            self.data['leaderboard_message_id'] = LEADERBOARD_MESSAGE_ID
+            changed = True
+        if changed:
+            self.mark_dirty('slots', 'leaderboard_message_id')
+            logger.info("✅ State store seeded with message IDs from config")
+
+    def migrate_email_sync(self):
+        
+        sync = self.data.get('email_sync')
+        if not isinstance(sync, dict) or not ({'uidvalidity', 'last_uid'} & set(sync)):
+            return
+        sync.pop('uidvalidity', None)
+        sync.pop('last_uid', None)
+        self.mark_dirty('email_sync')
+        logger.info("✅ Single-inbox sync cursor dropped, mailboxes will rebuild their own baseline")
+
+    def section(self, name):
+        return self.data.setdefault(name, {})
+
+    def get_slot_message_id(self, slot):
+        return self.data.get('slots', {}).get(str(slot))
+
+    def set_slot_message_id(self, slot, message_id):
+        
+        slots = self.data.setdefault('slots', {})
+        if slots.get(str(slot)) == message_id:
+            return
+        slots[str(slot)] = message_id
+        self.mark_dirty('slots')
+        logger.info(f"📌 Slot #{slot+1} now owned by message {message_id}")
+
+    def get_leaderboard_message_id(self):
+        return self.data.get('leaderboard_message_id')
+
+    def set_leaderboard_message_id(self, message_id):
+        
+        if self.data.get('leaderboard_message_id') == message_id:
+            return
+        self.data['leaderboard_message_id'] = message_id
+        self.mark_dirty('leaderboard_message_id')
+        logger.info(f"📌 Leaderboard now owned by message {message_id}")
+
+
+class BanRegistry:
+    
+    def __init__(self, store):
+        self.store = store
+        self.bans = {}
+        self._heap = []
+        self._timer = None
+        self._on_expire = None
+
+    def load(self):
+        
+        self.bans = self.store.section('bans')
+        self._heap = [(ban['expires_at'], puuid) for puuid, ban in self.bans.items()]
+        heapq.heapify(self._heap)
+
+    @staticmethod
+    def parse(message):
+        
+        match = BAN_PATTERN.search(message.content or "")
+        if not match:
+            return None
+        
+        target_user = USERS_BY_NAME.get(match.group(1).strip().lower())
+        if not target_user:
+            return None
+        
+        created_at = message.created_at
+        if created_at.tzinfo is None:
+            created_at = created_at.replace(tzinfo=ZoneInfo("UTC"))
+        expires_at = (created_at + timedelta(hours=int(match.group(2)))).timestamp()
+        return target_user, expires_at
+
+    def register(self, puuid, expires_at, message_id=None, channel_id=None):
+        
+        self.bans[puuid] = {
+            'expires_at': expires_at,
+            'message_id': message_id,
+            'channel_id': channel_id,
+        }
+        heapq.heappush(self._heap, (expires_at, puuid))
+        self.store.mark_dirty('bans')
+        self.reschedule()
+
+    def ban_text(self, puuid, now=None):
+        
+        ban = self.bans.get(puuid)
+        if not ban:
+            return None
+        remaining = ban['expires_at'] - (now or time.time())
+        if remaining <= 0:
+            return None
+        return f"⛔ BANNED: {int(remaining // 3600)}h {int((remaining % 3600) // 60)}m"
+
+    def active_ban_texts(self):
+        
+        now = time.time()
+        texts = {}
+        for puuid in self.bans:
+            text = self.ban_text(puuid, now)
+            if text:
+                texts[puuid] = text
+        return texts
+
+    def pop_expired(self, now=None):
+        
+        now = now or time.time()
+        expired = []
+        while self._heap and self._heap[0][0] <= now:
+            expires_at, puuid = heapq.heappop(self._heap)
+            ban = self.bans.get(puuid)
+            if ban and ban['expires_at'] == expires_at:
+                expired.append((puuid, self.bans.pop(puuid)))
+        if expired:
+            self.store.mark_dirty('bans')
+        return expired
+
+    def start(self, on_expire):
+        
+        self._on_expire = on_expire
+        self.reschedule()
+
+    def reschedule(self):
+        
+        if self._on_expire is None:
+            return
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+        if not self._heap:
+            return
+        
+        loop = asyncio.get_running_loop()
+        delay = max(0, self._heap[0][0] - time.time())
+        self._timer = loop.call_at(loop.time() + delay, self._fire)
+
+    def _fire(self):
+        
+        self._timer = None
+        expired = self.pop_expired()
+        if expired:
+            asyncio.create_task(self._on_expire(expired))
+        self.reschedule()
+
+
+class CoalescedRun:
+    
+    def __init__(self, name, fn):
+        self.name = name
+        self.fn = fn
+        self.cycles = 0
+        self.joined = 0
+        self._current = None
+        self._follow_up = None
+
+    @property
+    def running(self):
+        return self._current is not None and not self._current.done()
+
+    def _start(self):
+        
+        self.cycles += 1
+        self._current = asyncio.ensure_future(self.fn())
+        self._current.add_done_callback(self._finished)
+        return self._current
+
+    def _finished(self, task):
+        
+        if task is not self._current:
+            return
+        self._current = None
+        follow_up, self._follow_up = self._follow_up, None
+        if follow_up is None or follow_up.done():
+            return
+        
+        
+        def relay(cycle):
+            if follow_up.done():
+                return
+            if cycle.cancelled():
+                follow_up.cancel()
+            elif cycle.exception():
+                follow_up.set_exception(cycle.exception())
+            else:
+                follow_up.set_result(cycle.result())
+        self._start().add_done_callback(relay)
+
+    def request(self, fresh=False):
+        
+        if not self.running:
+            return asyncio.shield(self._start())
+        
+        self.joined += 1
+        if not fresh:
+            logger.info(f"🔗 {self.name} already running, joining the in-flight cycle")
+            return asyncio.shield(self._current)
+        
+        if self._follow_up is None:
+            logger.info(f"🔗 {self.name} already running, one follow-up cycle queued")
+            self._follow_up = asyncio.get_running_loop().create_future()
+        return asyncio.shield(self._follow_up)
+
+    async def wait_idle(self):
+        
+        while self.running:
+            await asyncio.wait({self._current})
+
+    def cancel(self):
+        
+        if self.running:
+            self._current.cancel()
+            return True
+        return False
+
+
+class AccountScheduler:
+
+    PRIORITY = 0
+    PERIODIC = 1
+
+    def __init__(self, interval, jitter_ratio=0.1):
+        self.interval = interval
+        self.jitter_ratio = jitter_ratio
+        self._heap = []
+        self._periodic = {}
+        self._pending = {}
+        self._seq = itertools.count()
+        self._wake = asyncio.Event()
+        self.current = None
+        self.running = False
+
+    def __len__(self):
+        return len(self._periodic)
+
+    @property
+    def spacing(self):
+        return self.interval / max(1, len(self._periodic))
+
+    def _push(self, priority, due, puuid):
+        
+        seq = next(self._seq)
+        heapq.heappush(self._heap, (priority, due, seq, puuid))
+        self._wake.set()
+        return seq
+
+    def schedule(self, puuid, base):
+        
+        jitter = random.uniform(-1, 1) * self.spacing * self.jitter_ratio
+        seq = self._push(self.PERIODIC, base + jitter, puuid)
+        self._periodic[puuid] = (base, seq)
+
+    def spread(self, puuids, start=None):
+        
+        puuids = list(puuids)
+        start = time.time() if start is None else start
+        step = self.interval / max(1, len(puuids))
+        
+        self._heap = [entry for entry in self._heap if entry[0] == self.PRIORITY]
+        heapq.heapify(self._heap)
+        self._periodic = {puuid: (None, None) for puuid in puuids}
+        for i, puuid in enumerate(puuids):
+            self.schedule(puuid, start + i * step)
+
+    def request(self, puuid):
+        
+        if puuid not in self._pending:
+            self._pending[puuid] = asyncio.get_running_loop().create_future()
+            self._push(self.PRIORITY, time.time(), puuid)
+        return self._pending[puuid]
+
+    def is_pending(self, puuid):
+        return puuid in self._pending
+
+    def _discard_stale(self):
+        
+        while self._heap:
+            priority, _, seq, puuid = self._heap[0]
+            if priority == self.PRIORITY or self._periodic.get(puuid, (None, None))[1] == seq:
+                return
+            heapq.heappop(self._heap)
+
+    def next_due(self):
+        
+        self._discard_stale()
+        return self._heap[0][1] if self._heap else None
+
+    async def next(self):
+        
+        while True:
+            self._wake.clear()
+            due = self.next_due()
+            if due is not None and due <= time.time():
+                priority, _, seq, puuid = heapq.heappop(self._heap)
+                if priority == self.PRIORITY:
+                    return puuid, self._pending.pop(puuid)
+                return puuid, self._periodic[puuid]
+            
+            try:
+                await asyncio.wait_for(self._wake.wait(), None if due is None else due - time.time())
+            except asyncio.TimeoutError:
+                pass
+
+    def reschedule(self, puuid, slot):
+        
+        if self._periodic.get(puuid) != slot:
+            return
+        
+        
+        base = slot[0] + self.interval
+        now = time.time()
+        if base <= now:
+            base += self.interval * -(-(now - base) // self.interval)
+        self.schedule(puuid, base)
+
+    async def run(self, handler):
+        
+        self.running = True
+        try:
+            while True:
+                puuid, slot = await self.next()
+                self.current = (puuid, time.time())
+                result = None
+                try:
+                    result = await handler(puuid, isinstance(slot, asyncio.Future))
+                finally:
+                    self.current = None
+                    if isinstance(slot, asyncio.Future):
+                        if not slot.done():
+                            slot.set_result(result)
+                    else:
+                        self.reschedule(puuid, slot)
+        finally:
+            self.running = False
+
+
+DEFAULT_CODE_PATTERNS = {
+    "sender": {
+        "riot_games": r"riot\s+games",
+        "from_riot_games": r"from\s+riot\s+games",
+        "team_riot_games": r"team\s+riot\s+games",
+        "riot_games_org": r"riot\s+games\s+(?:inc|team|support)",
+    },
+    "exclude": {
+        "monitor_up_down": r"monitor\s+is\s+(?:up|down)",
+        "uptime_monitor": r"uptime\s+monitor",
+        "status_change": r"status\s+change",
+        "service_monitor": r"service\s+monitor",
+        "ping_monitor": r"ping\s+monitor",
+        "healthcheck": r"healthcheck",
+        "alert": r"alert\s*:",
+        "notification_from": r"notification\s+from",
+        "automated_alert": r"automated\s+alert",
+    },
+    "codes": {
+        "en": {
+            "labelled_code": r"(?:verification\s*code|security\s*code|authentication\s*code|access\s*code)(?:\s*is)?[:;\s]*(\d{6})",
+            "your_code": r"(?:your|il\s*tuo)\s*(?:verification|security|authentication|access)?\s*code(?:\s*is)?[:;\s]*(\d{6})",
+            "use_code": r"use\s*(?:this\s*)?code[:;\s]*(\d{6})",
+            "enter_code": r"enter\s*(?:this\s*)?code[:;\s]*(\d{6})",
+        },
+        "it": {
+            "codice": r"(?:codice\s*di\s*(?:verifica|sicurezza|accesso))[:;\s]*(\d{6})",
+        },
+        "ar": {
+            "login_code": r"رمز\s+تسجيل\s+الدخول[:\s]*(\d{6})",
+            "here_is_login_code": r"إليك\s+رمز\s+تسجيل\s+الدخول[:\s]*(\d{6})",
+        },
+    },
+}
+CODE_PATTERNS = CONFIG.get('code_patterns', DEFAULT_CODE_PATTERNS)
+
+
+class CodeClassifier:
+    
+    def __init__(self, table):
+        
+        self.sender = [(rule, re.compile(pattern)) for rule, pattern in table.get('sender', {}).items()]
+        self.exclude = [(rule, re.compile(pattern)) for rule, pattern in table.get('exclude', {}).items()]
+        
+        
+        self.anchor = re.compile(table.get('anchor', r"\d{6}"))
+        self.context = table.get('context_chars', 96)
+        self.codes = []
+        for locale, rules in table.get('codes', {}).items():
+            for rule, pattern in rules.items():
+                regex = re.compile(pattern, re.IGNORECASE)
+                if regex.groups < 1:
+                    raise ValueError(f"Code pattern '{locale}/{rule}' must capture the code in a group")
+                self.codes.append((locale, rule, regex))
+        self.locales = list(table.get('codes', {}))
+
+    def match_sender(self, text):
+        
+        text_lower = (text or '').lower()
+        return next((rule for rule, regex in self.sender if regex.search(text_lower)), None)
+
+    def match_exclude(self, text):
+        
+        text_lower = (text or '').lower()
+        return next((rule for rule, regex in self.exclude if regex.search(text_lower)), None)
+
+    def match_code(self, text):
+        
+        if not text:
+            return None
+        
+        
+        for candidate in self.anchor.finditer(text):
+            start = max(0, candidate.start() - self.context)
+            end = candidate.end() + self.context
+            for locale, rule, regex in self.codes:
+                match = regex.search(text, start, end)
+                if match:
+                    return {'code': match.group(1), 'locale': locale, 'rule': rule}
+        
+        return None
+
+
+CODE_CLASSIFIER = CodeClassifier(CODE_PATTERNS)
+
+
+def decode_mime_words(value):
+    
+    if not value:
+        return ''
+    if isinstance(value, bytes):
+        value = value.decode('utf-8', errors='ignore')
+    
+    decoded = ''
+    for part, enc in decode_header(value):
+        if isinstance(part, bytes):
+            try:
+                decoded += part.decode(enc or 'utf-8', errors='ignore')
+            except LookupError:
+                decoded += part.decode('utf-8', errors='ignore')
+        else:
+            decoded += str(part)
+    return decoded
+
+
+def format_envelope_sender(envelope):
+    
+    if not envelope.from_:
+        return ''
+    
+    address = envelope.from_[0]
+    name = decode_mime_words(address.name)
+    mailbox = (address.mailbox or b'').decode('utf-8', errors='ignore')
+    host = (address.host or b'').decode('utf-8', errors='ignore')
+    return f"{name} <{mailbox}@{host}>" if name else f"{mailbox}@{host}"
+
+
+def find_text_section(structure, prefix=''):
+    
+    if structure.is_multipart:
+        for i, part in enumerate(structure[0], start=1):
+            found = find_text_section(part, f"{prefix}{i}.")
+            if found:
+                return found
+        return None
+    
+    
+    if (structure[0] or b'').lower() != b'text' or (structure[1] or b'').lower() != b'plain':
+        return None
+    return body_section_info(structure, prefix.rstrip('.') or '1')
+
+
+def body_section_info(structure, section):
+    
+    params = structure[2] or ()
+    params = {params[i].lower(): params[i + 1] for i in range(0, len(params) - 1, 2)}
+    charset = (params.get(b'charset') or b'utf-8').decode('ascii', errors='ignore')
+    encoding = (structure[5] or b'7bit').decode('ascii', errors='ignore').lower()
+    return section, encoding, charset
+
+
+def decode_body_section(raw, encoding, charset):
+    
+    if encoding == 'base64':
+        raw = b''.join(raw.split())
+        raw = base64.b64decode(raw[:len(raw) // 4 * 4])
+    elif encoding == 'quoted-printable':
+        raw = quopri.decodestring(raw)
+    
+    try:
+        return raw.decode(charset, errors='ignore')
+    except LookupError:
+        return raw.decode('utf-8', errors='ignore')
+
+
+class Mailbox:
+    
+    def __init__(self, config):
+        self.address = config['address']
+        self.password = config['password']
+        self.name = config.get('name') or self.address
+        self.server = config.get('imap_server', IMAP_SERVER)
+        self.port = int(config.get('imap_port', IMAP_PORT))
+        self.use_ssl = config.get('imap_ssl', True)
+        self.client = None
+        self.mode = "offline"
+        self.lock = asyncio.Lock()
+        self.last_used = 0
+        self.last_check = 0
+        self.reconnects = 0
+        self.last_error = None
+        self._wake = asyncio.Event()
+        self._requests = []
+
+    def _connect_blocking(self):
+        
+        ssl_context = ssl.create_default_context() if self.use_ssl else None
+        client = IMAPClient(self.server, port=self.port, ssl=self.use_ssl, ssl_context=ssl_context)
+        client.login(self.address, self.password)
+        client.folder_info = client.select_folder("INBOX")
+        return client
+
+    async def connect(self):
+        
+        try:
+            self.client = await IMAP_EXECUTOR.run(self._connect_blocking)
+            self.last_used = time.time()
+            self.reconnects += 1
+            self.last_error = None
+            logger.info(f"🔐 IMAP connected for code monitoring ({self.name})")
+            return True
+        except Exception as e:
+            self.client = None
+            self.last_error = str(e)
+            logger.error(f"❌ IMAP connection error ({self.name}): {e}")
+            return False
+
+    async def ensure_connected(self):
+        
+        if self.client is None:
+            return await self.connect()
+        
+        
+        if time.time() - self.last_used > MAILBOX_HEALTH_CHECK_SECONDS:
+            try:
+                await IMAP_EXECUTOR.run(self.client.noop)
+                self.last_used = time.time()
+            except (imap_exceptions.IMAPClientError, ssl.SSLError, EOFError, OSError) as e:
+                logger.warning(f"⚠️ IMAP health check failed ({self.name}): {e}. Reconnecting...")
+                await self.disconnect()
+                return await self.connect()
+        return True
+
+    async def disconnect(self):
+        
+        client, self.client = self.client, None
+        self.mode = "offline"
+        if client:
+            try:
+                await IMAP_EXECUTOR.run(client.logout)
+            except Exception:
+                pass
+
+    def abort(self):
+        
+        client = self.client
+        if client:
+            try:
+                client.shutdown()
+            except Exception:
+                pass
+
+    def request_sync(self):
+        
+        future = asyncio.get_running_loop().create_future()
+        self._requests.append(future)
+        self._wake.set()
+        return future
+
+    @property
+    def sync_requested(self):
+        return self._wake.is_set()
+
+    def resolve_requests(self, found_codes):
+        
+        self._wake.clear()
+        requests, self._requests = self._requests, []
+        for future in requests:
+            if not future.done():
+                future.set_result(found_codes)
+
+    async def wait_for_request(self, timeout):
+        
+        try:
+            await asyncio.wait_for(self._wake.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+
+class MailboxPool:
+    
+    def __init__(self, configs):
+        self.mailboxes = [Mailbox(config) for config in configs if config.get('address') and config.get('password')]
+
+    def __iter__(self):
+        return iter(self.mailboxes)
+
+    def __len__(self):
+        return len(self.mailboxes)
+
+    @property
+    def connected(self):
+        return sum(1 for mailbox in self.mailboxes if mailbox.client)
+
+    async def request_sync(self, timeout):
+        
+        futures = [mailbox.request_sync() for mailbox in self.mailboxes]
+        done, _ = await asyncio.wait(futures, timeout=timeout)
+        return [found for future in done for found in future.result()]
+
+    async def close(self):
+        
+        await asyncio.gather(*(mailbox.disconnect() for mailbox in self.mailboxes))
+
+
+class ValorantBot(commands.Bot):
+    def __init__(self):
+        
+        intents = discord.Intents.default()
+        intents.messages = True
+        intents.message_content = True
+        intents.members = True 
+        super().__init__(
+            command_prefix='!',  
+            intents=intents,
+            help_command=None
+        )
+        
+        
+        self.db = StateDB(DB_FILE)
+        self.message_store = WriteBehindStore(self.db, 'messages', "Message cache")
+        self.message_cache = self.message_store.data
+        self.state = StateStore(self.db)
+        self.bans = BanRegistry(self.state)
+        self.session = None
+        self.updates = CoalescedRun("Update", self.run_update_cycle)
+        self.channel = None
+        
+        
+        self.mailboxes = MailboxPool(MAILBOXES)
+        self.codes_channel = None
+        
+        
+        self.code_log = CodeDedupeLog(self.db, CODE_DEDUPE_WINDOW_MINUTES)
+        
+        
+        self.stats_engine = StatsEngine(self.db)
         
         
         
@@ -533,13 +2121,41 @@ class ValorantBot(commands.Bot):
         
         
         self.users_data_cache = []
+        self.leaderboard_image = None
+        
+        
+        self.published_slots = {}
+        self.account_data = {}
+        self.publisher = DiscordPublisher(PUBLISH_CONCURRENCY)
+        self.webhook_sink = WebhookSink(
+            {
+                'cards': WEBHOOKS.get('cards_url') if USE_WEBHOOKS else None,
+                'leaderboard': WEBHOOKS.get('leaderboard_url') if USE_WEBHOOKS else None,
+            },
+            pool_size=WEBHOOKS.get('pool_size', 10)
+        )
+        self.publish_stats = {'edited': 0, 'skipped': 0}
+        self.card_images = {}
+        self.update_pipeline = StagedPipeline("update", [
+            ('fetch', self.pipeline_fetch, PIPELINE_SETTINGS.get('fetch_concurrency', 1)),
+            ('render', self.pipeline_render, PIPELINE_SETTINGS.get('render_concurrency', 2)),
+            ('publish', self.pipeline_publish, 1),
+        ], queue_size=PIPELINE_SETTINGS.get('queue_size', 4), batch_sizes={'publish': PIPELINE_SETTINGS.get('publish_batch', 4)})
+        self.code_latency = {stage: RollingHistogram(LATENCY_WINDOW_MINUTES) for stage, _, _ in CODE_LATENCY_STAGES}
+        self.executors = (IMAP_EXECUTOR, RENDER_EXECUTOR, IO_EXECUTOR, self.db.executor)
+        self.heartbeats = HeartbeatMonitor(STAGE_DEADLINES)
+        self.loop_monitor = LoopLagMonitor(
+            interval=LOOP_LAG_SETTINGS.get('interval', 0.5),
+            threshold=LOOP_LAG_SETTINGS.get('threshold_ms', 250) / 1000
+        )
         
         
         self.watchdog_metrics = {
             'update_restarts': 0,
             'email_restarts': 0,
             'last_latency': 0,
-            'start_time': time.time()
+            'start_time': time.time(),
+            'last_run': time.time()
         }
         
         
@@ -552,10 +2168,8 @@ class ValorantBot(commands.Bot):
         self.commands_synced = False
 
         
-        self.skip_initial_update = False
-
-        
-        self.next_update_time = None
+        self.scheduler = AccountScheduler(UPDATE_INTERVAL)
+        self.publish_lock = asyncio.Lock()
         
         
         self.api_key_index = 0
@@ -598,62 +2212,167 @@ class ValorantBot(commands.Bot):
             await interaction.response.send_message("❌ Accesso Negato: Devi essere nel server ufficiale per usare questo bot.", ephemeral=True)
             return False
 
-    def load_message_cache(self):
+    async def open_state(self):
         
-        try:
-            if os.path.exists(CACHE_FILE):
-                with open(CACHE_FILE, 'r') as f:
-                    data = json.load(f)
-                    logger.info("✅ Message cache loaded from file")
-                    return data
-        except Exception as e:
-            logger.error(f"❌ Cache loading error: {e}")
-        return {}
-    
-    def save_message_cache(self):
+        await self.db.open()
+        await asyncio.gather(self.message_store.load(), self.state.load(), self.code_log.load(), self.stats_engine.load())
+        self.bans.load()
+        self.restore_snapshot()
+
+    def save_message_cache(self, *puuids):
+        self.message_store.mark_dirty(*puuids)
+
+    async def flush_persistence(self):
+        
+        for store in (self.message_store, self.state):
+            store.flush()
+        written = await self.db.commit()
+        if written:
+            logger.debug(f"💾 State DB commit: {written} rows in one transaction")
+        return written
+
+    @tasks.loop(seconds=PERSIST_INTERVAL)
+    async def persistence_loop(self):
+        await self.flush_persistence()
+        await self.export_metrics()
+
+    @tasks.loop(seconds=HEARTBEAT_CHECK_SECONDS)
+    async def heartbeat_loop(self):
+        self.heartbeats.reap()
+
+    def record_code_latency(self, timings):
+        
+        for stage, start, end in CODE_LATENCY_STAGES:
+            if timings.get(start) and timings.get(end):
+                self.code_latency[stage].record(timings[end] - timings[start])
+        
+        if timings.get('email') and timings.get('sent'):
+            logger.info(f"⏱️ Code delivered {timings['sent'] - timings['email']:.1f}s after the email was sent")
+
+    def render_metrics(self):
+        
+        lines = [
+            "# HELP valorant_code_latency_seconds 2FA code delivery latency per stage",
+            "# TYPE valorant_code_latency_seconds summary",
+        ]
+        for stage, histogram in self.code_latency.items():
+            summary = histogram.summary()
+            if summary['count']:
+                for key, quantile in (('p50', '0.5'), ('p95', '0.95'), ('p99', '0.99')):
+                    lines.append(f'valorant_code_latency_seconds{{stage="{stage}",quantile="{quantile}"}} {summary[key]:.6f}')
+            lines.append(f'valorant_code_latency_seconds_count{{stage="{stage}"}} {histogram.total_count}')
+            lines.append(f'valorant_code_latency_seconds_sum{{stage="{stage}"}} {histogram.total_sum:.6f}')
+        
+        lines += [
+            "# HELP valorant_executor_queue_depth Calls waiting for a worker thread",
+            "# TYPE valorant_executor_queue_depth gauge",
+        ]
+        lines += [f'valorant_executor_queue_depth{{executor="{e.name}"}} {e.queued}' for e in self.executors]
+        lines += [
+            "# HELP valorant_executor_active Calls running on a worker thread",
+            "# TYPE valorant_executor_active gauge",
+        ]
+        lines += [f'valorant_executor_active{{executor="{e.name}"}} {e.active}' for e in self.executors]
+        lines += [
+            "# HELP valorant_executor_wait_seconds Time a call waited before a worker picked it up",
+            "# TYPE valorant_executor_wait_seconds summary",
+        ]
+        for executor in self.executors:
+            summary = executor.wait_time.summary()
+            if summary['count']:
+                for key, quantile in (('p50', '0.5'), ('p95', '0.95'), ('p99', '0.99')):
+                    lines.append(f'valorant_executor_wait_seconds{{executor="{executor.name}",quantile="{quantile}"}} {summary[key]:.6f}')
+            lines.append(f'valorant_executor_wait_seconds_count{{executor="{executor.name}"}} {executor.wait_time.total_count}')
+            lines.append(f'valorant_executor_wait_seconds_sum{{executor="{executor.name}"}} {executor.wait_time.total_sum:.6f}')
+        
+        lines += [
+            "# HELP valorant_update_stage_seconds Time an account spent in each update pipeline stage",
+            "# TYPE valorant_update_stage_seconds summary",
+        ]
+        for stage, histogram in self.update_pipeline.busy_time.items():
+            summary = histogram.summary()
+            if summary['count']:
+                for key, quantile in (('p50', '0.5'), ('p95', '0.95'), ('p99', '0.99')):
+                    lines.append(f'valorant_update_stage_seconds{{stage="{stage}",quantile="{quantile}"}} {summary[key]:.6f}')
+            lines.append(f'valorant_update_stage_seconds_count{{stage="{stage}"}} {histogram.total_count}')
+            lines.append(f'valorant_update_stage_seconds_sum{{stage="{stage}"}} {histogram.total_sum:.6f}')
+        
+        lines += [
+            "# HELP valorant_loop_lag_seconds Delay between a scheduled event loop tick and when it ran",
+            "# TYPE valorant_loop_lag_seconds summary",
+        ]
+        histogram = self.loop_monitor.lag
+        summary = histogram.summary()
+        if summary['count']:
+            for key, quantile in (('p50', '0.5'), ('p95', '0.95'), ('p99', '0.99')):
+                lines.append(f'valorant_loop_lag_seconds{{quantile="{quantile}"}} {summary[key]:.6f}')
+        lines.append(f'valorant_loop_lag_seconds_count {histogram.total_count}')
+        lines.append(f'valorant_loop_lag_seconds_sum {histogram.total_sum:.6f}')
+        lines += [
+            "# HELP valorant_stage_seconds Time a unit of work spent in each watched stage",
+            "# TYPE valorant_stage_seconds summary",
+        ]
+        for stage, histogram in sorted(self.heartbeats.stage_time.items()):
+            summary = histogram.summary()
+            if summary['count']:
+                for key, quantile in (('p50', '0.5'), ('p95', '0.95'), ('p99', '0.99')):
+                    lines.append(f'valorant_stage_seconds{{stage="{stage}",quantile="{quantile}"}} {summary[key]:.6f}')
+            lines.append(f'valorant_stage_seconds_count{{stage="{stage}"}} {histogram.total_count}')
+            lines.append(f'valorant_stage_seconds_sum{{stage="{stage}"}} {histogram.total_sum:.6f}')
+        lines += [
+            "# HELP valorant_stalled_units_total Units cancelled by the watchdog after missing their deadline",
+            "# TYPE valorant_stalled_units_total counter",
+            f"valorant_stalled_units_total {self.heartbeats.stall_count}",
+        ]
+        lines += [
+            "# HELP valorant_loop_stalls_total Ticks delayed past the stall threshold",
+            "# TYPE valorant_loop_stalls_total counter",
+            f"valorant_loop_stalls_total {self.loop_monitor.stall_count}",
+        ]
+        return "\n".join(lines) + "\n"
+
+    async def export_metrics(self):
+        
+        def write_metrics(text):
+            tmp_path = f"{METRICS_FILE}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(text)
+            os.replace(tmp_path, METRICS_FILE)
         
         try:
-            with open(CACHE_FILE, 'w') as f:
-                json.dump(self.message_cache, f)
-                logger.info("✅ Message cache saved to file")
+            await IO_EXECUTOR.run(write_metrics, self.render_metrics())
         except Exception as e:
-            logger.error(f"❌ Cache saving error: {e}")
+            logger.error(f"❌ Metrics export error: {e}")
     
     
-    def load_codes_history(self):
+    async def deliver_code(self, found):
         
-        try:
-            if os.path.exists(CODES_HISTORY_FILE):
-                with open(CODES_HISTORY_FILE, 'r') as f:
-                    data = json.load(f)
-                    
-                    logger.info(f"✅ Code history loaded ({len(data)} codes)")
-                    return set(data)
-        except Exception as e:
-            logger.error(f"❌ Code history loading error: {e}")
-        return set()
-
-    def save_code_to_history(self, code):
+        if self.code_log.seen(found['code'], found.get('uid')):
+            logger.debug(f"🔇 Code {found['code']} ignored (already sent inside the dedupe window)")
+            return False
         
-        try:
-            self.codes_history.add(code)
-            
-            with open(CODES_HISTORY_FILE, 'w') as f:
-                json.dump(list(self.codes_history), f)
-            logger.info(f"💾 Code {code} saved to JSON history")
-        except Exception as e:
-            logger.error(f"❌ Code history saving error: {e}")
+        logger.info(f"🆕 NEW CODE FOUND: {found['code']} ({found.get('mailbox')})")
+        self.code_log.add(found['code'], found.get('uid'), found.get('email_ts'))
+        if await self.send_code_to_discord(found['code'], found.get('mailbox') if len(self.mailboxes) > 1 else None):
+            timings = found.get('timings', {})
+            timings['sent'] = time.time()
+            self.record_code_latency(timings)
+        return True
 
     def get_user_message_id(self, puuid):
         return self.message_cache.get(puuid)
     
     def set_user_message_id(self, puuid, message_id):
+        if self.message_cache.get(puuid) == message_id:
+            return
         self.message_cache[puuid] = message_id
-        self.save_message_cache()
+        self.save_message_cache(puuid)
     
     async def setup_hook(self):
         
         logger.info("🔧 Executing setup hook...")
+        self.loop_monitor.start()
+        await self.open_state()
         
         
         if self.session is None or getattr(self.session, "closed", False):
@@ -661,6 +2380,10 @@ class ValorantBot(commands.Bot):
             logger.info("✅ HTTP session created")
         
         
+        if USE_WEBHOOKS:
+            await self.webhook_sink.start()
+        
+        
         try:
             logger.info("🔄 Starting GLOBAL slash command sync...")
             
@@ -704,7 +2427,14 @@ class ValorantBot(commands.Bot):
         await self.initialize_hardcoded_cache()
         
         
-        await self.preload_message_cache()
+        await asyncio.gather(
+            self.preload_message_cache(),
+            *(self.load_account_assets(u) for u in self.account_data.values())
+        )
+        
+        
+        await self.backfill_bans()
+        self.bans.start(self.handle_expired_bans)
         
         
         self.start_background_tasks()
@@ -713,6 +2443,12 @@ class ValorantBot(commands.Bot):
         if not self.watchdog_task or self.watchdog_task.done():
             self.watchdog_task = self.watchdog_loop.start()
             logger.info("🐕 Watchdog Supervisor started!")
+        
+        
+        if not self.persistence_loop.is_running():
+            self.persistence_loop.start()
+        if not self.heartbeat_loop.is_running():
+            self.heartbeat_loop.start()
     
     async def initialize_hardcoded_cache(self):
         
@@ -729,25 +2465,54 @@ class ValorantBot(commands.Bot):
         if not self.channel:
             return
             
-        logger.info("🔍 Verifying message cache...")
-        to_delete = []
-        
-        for puuid, msg_id in list(self.message_cache.items()):
+        logger.info("🔍 Verifying published messages...")
+        start = time.perf_counter()
+        
+        targets = {}
+        for slot in range(len(HARDCODED_MESSAGE_IDS)):
+            msg_id = self.state.get_slot_message_id(slot)
+            if msg_id:
+                targets[('slot', slot)] = (self.channel, msg_id)
+        for puuid, msg_id in self.message_cache.items():
+            if msg_id:
+                targets[('cache', puuid)] = (self.channel, msg_id)
+        leaderboard_channel = self.get_channel(LEADERBOARD_CHANNEL_ID)
+        leaderboard_id = self.state.get_leaderboard_message_id()
+        if leaderboard_channel and leaderboard_id:
+            targets[('leaderboard', None)] = (leaderboard_channel, leaderboard_id)
+        
+        async def verify(channel, msg_id):
             try:
-                await self.channel.fetch_message(msg_id)
-                logger.info(f"✅ Message {msg_id} found for PUUID {puuid}")
+                await channel.fetch_message(msg_id)
+                return True
             except discord.NotFound:
-                logger.warning(f"⚠️ Message {msg_id} not found - will be recreated")
-                to_delete.append(puuid)
+                return False
             except Exception as e:
                 logger.warning(f"⚠️ Message {msg_id} verification error: {e}")
+                return True
+        
+        keys = list(targets)
+        results = await asyncio.gather(*(verify(*targets[key]) for key in keys))
+        
+        missing = [key for key, found in zip(keys, results) if not found]
+        for target, ref in missing:
+            msg_id = targets[(target, ref)][1]
+            logger.warning(f"⚠️ Message {msg_id} not found - will be recreated")
+            if target == 'slot':
+                self.state.section('slots')[str(ref)] = None
+                self.published_slots.pop(ref, None)
+            elif target == 'cache':
+                self.message_cache.pop(ref, None)
+            else:
+                self.state.data['leaderboard_message_id'] = None
         
-        for puuid in to_delete:
-            self.message_cache.pop(puuid, None)
-        
-        if to_delete:
-            self.save_message_cache()
+        if missing:
+            self.state.mark_dirty('slots', 'leaderboard_message_id')
+            self.save_message_cache(*(ref for target, ref in missing if target == 'cache'))
             logger.info("✅ Cache updated after verification")
+        
+        elapsed = time.perf_counter() - start
+        logger.info(f"✅ Verified {len(keys)} messages in {elapsed:.2f}s ({len(missing)} missing)")
 
     
     async def send_crash_log(self, source, error):
@@ -797,7 +2562,7 @@ class ValorantBot(commands.Bot):
             self.update_task = asyncio.create_task(self.update_loop_with_restart())
         
         
-        if EMAIL_ADDRESS and EMAIL_PASSWORD:
+        if self.mailboxes:
             if not self.email_task or self.email_task.done():
                 self.email_task = asyncio.create_task(self.email_loop_with_restart())
         else:
@@ -810,19 +2575,12 @@ class ValorantBot(commands.Bot):
 
     def restart_update_timer(self):
         
-        try:
-            
-            self.skip_initial_update = True
-            
-            self.is_updating = False 
-            if self.update_task and not self.update_task.done():
-                self.update_task.cancel()
-                logger.info("⏹️ Update task cancelled for timer restart")
-        except Exception as e:
-            logger.error(f"❌ Update task cancellation error: {e}")
-        
-        self.update_task = asyncio.create_task(self.update_loop_with_restart())
-        logger.info("✅ Update timer restarted (countdown restarted)")
+        self.scheduler.spread([u['puuid'] for u in USERS], time.time() + UPDATE_INTERVAL / max(1, len(USERS)))
+        logger.info(f"✅ Update schedule restarted (one account every {int(self.scheduler.spacing)}s)")
+
+    @property
+    def next_update_time(self):
+        return self.scheduler.next_due()
 
     
     def get_next_update_countdown(self):
@@ -844,26 +2602,33 @@ class ValorantBot(commands.Bot):
         else:
             return f"{seconds}s"
         
+    async def get_json(self, url, headers):
+        
+        async with self.session.get(url, headers=headers, timeout=10) as response:
+            if response.status == 200:
+                return response.status, await response.json()
+            return response.status, None
+
     async def fetch_with_retry(self, url, description="API Call"):
         
         max_retries = len(API_KEYS) 
         for i in range(max_retries):
             headers = self.get_headers()
             try:
-                async with self.session.get(url, headers=headers, timeout=10) as response:
-                    if response.status == 200:
-                        return await response.json()
-                    elif response.status == 429:
-                        self.rotate_api_key()
-                        logger.warning(f"⚠️ 429 Rate Limit on {description}. Attempt {i+1}/{max_retries}. key...")
-                        await asyncio.sleep(0.5) 
-                        continue 
-                    elif response.status == 404:
-                         logger.warning(f"❌ 404 Not Found su {description}")
-                         return None
-                    else:
-                        logger.error(f"❌ Error {response.status} on {description}")
-                        return None
+                status, data = await self.heartbeats.run('http', description, self.get_json, url, headers, retries=1)
+                if status == 200:
+                    return data
+                elif status == 429:
+                    self.rotate_api_key()
+                    logger.warning(f"⚠️ 429 Rate Limit on {description}. Attempt {i+1}/{max_retries}. key...")
+                    await asyncio.sleep(0.5) 
+                    continue 
+                elif status == 404:
+                     logger.warning(f"❌ 404 Not Found su {description}")
+                     return None
+                else:
+                    logger.error(f"❌ Error {status} on {description}")
+                    return None
             except asyncio.TimeoutError:
                 logger.error(f"❌ Timeout su {description}")
                 return None
@@ -882,12 +2647,9 @@ class ValorantBot(commands.Bot):
                 await self.update_loop()
             except asyncio.CancelledError:
                 logger.info("Update Loop Cancelled manually.")
-                
-                self.is_updating = False
                 break 
             except Exception as e:
                 logger.error(f"❌ UPDATE LOOP CRASH: {e}")
-                self.is_updating = False 
                 await self.send_crash_log("UPDATE LOOP", e)
                 logger.info("🔄 Resurrecting Update Loop in 60 seconds...")
                 await asyncio.sleep(60)
@@ -905,7 +2667,7 @@ class ValorantBot(commands.Bot):
                 logger.error(f"❌ EMAIL LOOP CRASH: {e}")
                 await self.send_crash_log("EMAIL LOOP", e)
                 logger.info("🔄 Resurrecting Email Loop in 60 seconds...")
-                self.email_client = None 
+                await self.mailboxes.close()
                 await asyncio.sleep(60)
 
     
@@ -923,6 +2685,15 @@ class ValorantBot(commands.Bot):
         status_channel = self.get_channel(ERROR_LOG_CHANNEL_ID)
         
         
+        self.heartbeats.reap()
+        now = time.time()
+        for stall in self.heartbeats.stalls:
+            if stall['at'] > self.watchdog_metrics['last_run']:
+                issues_found = True
+                repaired_actions.append(f"⏰ **{stall['stage']}** `{stall['label']}`: stalled {stall['elapsed']:.0f}s, unit cancelled (attempt {stall['attempt']})")
+        self.watchdog_metrics['last_run'] = now
+        
+        
         update_state = "UNKNOWN"
         update_detail = ""
         
@@ -944,31 +2715,29 @@ class ValorantBot(commands.Bot):
             repaired_actions.append(f"🛠️ **Update Loop**: Restarted (Crash #{self.watchdog_metrics['update_restarts']})")
             
             
-            self.is_updating = False
             self.update_task = asyncio.create_task(self.update_loop_with_restart())
             
-        elif self.next_update_time and (time.time() - self.next_update_time > 300):
+        elif self.next_update_time and (time.time() - self.next_update_time > 300) and not self.heartbeats.in_flight('refresh') and not self.is_updating:
             
             update_state = "STUCK 🥶"
             issues_found = True
             self.watchdog_metrics['update_restarts'] += 1
             
             overdue_sec = int(time.time() - self.next_update_time)
-            update_detail = f"Loop stuck for {overdue_sec}s"
+            beat_age = self.heartbeats.age('scheduler')
+            update_detail = f"Loop stuck for {overdue_sec}s, last scheduler heartbeat {'never' if beat_age is None else f'{beat_age:.0f}s ago'}"
             repaired_actions.append(f"🔨 **Update Loop**: Kill & Forced Restart (Stuck)")
             
             
             if self.update_task: self.update_task.cancel()
-            self.is_updating = False
             self.update_task = asyncio.create_task(self.update_loop_with_restart())
-            self.next_update_time = time.time() + UPDATE_INTERVAL 
             
         else:
             update_state = "OPERATIONAL 🟢"
             
             if self.next_update_time:
                 remaining = int(self.next_update_time - time.time())
-                update_detail = f"Next cycle in {remaining // 60}m {remaining % 60}s"
+                update_detail = f"Next account refresh in {remaining // 60}m {remaining % 60}s"
             else:
                 update_detail = "Waiting for scheduling"
 
@@ -976,7 +2745,7 @@ class ValorantBot(commands.Bot):
         email_state = "UNKNOWN"
         email_detail = ""
         
-        if EMAIL_ADDRESS:
+        if self.mailboxes:
             if not self.email_task or self.email_task.done():
                 
                 email_state = "DEAD 💀"
@@ -987,37 +2756,55 @@ class ValorantBot(commands.Bot):
                 
                 self.email_task = asyncio.create_task(self.email_loop_with_restart())
                 
-            elif self.last_email_check_time > 0 and (time.time() - self.last_email_check_time > 300):
+            elif any(m.last_check and now - m.last_check > STAGE_DEADLINES['mailbox'] for m in self.mailboxes):
                 
                 email_state = "FROZEN ❄️"
                 issues_found = True
-                self.watchdog_metrics['email_restarts'] += 1
-                
-                frozen_sec = int(time.time() - self.last_email_check_time)
-                email_detail = f"Heartbeat stopped for {frozen_sec}s"
-                repaired_actions.append(f"🔨 **Email Loop**: Forced Restart (Frozen)")
+                details = []
+                escalate = False
                 
+                for mailbox in self.mailboxes:
+                    frozen_sec = int(now - mailbox.last_check) if mailbox.last_check else 0
+                    if frozen_sec <= STAGE_DEADLINES['mailbox']:
+                        continue
+                    details.append(f"{mailbox.name}: no heartbeat for {frozen_sec}s")
+                    
+                    
+                    if frozen_sec > 2 * STAGE_DEADLINES['mailbox']:
+                        escalate = True
+                        continue
+                    mailbox.abort()
+                    self.heartbeats.expire(mailbox.name)
+                    repaired_actions.append(f"🔨 **Mailbox {mailbox.name}**: stalled IMAP call cancelled, reconnecting")
                 
-                if self.email_task: self.email_task.cancel()
-                self.email_task = asyncio.create_task(self.email_loop_with_restart())
-                self.last_email_check_time = time.time()
+                email_detail = "; ".join(details)
+                if escalate:
+                    self.watchdog_metrics['email_restarts'] += 1
+                    repaired_actions.append(f"🔨 **Email Loop**: Forced Restart (mailbox still frozen after unit recovery)")
+                    if self.email_task: self.email_task.cancel()
+                    self.email_task = asyncio.create_task(self.email_loop_with_restart())
+                    for mailbox in self.mailboxes:
+                        mailbox.last_check = now
             else:
                 email_state = "OPERATIONAL 🟢"
-                if self.last_email_check_time > 0:
-                     ago = int(time.time() - self.last_email_check_time)
-                     email_detail = f"Last heartbeat: {ago}s ago"
+                beats = [f"{m.name} {int(time.time() - m.last_check)}s ago" for m in self.mailboxes if m.last_check]
+                if beats:
+                     email_detail = f"Last heartbeat: {', '.join(beats)}"
         else:
             email_state = "DISABLED ⚪"
             email_detail = "Credentials not configured"
 
         
         latency_str = f"{self.watchdog_metrics['last_latency']} ms"
+        loop_lag = self.loop_monitor.summary()
+        loop_lag_str = f"p99 {loop_lag['p99'] * 1000:.0f}ms · max {loop_lag['max'] * 1000:.0f}ms" if loop_lag['count'] else "no samples"
+        recent_stalls = [s for s in self.loop_monitor.stalls if time.time() - s['at'] < 300]
         uptime_sec = int(time.time() - self.watchdog_metrics['start_time'])
         uptime_str = f"{uptime_sec // 3600}h {(uptime_sec % 3600) // 60}m"
         
         
         
-        if issues_found or report_channel:
+        if issues_found or report_channel or recent_stalls:
             
             color = 0x2ECC71 if not issues_found else 0xE67E22 
             title = "🛡️ Watchdog Status Report" if not issues_found else "🚑 Watchdog Intervention"
@@ -1041,11 +2828,28 @@ class ValorantBot(commands.Bot):
             
             embed.add_field(
                 name="📈 System Vitals", 
-                value=f"Latency: `{latency_str}`\nUptime: `{uptime_str}`", 
+                value=f"Latency: `{latency_str}`\nLoop lag: `{loop_lag_str}`\nUptime: `{uptime_str}`", 
                 inline=True
             )
             
             
+            stage_lines = self.heartbeats.stage_lines()
+            if stage_lines:
+                embed.add_field(
+                    name=f"⏱️ Time in Stage ({self.heartbeats.stall_count} stalled units)", 
+                    value="\n".join(stage_lines)[:1024], 
+                    inline=False
+                )
+            
+            
+            if recent_stalls:
+                embed.add_field(
+                    name=f"🐢 Event Loop Stalls ({len(recent_stalls)} in last 5m)", 
+                    value=self.loop_monitor.describe_stall(max(recent_stalls, key=lambda s: s['lag'])), 
+                    inline=False
+                )
+            
+            
             if repaired_actions:
                 embed.add_field(
                     name="🔧 Actions Taken", 
@@ -1082,6 +2886,7 @@ class ValorantBot(commands.Bot):
                 if e.status == 429:  
                     retry_after = getattr(e, 'retry_after', None) or 2.0
                     logger.warning(f"⚠️ Rate limit, waiting {retry_after}s (attempt {attempt+1}/{max_retries})")
+                    self.publisher.pause(retry_after)
                     await asyncio.sleep(min(retry_after * 1.5, 30))  
                     continue
                 elif e.status >= 500:  
@@ -1114,7 +2919,7 @@ class ValorantBot(commands.Bot):
             current_tier = current_data.get('currenttier', 0) 
             
             logger.info(f"Data extracted - Rank: {rank_name}, Tier: {current_tier}, RR: {ranking_in_tier}, Elo: {elo}")
-            return rank_name, icon_url, elo, ranking_in_tier, current_tier
+            return rank_name, icon_url, elo, ranking_in_tier, current_tier, mmr_change
             
         
         
@@ -1130,31 +2935,78 @@ class ValorantBot(commands.Bot):
                  
             logger.info(f"🛡️ Graceful Degradation active for {puuid}: Using cache data ({rank_name})")
             
-            return rank_name, None, elo, ranking_in_tier, current_tier
+            return rank_name, None, elo, ranking_in_tier, current_tier, None
         
-        return "ERROR", None, 0, 0, 0
+        return "ERROR", None, 0, 0, 0, None
 
     async def get_last_match_agent(self, puuid):
         
-        url = f'https://api.henrikdev.xyz/valorant/v3/by-puuid/matches/{REGION}/{puuid}?size=1'
+        url = f'https://api.henrikdev.xyz/valorant/v3/by-puuid/matches/{REGION}/{puuid}?size={MATCH_HISTORY_SIZE}'
         
         data = await self.fetch_with_retry(url, f"get_matches({puuid})")
         
+        agent_name, agent_icon, records = None, None, []
         if data:
-            matches = data.get('data', [])
-            if matches:
-                last_match = matches[0]
+            for index, match in enumerate(data.get('data', [])):
                 
-                all_players = last_match.get('players', {}).get('all_players', [])
+                all_players = match.get('players', {}).get('all_players', [])
                 for p in all_players:
-                    if p.get('puuid') == puuid:
+                    if p.get('puuid') != puuid:
+                        continue
+                    if index == 0:
                         agent_name = p.get('character', 'Unknown')
                         
                         agent_icon = p.get('assets', {}).get('agent', {}).get('small')
                         logger.info(f"🕵️ Last Agent for {puuid}: {agent_name}")
-                        return agent_name, agent_icon
+                    record = self.build_match_record(match, p)
+                    if record:
+                        records.append(record)
+                    break
                             
-        return None, None
+        return agent_name, agent_icon, records
+
+    def store_matches(self, records, mmr_change):
+        
+        stored = 0
+        rr_assigned = False
+        for record in records:
+            if record['competitive'] and not rr_assigned:
+                record['rr_change'] = mmr_change
+                rr_assigned = True
+            if self.stats_engine.add_match(record):
+                stored += 1
+        return stored
+
+    def build_match_record(self, match, player):
+        
+        metadata = match.get('metadata', {})
+        match_id = metadata.get('matchid')
+        if not match_id:
+            return None
+        
+        result = 'D'
+        team = (player.get('team') or '').lower()
+        team_data = (match.get('teams') or {}).get(team)
+        if isinstance(team_data, dict):
+            other_team = 'blue' if team == 'red' else 'red'
+            other_data = (match.get('teams') or {}).get(other_team) or {}
+            if team_data.get('has_won'):
+                result = 'W'
+            elif other_data.get('has_won'):
+                result = 'L'
+        
+        stats = player.get('stats', {})
+        return {
+            'match_id': match_id,
+            'puuid': player.get('puuid'),
+            'agent': player.get('character', 'Unknown'),
+            'result': result,
+            'competitive': (metadata.get('mode') or '').lower() == 'competitive',
+            'rr_change': None,
+            'kills': stats.get('kills', 0),
+            'deaths': stats.get('deaths', 0),
+            'game_start': metadata.get('game_start', 0),
+        }
 
     async def get_account_level(self, puuid):
         
@@ -1184,72 +3036,148 @@ class ValorantBot(commands.Bot):
             return None
 
     
-    async def check_active_bans(self, channel):
+    async def register_ban_message(self, message):
+        
+        parsed = BanRegistry.parse(message)
+        if not parsed:
+            return None
+        
+        target_user, expires_at = parsed
+        if expires_at <= time.time():
+            logger.info(f"🗑️ Expired ban for {target_user['name']}, deleting message...")
+            try:
+                await message.delete()
+            except Exception as e:
+                logger.error(f"❌ Ban message deletion error: {e}")
+            return None
+        
+        current = self.bans.bans.get(target_user['puuid'])
+        if current and current['expires_at'] == expires_at:
+            return None
+        
+        self.bans.register(target_user['puuid'], expires_at, message.id, message.channel.id)
+        logger.info(f"🚨 Ban registered for {target_user['name']}: {self.bans.ban_text(target_user['puuid'])}")
+        return target_user['puuid']
+
+    async def backfill_bans(self):
+        
+        if not self.channel:
+            return
+        
+        last_seen = self.state.data.get('bans_last_message_id')
+        after = discord.Object(id=last_seen) if last_seen else None
+        registered = 0
+        newest = last_seen
         
-        active_bans = {}
-        if not channel:
-            return active_bans
-            
         try:
+            async for message in self.channel.history(limit=None if after else 100, after=after):
+                if await self.register_ban_message(message):
+                    registered += 1
+                newest = max(newest or 0, message.id)
+        except Exception as e:
+            logger.error(f"❌ Error during ban backfill: {e}")
+        
+        if newest and newest != last_seen:
+            self.state.data['bans_last_message_id'] = newest
+            self.state.mark_dirty('bans_last_message_id')
+        logger.info(f"🕵️ Ban backfill completed: {registered} new, {len(self.bans.bans)} active")
+
+    async def on_message(self, message):
+        
+        if self.channel and message.channel.id == self.channel.id and not message.author.bot:
+            puuid = await self.register_ban_message(message)
+            if puuid:
+                asyncio.create_task(self.refresh_account_card(puuid))
+            self.state.data['bans_last_message_id'] = message.id
+            self.state.mark_dirty('bans_last_message_id')
+        await self.process_commands(message)
+
+    async def handle_expired_bans(self, expired):
+        
+        for puuid, ban in expired:
+            user = USERS_BY_PUUID.get(puuid, {})
+            logger.info(f"✅ Ban expired for {user.get('name', puuid)}")
             
-            messages_to_delete = []
-            
-            async for message in channel.history(limit=50):
-                
-                
-                match = re.search(r"^(.+?#\w+)\s+ban\s+(\d+)h", message.content, re.IGNORECASE)
-                
-                if match:
-                    username_tag = match.group(1).strip()
-                    hours_duration = int(match.group(2))
-                    
-                    
-                    target_user = next((u for u in USERS if u['name'].lower() == username_tag.lower()), None)
-                    
-                    if target_user:
-                        message_time = message.created_at
-                        
-                        if message_time.tzinfo is None:
-                            message_time = message_time.replace(tzinfo=ZoneInfo("UTC"))
-                            
-                        ban_end_time = message_time + timedelta(hours=hours_duration)
-                        now = datetime.now(ZoneInfo("UTC"))
-                        
-                        remaining_time = ban_end_time - now
-                        
-                        if remaining_time.total_seconds() > 0:
-                            
-                            hours_left = int(remaining_time.total_seconds() // 3600)
-                            minutes_left = int((remaining_time.total_seconds() % 3600) // 60)
-                            
-                            active_bans[target_user['puuid']] = f"⛔ BANNED: {hours_left}h {minutes_left}m"
-                            logger.info(f"🚨 Active ban found for {target_user['name']}: {hours_left}h {minutes_left}m remaining")
-                        else:
-                            
-                            logger.info(f"🗑️ Expired ban for {target_user['name']}, deleting message...")
-                            messages_to_delete.append(message)
-            
-            
-            for msg in messages_to_delete:
+            channel = self.get_channel(ban.get('channel_id')) if ban.get('channel_id') else self.channel
+            if channel and ban.get('message_id'):
                 try:
-                    await msg.delete()
+                    await channel.get_partial_message(ban['message_id']).delete()
                     logger.info("✅ Expired ban message deleted.")
                 except Exception as e:
                     logger.error(f"❌ Ban message deletion error: {e}")
-                    
-        except Exception as e:
-            logger.error(f"❌ Error during ban check: {e}")
             
-        return active_bans
+            self.scheduler.request(puuid)
+
+    async def refresh_account_card(self, puuid):
+        
+        if self.is_updating:
+            logger.info(f"⏳ Ban card refresh for {USERS_BY_PUUID.get(puuid, {}).get('name', puuid)} queued until the full update finishes")
+            await self.updates.wait_idle()
+        
+        user_data = self.account_data.get(puuid)
+        slot = next((i for i, key in self.published_slots.items() if key[0] == puuid), None)
+        if not user_data or slot is None:
+            return False
+        
+        ban_text = self.bans.ban_text(puuid)
+        signature = list(user_data.get('data_signature') or ())
+        if len(signature) > 4:
+            signature[4] = ban_text
+        user_data['data_signature'] = tuple(signature)
+        
+        slot_key = (puuid, user_data['data_signature'])
+        if self.published_slots.get(slot) == slot_key:
+            return False
+        
+        async with self.publish_lock:
+            return await self.publish_slot(slot, user_data, self.state.get_slot_message_id(slot), slot_key, ban_text)
 
-    async def edit_or_send_message(self, user_data, message_id, rank_name="ERROR", elo=0, ranking_in_tier=0, rank_icon=None, agent_img=None, account_level=0, ban_text=None):
+    async def edit_published_message(self, kind, channel, message_id, **kwargs):
         
+        webhook = self.webhook_sink.get(kind)
+        if webhook:
+            return await self.safe_discord_request(webhook.edit_message, message_id, **kwargs)
+        return await self.safe_discord_request(channel.get_partial_message(message_id).edit, **kwargs)
+
+    async def send_published_message(self, kind, channel, **kwargs):
+        
+        webhook = self.webhook_sink.get(kind)
+        if webhook:
+            return await self.safe_discord_request(webhook.send, wait=True, **kwargs)
+        return await self.safe_discord_request(channel.send, **kwargs)
+
+    async def retire_bot_message(self, channel, message_id):
         
         try:
-            img_bio = await asyncio.to_thread(
-                create_rank_card, 
-                user_data, rank_name, elo, ranking_in_tier, rank_icon, agent_img, account_level, ban_text
-            )
+            await channel.get_partial_message(message_id).delete()
+            logger.info(f"🧹 Removed superseded bot message {message_id}")
+        except discord.HTTPException:
+            pass
+
+    async def render_card(self, user_data, ban_text=None):
+        
+        key = (
+            user_data.get('data_signature'), ban_text,
+            user_data.get('rank_icon_cache') is not None, user_data.get('agent_img_cache') is not None
+        )
+        cached = self.card_images.get(user_data['puuid'])
+        if cached and cached[0] == key:
+            return cached[1]
+        
+        img_bio = await self.heartbeats.run(
+            'render', user_data['name'], RENDER_EXECUTOR.run, create_rank_card, 
+            user_data, user_data['rank_name'], user_data['elo'], user_data.get('ranking_in_tier', 0),
+            user_data.get('rank_icon_cache'), user_data.get('agent_img_cache'), user_data.get('account_level', 0), ban_text,
+        )
+        img_bytes = img_bio.getvalue()
+        self.card_images[user_data['puuid']] = (key, img_bytes)
+        return img_bytes
+
+    async def edit_or_send_message(self, user_data, message_id, rank_name="ERROR", elo=0, ranking_in_tier=0, ban_text=None):
+        
+        
+        try:
+            img_bytes = await self.render_card(user_data, ban_text)
         except Exception as e:
             logger.error(f"❌ CRASH inside create_rank_card for {user_data['name']}: {e}")
             raise e
@@ -1268,45 +3196,43 @@ class ValorantBot(commands.Bot):
             f"Password: ||{user_data['password']}||"
             
         )
-        file = discord.File(img_bio, filename="valorant_rank.png")
         
+        retired_id = None
         try:
             if message_id:
                 try:
-                    message = await self.safe_discord_request(self.channel.fetch_message, message_id)
-                    
-                    try:
-                        await self.safe_discord_request(message.edit, content=message_content, attachments=[file])
-                        logger.info(f"✅ Modified message for {user_data['name']} (id {message_id})")
-                        return message_id
-                    except Exception as e_edit:
-                        
-                        logger.warning(f"⚠️ Attachment edit failed for {message_id}: {e_edit}. Recreating message.")
-                        try:
-                            await self.safe_discord_request(message.delete)
-                        except Exception:
-                            pass
-                        new_msg = await self.safe_discord_request(self.channel.send, content=message_content, file=file)
-                        self.set_user_message_id(user_data['puuid'], new_msg.id)
-                        logger.info(f"✅ Recreated message for {user_data['name']} (new id {new_msg.id})")
-                        return new_msg.id
+                    file = discord.File(BytesIO(img_bytes), filename="valorant_rank.png")
+                    await self.edit_published_message('cards', self.channel, message_id, content=message_content, attachments=[file])
+                    logger.info(f"✅ Modified message for {user_data['name']} (id {message_id})")
+                    return message_id
                 except discord.NotFound:
                     logger.warning(f"⚠️ Message id {message_id} not found for {user_data['name']}, sending new.")
+                    if self.webhook_sink.get('cards'):
+                        retired_id = message_id
                 except discord.Forbidden:
-                    logger.error(f"❌ Permission error editing message for {user_data['name']}")
+                    if not self.webhook_sink.get('cards'):
+                        logger.error(f"❌ Permission error editing message for {user_data['name']}")
+                        return None
+                    logger.warning(f"⚠️ Message id {message_id} for {user_data['name']} is not owned by the webhook, posting a webhook copy to adopt.")
+                    retired_id = message_id
                 except Exception as e:
                     logger.error(f"❌ Message edit error for {user_data['name']}: {e}")
+                    return None
             
             
-            message = await self.safe_discord_request(self.channel.send, content=message_content, file=file)
+            file = discord.File(BytesIO(img_bytes), filename="valorant_rank.png")
+            message = await self.send_published_message('cards', self.channel, content=message_content, file=file)
+            self.set_user_message_id(user_data['puuid'], message.id)
             logger.info(f"✅ Sent new message for {user_data['name']} (id {message.id})")
+            if retired_id:
+                await self.retire_bot_message(self.channel, retired_id)
             return message.id
         except Exception as e:
             logger.error(f"❌ Send/edit message failure for {user_data['name']}: {e}")
             return None
 
     
-    async def update_leaderboard(self):
+    async def update_leaderboard(self, patch_puuid=None):
         
         logger.info("🏆 Starting leaderboard update...")
         
@@ -1325,253 +3251,377 @@ class ValorantBot(commands.Bot):
 
         
         
-        sorted_users = sorted(
-            self.users_data_cache, 
-            key=lambda x: (x.get('current_tier', 0) * 100) + x.get('ranking_in_tier', 0), 
-            reverse=True
-        )
+        sorted_users = sorted(self.users_data_cache, key=rank_sort_key, reverse=True)
+        order = tuple(u['puuid'] for u in sorted_users)
         
         
         try:
-            img_bio = await asyncio.to_thread(create_leaderboard_image, sorted_users)
+            if patch_puuid in order and self.leaderboard_image and self.leaderboard_image[0] == order:
+                img_bio = await RENDER_EXECUTOR.run(patch_leaderboard_image, self.leaderboard_image[1], sorted_users, order.index(patch_puuid))
+                logger.info(f"🩹 Leaderboard row #{order.index(patch_puuid) + 1} patched, order unchanged")
+            else:
+                img_bio = await RENDER_EXECUTOR.run(create_leaderboard_image, sorted_users)
         except Exception as e:
             logger.error(f"❌ Leaderboard image generation error: {e}")
             return
 
-        file = discord.File(img_bio, filename="leaderboard.png")
+        img_bytes = img_bio.getvalue()
+        self.leaderboard_image = (order, img_bytes)
         
         
         message_sent = False
+        retired_id = None
+        leaderboard_message_id = self.state.get_leaderboard_message_id()
         
-        if LEADERBOARD_MESSAGE_ID != 0:
+        if leaderboard_message_id:
             try:
-                message = await channel.fetch_message(LEADERBOARD_MESSAGE_ID)
-                await message.edit(attachments=[file])
-                logger.info(f"✅ Leaderboard updated (ID: {LEADERBOARD_MESSAGE_ID})")
+                file = discord.File(BytesIO(img_bytes), filename="leaderboard.png")
+                await self.edit_published_message('leaderboard', channel, leaderboard_message_id, attachments=[file])
+                logger.info(f"✅ Leaderboard updated (ID: {leaderboard_message_id})")
                 message_sent = True
             except discord.NotFound:
-                logger.warning(f"⚠️ Leaderboard Message {LEADERBOARD_MESSAGE_ID} not found. Creating a new one.")
+                logger.warning(f"⚠️ Leaderboard Message {leaderboard_message_id} not found. Creating a new one.")
+                if self.webhook_sink.get('leaderboard'):
+                    retired_id = leaderboard_message_id
+            except discord.Forbidden as e:
+                if not self.webhook_sink.get('leaderboard'):
+                    logger.error(f"❌ Leaderboard edit error: {e}")
+                    return
+                logger.warning(f"⚠️ Leaderboard Message {leaderboard_message_id} is not owned by the webhook. Posting a webhook copy to adopt.")
+                retired_id = leaderboard_message_id
             except Exception as e:
                 logger.error(f"❌ Leaderboard edit error: {e}")
+                return
 
         if not message_sent:
             try:
-                new_msg = await channel.send(file=file)
-                logger.critical(f"⚠️ NEW LEADERBOARD MESSAGE CREATED: ID {new_msg.id}")
-                logger.critical(f"⚠️ >>> UPDATE THE 'LEADERBOARD_MESSAGE_ID' CONSTANT IN CODE WITH: {new_msg.id} <<<")
+                file = discord.File(BytesIO(img_bytes), filename="leaderboard.png")
+                new_msg = await self.send_published_message('leaderboard', channel, file=file)
+                self.state.set_leaderboard_message_id(new_msg.id)
+                logger.warning(f"⚠️ New leaderboard message created and adopted: ID {new_msg.id}")
+                if retired_id:
+                    await self.retire_bot_message(channel, retired_id)
             except Exception as e:
                 logger.error(f"❌ New leaderboard send error: {e}")
 
-    async def update_all_users(self):
-        
-        if self.is_updating:
-            logger.warning("⚠️ Update already in progress, skip")
-            return False
-        
-        
-        self.is_updating = True
+    async def publish_slot(self, i, user_data, msg_id, slot_key, ban_text):
         
         try:
-            logger.info("🔄 Starting update for all users")
-            success_count = 0
-
-            
+            logger.info(f"📍 User {user_data['name']} assigned to Slot #{i+1} (ID: {msg_id})")
+            
+            result_id = await self.edit_or_send_message(
+                user_data, msg_id, 
+                rank_name=user_data['rank_name'], 
+                elo=user_data['elo'], 
+                ranking_in_tier=user_data.get('ranking_in_tier', 0),
+                ban_text=ban_text
+            )
             
+            if result_id is None:
+                self.published_slots.pop(i, None)
+                return False
             
-            any_update = False 
+            self.published_slots[i] = slot_key
+            self.state.set_slot_message_id(i, result_id)
+            self.set_user_message_id(user_data['puuid'], result_id)
+            logger.info(f"✅ Slot {i+1} updated with {user_data['name']}")
+            return True
             
+        except Exception as e:
+            self.published_slots.pop(i, None)
+            logger.error(f"Update message loop error {user_data['name']}: {e}")
+            return False
+
+    async def publish_slots(self, fetched_users, active_bans):
+        
+        skipped = 0
+        jobs = []
+        
+        for i, user_data in enumerate(fetched_users):
+            if i >= len(HARDCODED_MESSAGE_IDS):
+                logger.warning(f"⚠️ No slot available for {user_data['name']} (Position {i+1})")
+                continue
             
+            msg_id = self.state.get_slot_message_id(i)
+            slot_key = (user_data['puuid'], user_data.get('data_signature'))
             
-            active_bans = {}
-            if self.channel:
-                logger.info("🕵️ Checking active bans in channel...")
-                active_bans = await self.check_active_bans(self.channel)
-
+            if msg_id and self.published_slots.get(i) == slot_key:
+                skipped += 1
+                logger.info(f"💤 Slot {i+1} unchanged ({user_data['name']}), skip edit")
+                continue
             
-            fetched_users = []
+            previous = self.published_slots.get(i)
+            if previous and previous[0] != user_data['puuid']:
+                logger.info(f"🔀 Slot {i+1} moved to {user_data['name']}")
             
-            for i, user in enumerate(USERS):
-                try:
-                    
-                    await asyncio.sleep(5)
-                    
-                    logger.info(f"🔄 Fetching data for {user['name']} ({i+1}/{len(USERS)})...")
-                    
-                    
-                    rank_name, icon_url, elo, ranking_in_tier, current_tier = await self.get_valorant_rank(user['puuid'], name=user['name'])
-                    
-                    
-                    account_level = 0
-                    if rank_name in ["UNRANKED", "ERROR"]:
-                        account_level = await self.get_account_level(user['puuid'])
+            jobs.append(functools.partial(
+                self.heartbeats.run, 'publish', f"slot {i+1} ({user_data['name']})",
+                self.publish_slot, i, user_data, msg_id, slot_key, active_bans.get(user_data['puuid'])
+            ))
+        
+        results = await self.publisher.run(jobs)
+        edited = sum(1 for r in results if r)
+        
+        self.publish_stats = {'edited': edited, 'skipped': skipped}
+        logger.info(f"📤 Publish done: {edited} edited, {skipped} skipped (unchanged) in {self.publisher.last_duration:.1f}s")
+        return edited, skipped
 
-                    
-                    last_agent_name, last_agent_icon_url = await self.get_last_match_agent(user['puuid'])
-                    
-                    
-                    if not last_agent_icon_url:
-                        last_agent_name = "Unknown"
-                        last_agent_icon_url = None
+    async def load_account_assets(self, user_data):
+        
+        user_data.update({'rank_icon_cache': None, 'rank_icon_lb': None, 'agent_img_cache': None})
+        
+        icon_url = user_data.get('icon_url')
+        if icon_url:
+            try:
+                user_data['rank_icon_cache'] = await ASSETS.get_image(self.session, icon_url, width=70, height=70)
+                user_data['rank_icon_lb'] = await ASSETS.get_image(self.session, icon_url, width=50, height=50)
+            except Exception as e:
+                logger.error(f"Rank icon download error {user_data['name']}: {e}")
+        
+        agent_icon_url = user_data.get('agent_icon_url')
+        if agent_icon_url:
+            try:
+                user_data['agent_img_cache'] = await ASSETS.get_image(self.session, agent_icon_url, width=80, height=80)
+            except Exception as e:
+                logger.error(f"Agent download error {user_data['name']}: {e}")
+        return user_data
 
-                    
-                    user_ban_text = active_bans.get(user['puuid'])
-                    data_signature = (rank_name, elo, ranking_in_tier, account_level, user_ban_text, last_agent_name, current_tier)
-                    
-                    needs_update = True  
-                    
-                    
-                    if self.last_data_cache.get(user['puuid']) == data_signature:
-                        needs_update = False
-                        logger.info(f"💤 No changes for {user['name']} (Agent: {last_agent_name})")
-                    else:
-                        logger.info(f"🔄 Detected change for {user['name']} (Agent: {last_agent_name})")
-                        self.last_data_cache[user['puuid']] = data_signature
-                    
-                    
+    def save_snapshot(self):
+        
+        accounts = {}
+        for puuid, user_data in self.account_data.items():
+            accounts[puuid] = {field: user_data.get(field) for field in SNAPSHOT_FIELDS}
+        
+        self.state.data['snapshot'] = {
+            'saved_at': time.time(),
+            'signatures': {puuid: list(sig) for puuid, sig in self.last_data_cache.items()},
+            'published': {str(slot): [key[0], list(key[1] or ())] for slot, key in self.published_slots.items()},
+            'accounts': accounts,
+        }
+        self.state.mark_dirty('snapshot')
+        logger.info(f"💾 State snapshot saved ({len(accounts)} accounts, {len(self.published_slots)} slots)")
 
-                    
-                    rank_icon_card = None
-                    rank_icon_leaderboard = None
-                    if icon_url:
-                        try:
-                             rank_icon_card = await ASSETS.get_image(self.session, icon_url, width=70, height=70)
-                             rank_icon_leaderboard = await ASSETS.get_image(self.session, icon_url, width=50, height=50)
-                        except Exception as e:
-                            logger.error(f"Rank icon download error {user['name']}: {e}")
+    def restore_snapshot(self):
+        
+        snapshot = self.state.data.get('snapshot')
+        if not isinstance(snapshot, dict) or 'signatures' not in snapshot:
+            return False
+        
+        try:
+            start = time.perf_counter()
+            signatures = {puuid: tuple(sig) for puuid, sig in snapshot['signatures'].items()}
+            published = {int(slot): (key[0], tuple(key[1])) for slot, key in snapshot.get('published', {}).items()}
+            accounts = {}
+            for puuid, fields in snapshot.get('accounts', {}).items():
+                if puuid not in USERS_BY_PUUID:
+                    continue
+                user_data = USERS_BY_PUUID[puuid].copy()
+                user_data.update(fields)
+                user_data['data_signature'] = tuple(user_data.get('data_signature') or ())
+                accounts[puuid] = user_data
+        except Exception as e:
+            logger.error(f"❌ Snapshot is corrupt, ignoring it: {e}")
+            return False
+        
+        self.last_data_cache.update(signatures)
+        self.published_slots.update(published)
+        self.account_data.update(accounts)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        logger.info(f"⚡ State restored from local snapshot in {elapsed_ms:.1f}ms ({len(accounts)} accounts, {len(published)} slots)")
+        return True
 
-                    
-                    agent_img_card = None
-                    if last_agent_icon_url:
-                        try:
-                            agent_img_card = await ASSETS.get_image(self.session, last_agent_icon_url, width=80, height=80)
-                        except Exception as e:
-                            logger.error(f"Agent download error {user['name']}: {e}")
-                    
-                    
-                    user_data = user.copy()
-                    user_data.update({
-                        'rank_name': rank_name,
-                        'elo': elo,
-                        'ranking_in_tier': ranking_in_tier,
-                        'current_tier': current_tier, 
-                        'account_level': account_level,
-                        'rank_icon_cache': rank_icon_card,
-                        'rank_icon_lb': rank_icon_leaderboard,
-                        'agent_img_cache': agent_img_card,
-                        'last_agent_name': last_agent_name,
-                        'needs_update': needs_update,
-                        'timestamp': get_rome_time().strftime("%H:%M %d/%m")
-                    })
-                    
-                    fetched_users.append(user_data)
-                    
-                    logger.info(f"📊 Data retrieved for {user['name']} - Tier: {current_tier} - ELO: {elo}")
+    async def fetch_account(self, user, active_bans):
+        
+        rank_name, icon_url, elo, ranking_in_tier, current_tier, mmr_change = await self.get_valorant_rank(user['puuid'], name=user['name'])
+        
+        
+        account_level = 0
+        if rank_name in ["UNRANKED", "ERROR"]:
+            account_level = await self.get_account_level(user['puuid'])
 
-                except Exception as e:
-                    logger.error(f"❌ User data fetch error {user['name']}: {e}")
-                    
-                    user_data = user.copy()
-                    user_data.update({
-                        'rank_name': 'ERROR', 'elo': -1, 'ranking_in_tier': 0, 'current_tier': 0, 'account_level': 0, 
-                        'rank_icon_cache': None, 'rank_icon_lb': None, 'agent_img_cache': None, 
-                        'needs_update': False
-                    })
-                    fetched_users.append(user_data)
+        
+        last_agent_name, last_agent_icon_url, match_records = await self.get_last_match_agent(user['puuid'])
+        
+        
+        if mmr_change is None:
+            if match_records:
+                logger.info(f"⏭️ Rank for {user['name']} came from cache, match records deferred to the next live refresh")
+        else:
+            self.store_matches(match_records, mmr_change)
+        
+        
+        if not last_agent_icon_url:
+            last_agent_name = "Unknown"
+            last_agent_icon_url = None
 
-            
-            
-            fetched_users.sort(key=lambda x: (x.get('current_tier', 0) * 100) + x.get('ranking_in_tier', 0), reverse=True)
-            
-            
-            self.users_data_cache = []
-            for u in fetched_users:
-                self.users_data_cache.append({
-                    'name': u['name'].split('#')[0],
-                    'rank': u['rank_name'],
-                    'elo': u['elo'],
-                    'ranking_in_tier': u.get('ranking_in_tier', 0),
-                    'current_tier': u.get('current_tier', 0), 
-                    'agent_img': u['agent_img_cache'],
-                    'rank_icon': u['rank_icon_lb']
-                })
+        
+        user_ban_text = active_bans.get(user['puuid'])
+        data_signature = (rank_name, elo, ranking_in_tier, account_level, user_ban_text, last_agent_name, current_tier)
+        
+        needs_update = True  
+        
+        
+        if self.last_data_cache.get(user['puuid']) == data_signature:
+            needs_update = False
+            logger.info(f"💤 No changes for {user['name']} (Agent: {last_agent_name})")
+        else:
+            logger.info(f"🔄 Detected change for {user['name']} (Agent: {last_agent_name})")
+            self.last_data_cache[user['puuid']] = data_signature
+        
+        
+        user_data = user.copy()
+        user_data.update({
+            'rank_name': rank_name,
+            'elo': elo,
+            'ranking_in_tier': ranking_in_tier,
+            'current_tier': current_tier, 
+            'account_level': account_level,
+            'icon_url': icon_url,
+            'agent_icon_url': last_agent_icon_url,
+            'last_agent_name': last_agent_name,
+            'needs_update': needs_update,
+            'data_signature': data_signature,
+            'timestamp': get_rome_time().strftime("%H:%M %d/%m")
+        })
+        await self.load_account_assets(user_data)
+        
+        logger.info(f"📊 Data retrieved for {user['name']} - Tier: {current_tier} - ELO: {elo}")
+        return user_data
+
+    async def publish_accounts(self, fetched_users, active_bans, pending_edits=0, changed_puuid=None):
+        
+        fetched_users = sorted(fetched_users, key=rank_sort_key, reverse=True)
+        
+        
+        self.users_data_cache = []
+        for u in fetched_users:
+            self.users_data_cache.append({
+                'puuid': u['puuid'],
+                'name': u['name'].split('#')[0],
+                'rank': u['rank_name'],
+                'elo': u['elo'],
+                'ranking_in_tier': u.get('ranking_in_tier', 0),
+                'current_tier': u.get('current_tier', 0), 
+                'agent_img': u['agent_img_cache'],
+                'rank_icon': u['rank_icon_lb']
+            })
 
+        
+        async with self.publish_lock:
+            edited, skipped = await self.publish_slots(fetched_users, active_bans)
+            edited += pending_edits
+            
             
-            for i, user_data in enumerate(fetched_users):
+            if edited:
                 try:
-                    
-                    
-                    
-                    
-                    
+                    await self.heartbeats.run('leaderboard', "leaderboard", self.update_leaderboard, changed_puuid)
+                except asyncio.TimeoutError as e:
+                    logger.error(f"❌ Leaderboard update abandoned: {e}")
+            else:
+                logger.info("💤 Leaderboard skip update (no changes)")
+        
+        self.save_snapshot()
+        await self.flush_persistence()
+        return edited
 
-                    
-                    await asyncio.sleep(4)
+    @property
+    def is_updating(self):
+        return self.updates.running
 
-                    
-                    
-                    
-                    
-                    
-                        
-                    
-                    any_update = True 
-                    
-                    
-                    if i < len(HARDCODED_MESSAGE_IDS):
-                        msg_id = HARDCODED_MESSAGE_IDS[i]
-                        logger.info(f"📍 User {user_data['name']} assigned to Slot #{i+1} (ID: {msg_id})")
-                    else:
-                        logger.warning(f"⚠️ No slot available for {user_data['name']} (Position {i+1})")
-                        continue
-                    
-                    
-                    try:
-                        
-                        await self.edit_or_send_message(
-                            user_data, msg_id, 
-                            rank_name=user_data['rank_name'], 
-                            elo=user_data['elo'], 
-                            ranking_in_tier=user_data.get('ranking_in_tier', 0),
-                            rank_icon=user_data.get('rank_icon_cache'),
-                            agent_img=user_data.get('agent_img_cache'),
-                            account_level=user_data.get('account_level', 0),
-                            ban_text=active_bans.get(user_data['puuid'])
-                        )
-                        
-                        
-                        self.set_user_message_id(user_data['puuid'], msg_id)
-                        logger.info(f"✅ Slot {i+1} updated with {user_data['name']}")
-                            
-                    except Exception as e:
-                        logger.error(f"Update message loop error {user_data['name']}: {e}")
+    async def update_all_users(self, fresh=False):
+        
+        return await self.updates.request(fresh=fresh)
 
-                except Exception as e:
-                    logger.error(f"Final update loop error for {user_data['name']}: {e}")
+    async def run_update_cycle(self):
+        
+        try:
+            logger.info("🔄 Starting update for all users")
+            
             
+            active_bans = self.bans.active_ban_texts()
+
             
+            cycle = {'active_bans': active_bans, 'fetched': {}, 'edited': 0}
+            processed = await self.update_pipeline.run(USERS, cycle, feed_interval=PIPELINE_SETTINGS.get('fetch_delay', 5))
+            logger.info(f"⏱️ Update pipeline: {self.update_pipeline.describe()}")
             
-            if any_update:
-                await self.update_leaderboard()
-            else:
-                logger.info("💤 Leaderboard skip update (no changes)")
-                    
-            logger.info(f"✅ Update completed. Successfully processed {len(fetched_users)}/{len(USERS)} users")
+            
+            fetched_users = [self.account_data[u['puuid']] for u in USERS if u['puuid'] in self.account_data]
+            await self.publish_accounts(fetched_users, active_bans, pending_edits=cycle['edited'])
+            logger.info(f"✅ Update completed. Successfully processed {len(processed)}/{len(USERS)} users")
+            return True
 
         except Exception as e:
             logger.error(f"❌ UPDATE ROUTINE CRASH: {e}")
             await self.send_crash_log("UPDATE ROUTINE", e)
+            return False
         finally:
-            self.is_updating = False
-            logger.info("🔓 Update Lock released.")
+            logger.info("🔓 Update cycle finished.")
             
             
-            jitter =  np.random.randint(0, 30)
-            wait_time = UPDATE_INTERVAL + jitter
-            self.next_update_time = time.time() + wait_time
+            self.restart_update_timer()
+
+    async def pipeline_fetch(self, user, cycle):
+        
+        logger.info(f"🔄 Fetching data for {user['name']}...")
+        try:
+            user_data = await self.heartbeats.run('fetch', user['name'], self.fetch_account, user, cycle['active_bans'])
+            self.account_data[user['puuid']] = user_data
+            return user_data
+        except Exception as e:
+            logger.error(f"❌ User data fetch error {user['name']}: {e}")
+            
+            user_data = user.copy()
+            user_data.update({
+                'rank_name': 'ERROR', 'elo': -1, 'ranking_in_tier': 0, 'current_tier': 0, 'account_level': 0, 
+                'rank_icon_cache': None, 'rank_icon_lb': None, 'agent_img_cache': None, 
+                'needs_update': False, 'data_signature': ('ERROR',)
+            })
+            self.account_data.setdefault(user['puuid'], user_data)
+            return user_data
+
+    async def pipeline_render(self, user_data, cycle):
+        
+        try:
+            await self.render_card(user_data, cycle['active_bans'].get(user_data['puuid']))
+        except Exception as e:
+            logger.error(f"❌ Card render error {user_data['name']}: {e}")
+        return user_data
+
+    async def pipeline_publish(self, batch, cycle):
+        
+        for user_data in batch:
+            cycle['fetched'][user_data['puuid']] = user_data
+        provisional = [cycle['fetched'].get(u['puuid']) or self.account_data.get(u['puuid']) for u in USERS]
+        if not all(provisional):
+            return batch
+        provisional.sort(key=rank_sort_key, reverse=True)
+        
+        async with self.publish_lock:
+            edited, _ = await self.publish_slots(provisional, cycle['active_bans'])
+        cycle['edited'] += edited
+        return batch
+
+    async def refresh_account(self, puuid):
+        
+        user = USERS_BY_PUUID.get(puuid)
+        if not user:
+            return None
+        if self.is_updating:
+            logger.info(f"⏭️ Skipping refresh of {user['name']}, full update in progress")
+            return None
+        
+        try:
+            logger.info(f"🔄 Scheduled refresh for {user['name']}...")
+            active_bans = self.bans.active_ban_texts()
+            self.account_data[puuid] = await self.fetch_account(user, active_bans)
             
             
-            next_run_dt = datetime.now() + timedelta(seconds=wait_time)
-            logger.info(f"⏰ Next update in {wait_time // 3600}h {(wait_time % 3600) // 60}m (Jitter: {jitter}s)")
+            fetched_users = [self.account_data[u['puuid']] for u in USERS if u['puuid'] in self.account_data]
+            return await self.publish_accounts(fetched_users, active_bans, changed_puuid=puuid) > 0
+        except Exception as e:
+            logger.error(f"❌ Refresh error {user['name']}: {e}")
+            return None
 
     
     async def restore_state_from_discord(self):
@@ -1645,134 +3695,60 @@ class ValorantBot(commands.Bot):
             
         
         
-        await self.restore_state_from_discord()
+        if not self.last_data_cache:
+            logger.warning("⚠️ No usable local snapshot, falling back to Discord scan")
+            await self.restore_state_from_discord()
         
         
-        if self.skip_initial_update:
-            logger.info("⏭️ Skipping first update (restart after forceupdate)")
-            self.skip_initial_update = False
-        else:
+        if any(u['puuid'] not in self.account_data for u in USERS):
             logger.info("🚀 First update on startup...")
             await self.update_all_users()
+        else:
+            self.scheduler.spread(u['puuid'] for u in USERS)
         
         
-        self.next_update_time = time.time() + UPDATE_INTERVAL
-        
-        
-        while not self.is_closed():
-            
-            
-            
-            current_time = time.time() 
-            jitter = random.gauss(0, 120) 
-            
-            
-            target_time = self.next_update_time + jitter
-            sleep_time = max(0, target_time - current_time)
-            
-            hours = int(sleep_time // 3600)
-            minutes = int((sleep_time % 3600) // 60)
-            logger.info(f"⏰ Next update in {hours}h {minutes}m (Jitter: {int(jitter)}s)")
-            
-            await asyncio.sleep(sleep_time)
-            
-            logger.info("🔄 Starting scheduled update...")
-            await self.update_all_users()
-            
-            
-            self.next_update_time = time.time() + UPDATE_INTERVAL
+        logger.info(f"🗓️ Scheduler started: {len(self.scheduler)} accounts, one every {int(self.scheduler.spacing)}s")
+        await self.scheduler.run(self.scheduled_refresh)
 
-    
-    async def connect_email(self):
+    async def scheduled_refresh(self, puuid, priority=False):
         
+        self.heartbeats.beat('scheduler')
+        if priority and self.is_updating:
+            logger.info(f"⏳ Priority refresh of {USERS_BY_PUUID.get(puuid, {}).get('name', puuid)} queued until the full update finishes")
+            await self.updates.wait_idle()
         try:
-            return await asyncio.to_thread(self._connect_email_blocking)
-        except Exception as e:
-            logger.error(f"❌ Gmail IMAP connection error: {e}")
+            return await self.heartbeats.run('refresh', USERS_BY_PUUID.get(puuid, {}).get('name', puuid), self.refresh_account, puuid)
+        except asyncio.TimeoutError as e:
+            logger.error(f"❌ Scheduled refresh abandoned: {e}")
             return None
 
-    def _connect_email_blocking(self):
-        
-        ssl_context = ssl.create_default_context()
-        client = IMAPClient(IMAP_SERVER, port=IMAP_PORT, ssl=True, ssl_context=ssl_context)
-        client.login(EMAIL_ADDRESS, EMAIL_PASSWORD)
-        client.select_folder("INBOX")
-        logger.info("🔐 Gmail IMAP connected for code monitoring")
-        return client
-
+    
     def extract_code(self, text: str) -> str | None:
         
-        if not text:
-            return None
-        
-        
-        
-        patterns = [
-            r"(?:verification\s*code|security\s*code|authentication\s*code|access\s*code)(?:\s*is)?[:;\s]*(\d{6})",
-            r"(?:your|il\s*tuo)\s*(?:verification|security|authentication|access)?\s*code(?:\s*is)?[:;\s]*(\d{6})",
-            r"(?:codice\s*di\s*(?:verifica|sicurezza|accesso))[:;\s]*(\d{6})",
-            r"use\s*(?:this\s*)?code[:;\s]*(\d{6})",
-            r"enter\s*(?:this\s*)?code[:;\s]*(\d{6})",
-            
-            r"رمز\s+تسجيل\s+الدخول[:\s]*(\d{6})", 
-            r"إليك\s+رمز\s+تسجيل\s+الدخول[:\s]*(\d{6})", 
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                code = match.group(1)
-                logger.info(f"🔢 Authentication code found with pattern '{pattern}': {code}")
-                return code
+        match = CODE_CLASSIFIER.match_code(text)
+        if match:
+            logger.info(f"🔢 Authentication code found with rule '{match['locale']}/{match['rule']}': {match['code']}")
+            return match['code']
         
         return None
 
     def is_riot_games_email(self, text: str) -> bool:
         
-        if not text:
-            return False
-        
-        text_lower = text.lower()
-        
-        
-        explicit_riot_patterns = [
-            r"riot\s+games",            
-            r"from\s+riot\s+games",     
-            r"team\s+riot\s+games",     
-            r"riot\s+games\s+(?:inc|team|support)",  
-        ]
-        
-        
-        has_explicit_riot = any(re.search(pattern, text_lower) for pattern in explicit_riot_patterns)
-        
-        if not has_explicit_riot:
+        if not CODE_CLASSIFIER.match_sender(text):
             return False
         
-        
-        exclude_patterns = [
-            r"monitor\s+is\s+(?:up|down)",
-            r"uptime\s+monitor",
-            r"status\s+change",
-            r"service\s+monitor",
-            r"ping\s+monitor",
-            r"healthcheck",
-            r"alert\s*:",
-            r"notification\s+from",
-            r"automated\s+alert",
-        ]
-        
-        
-        if any(re.search(pattern, text_lower) for pattern in exclude_patterns):
-            logger.info(f"🚫 Email ignored - appears to be an automatic monitor/alert")
+        excluded = CODE_CLASSIFIER.match_exclude(text)
+        if excluded:
+            logger.info(f"🚫 Email ignored - appears to be an automatic monitor/alert ({excluded})")
             return False
         
         return True
 
-    async def send_code_to_discord(self, code: str):
+    async def send_code_to_discord(self, code: str, mailbox: str = None):
         
         try:
             if not self.codes_channel:
-                return
+                return False
                 
             try:
                 
@@ -1786,168 +3762,240 @@ class ValorantBot(commands.Bot):
                 color=0xA020F0,
                 timestamp=now_rome
             )
+            if mailbox:
+                embed.add_field(name="📬 Inbox", value=mailbox, inline=False)
             embed.set_footer(text="Bot Codes Riot Games", icon_url="https://i.imgur.com/Mrn3y3V.png")
             embed.set_thumbnail(url="https://logos-world.net/wp-content/uploads/2020/10/Riot-Games-Logo.png")
             
             await self.codes_channel.send(embed=embed)
             logger.info(f"✅ Riot Games code {code} sent to Discord!")
+            return True
             
         except Exception as e:
             logger.error(f"❌ Error sending code to Discord: {e}")
+            return False
 
     
-    async def check_email_once(self):
+    async def classify_email_uids(self, client, uids, visible_ts=None):
         
+        if not uids:
+            return []
         
-        async with self.email_lock:
-            
-            if not self.email_client:
-                self.email_client = await self.connect_email()
-                
-            if not self.email_client:
-                return None
-
+        
+        headers = await IMAP_EXECUTOR.run(client.fetch, uids, ['ENVELOPE', 'BODYSTRUCTURE'])
+        
+        candidates = {}
+        for uid in sorted(headers):
             try:
+                envelope = headers[uid][b'ENVELOPE']
                 
-                today_rome = get_rome_time().date()
-                search_date_str = today_rome.strftime("%d-%b-%Y")
+                email_ts = None
+                if envelope.date:
+                    email_date = envelope.date
+                    now = datetime.now(email_date.tzinfo)
+                    age_minutes = (now - email_date).total_seconds() / 60
+                    
+                    if age_minutes > CODE_MAX_AGE_MINUTES:
+                        logger.debug(f"⏳ Email ignored because it's {int(age_minutes)} min old")
+                        continue
+                    email_ts = email_date.timestamp()
                 
+                sender = format_envelope_sender(envelope)
+                subject = decode_mime_words(envelope.subject)
                 
+                structure = headers[uid][b'BODYSTRUCTURE']
+                section = find_text_section(structure)
+                if not section and not structure.is_multipart:
+                    section = body_section_info(structure, '1')
+                candidates[uid] = {'sender': sender, 'subject': subject, 'email_ts': email_ts, 'section': section}
+            except Exception as e:
+                logger.error(f"Email parsing error {uid}: {e}")
+        
+        
+        by_section = {}
+        for uid, info in candidates.items():
+            if info['section']:
+                by_section.setdefault(info['section'][0], []).append(uid)
+        
+        bodies = {}
+        for section, section_uids in by_section.items():
+            fetched = await IMAP_EXECUTOR.run(client.fetch, section_uids, [f'BODY.PEEK[{section}]<0.{BODY_FETCH_BYTES}>'])
+            for uid, data in fetched.items():
+                for key, value in data.items():
+                    if key.startswith(b'BODY[') and value:
+                        bodies[uid] = value
+        fetched_ts = time.time()
+        
+        found_codes = []
+        for uid, info in candidates.items():
+            try:
+                body = ''
+                if uid in bodies:
+                    _, encoding, charset = info['section']
+                    body = decode_body_section(bodies[uid], encoding, charset)
                 
-                try:
-                    uids = await asyncio.to_thread(self.email_client.search, ['SINCE', search_date_str])
-                except (imap_exceptions.IMAPClientError, ssl.SSLError, EOFError, OSError) as e:
-                    logger.error(f"❌ Email search error (connection lost?): {e}")
-                    
-                    try:
-                        await asyncio.to_thread(self.email_client.logout)
-                    except:
-                        pass
-                    self.email_client = None
-                    return None
+                text_combined = f"From: {info['sender']}\nSubject: {info['subject']}\n{body}"
                 
-                if uids:
+                if self.is_riot_games_email(text_combined):
+                    code = self.extract_code(body) or self.extract_code(info['subject'])
                     
-                    last_uids = sorted(uids)[-15:]
-                    
-                    last_uids.reverse() 
-                    
-                    for uid in last_uids:
-                        try:
-                            
-                            if not self.email_client:
-                                break
-
-                            
-                            def fetch_message():
-                                
-                                return self.email_client.fetch(uid, ['RFC822'])[uid][b'RFC822']
-                            
-                            msg_data = await asyncio.to_thread(fetch_message)
-                            msg = email.message_from_bytes(msg_data)
-                            
-                            
-                            if 'Date' in msg:
-                                email_date = parsedate_to_datetime(msg['Date'])
-                                
-                                if email_date.tzinfo is None:
-                                    email_date = email_date.replace(tzinfo=ZoneInfo("UTC"))
-                                
-                                now = datetime.now(email_date.tzinfo)
-                                age = now - email_date
-                                age_minutes = age.total_seconds() / 60
-                                
-                                if age_minutes > CODE_MAX_AGE_MINUTES:
-                                    logger.debug(f"⏳ Email ignored because it's {int(age_minutes)} min old")
-                                    continue 
-                            
-                            
-                            subject_parts = decode_header(msg['Subject'])
-                            subject = ''
-                            for part, enc in subject_parts:
-                                if isinstance(part, bytes):
-                                    subject += part.decode(enc or 'utf-8', errors='ignore')
-                                else:
-                                    subject += str(part)
-                            
-                            sender = msg.get('From', '')
-                            body = ''
-                            if msg.is_multipart():
-                                for part in msg.walk():
-                                    if part.get_content_type() == 'text/plain':
-                                        body = part.get_payload(decode=True).decode('utf-8', errors='ignore')
-                                        break
-                            else:
-                                body = msg.get_payload(decode=True).decode('utf-8', errors='ignore')
-                            
-                            text_combined = f"From: {sender}\nSubject: {subject}\n{body}"
-                            
-                            if self.is_riot_games_email(text_combined):
-                                body_code = self.extract_code(body)
-                                subject_code = self.extract_code(subject)
-                                code = body_code or subject_code
-                                
-                                if code:
-                                    logger.info(f"✅ Found valid and recent code: {code}")
-                                    return code
-                                    
-                        except Exception as e:
-                            logger.error(f"Email parsing error {uid}: {e}")
-                            
-                            if "EOF" in str(e) or "socket" in str(e).lower():
-                                logger.error("💀 Socket died during fetch, abort loop.")
-                                self.email_client = None
-                                break
-                            continue
-                            
+                    if code:
+                        logger.info(f"✅ Found valid and recent code: {code}")
+                        timings = {'email': info['email_ts'], 'visible': visible_ts, 'fetched': fetched_ts, 'classified': time.time()}
+                        found_codes.append({'code': code, 'uid': uid, 'email_ts': info['email_ts'], 'timings': timings})
             except Exception as e:
-                logger.error(f"❌ check_email_once error (generic): {e}")
-                
-                self.email_client = None 
+                logger.error(f"Email parsing error {uid}: {e}")
         
-        return None
+        return found_codes
 
-    
-    async def check_email_for_codes(self):
+    async def sync_mailbox(self, mailbox):
         
-        while not self.is_closed():
+        async with mailbox.lock:
+            client = mailbox.client
+            uidvalidity = client.folder_info.get(b'UIDVALIDITY')
+            sync = self.state.section('email_sync').setdefault(mailbox.name, {})
+            last_uid = sync.get('last_uid', 0)
             
+            search_date_str = get_rome_time().date().strftime("%d-%b-%Y")
+            criteria = ['SINCE', search_date_str]
+            if CODE_SENDER_FILTER:
+                criteria += ['FROM', CODE_SENDER_FILTER]
             
+            if sync.get('uidvalidity') != uidvalidity:
+                
+                uids = await IMAP_EXECUTOR.run(client.search, criteria)
+                visible_ts = time.time()
+                candidates = sorted(uids)[-15:]
+                logger.info(f"📬 Mailbox baseline for {mailbox.name} (UIDVALIDITY {uidvalidity}): checking {len(candidates)} messages from today")
+                
+                last_uid = max(0, client.folder_info.get(b'UIDNEXT', 1) - 1)
+                sync.update({'uidvalidity': uidvalidity, 'last_uid': last_uid})
+                self.state.mark_dirty('email_sync')
+            else:
+                uids = await IMAP_EXECUTOR.run(client.search, ['UID', f'{last_uid + 1}:*'])
+                visible_ts = time.time()
+                new_uids = [uid for uid in uids if uid > last_uid]
+                if not new_uids:
+                    mailbox.last_used = time.time()
+                    return []
+                
+                
+                uids = await IMAP_EXECUTOR.run(client.search, ['UID', f'{last_uid + 1}:*'] + criteria)
+                candidates = sorted(uid for uid in uids if uid > last_uid)
+                last_uid = max(new_uids)
+            
+            found_codes = await self.classify_email_uids(client, candidates, visible_ts)
+            mailbox.last_used = time.time()
             
-            self.last_email_check_time = time.time()
+            if last_uid > sync['last_uid']:
+                sync['last_uid'] = last_uid
+                self.state.mark_dirty('email_sync')
+            
+            for found in found_codes:
+                found['mailbox'] = mailbox.name
+                found['uid'] = f"{mailbox.name}:{found['uid']}"
+            return found_codes
+
+    async def deliver_mailbox_codes(self, mailbox, found_codes):
+        
+        for found in found_codes:
+            found['delivered'] = await self.deliver_code(found)
+        mailbox.resolve_requests(found_codes)
+
+    async def run_mailbox_sync(self, mailbox):
+        
+        return await self.heartbeats.run('imap_sync', mailbox.name, self.sync_mailbox, mailbox, on_stall=mailbox.abort)
+
+    async def email_idle_loop(self, mailbox):
+        
+        if not await mailbox.ensure_connected():
+            mailbox.resolve_requests([])
+            await asyncio.sleep(IDLE_RECONNECT_DELAY)
+            return True
+        
+        client = mailbox.client
+        if not client.has_capability('IDLE'):
+            logger.warning(f"⚠️ IMAP server for {mailbox.name} does not support IDLE, falling back to polling")
+            return False
+        
+        mailbox.mode = "idle"
+        try:
+            logger.info(f"📡 IMAP IDLE active ({mailbox.name})")
             
-            code = await self.check_email_once()
             
+            await self.deliver_mailbox_codes(mailbox, await self.run_mailbox_sync(mailbox))
             
-            if code and code not in self.codes_history:
-                logger.info(f"🆕 NEW CODE FOUND: {code}")
+            while not self.is_closed():
+                await self.heartbeats.run('imap_idle', mailbox.name, IMAP_EXECUTOR.run, client.idle, on_stall=mailbox.abort)
+                started = time.monotonic()
+                woke = False
                 
-                self.save_code_to_history(code)
-                await self.send_code_to_discord(code)
-            elif code:
+                while time.monotonic() - started < IDLE_RENEW_SECONDS:
+                    responses = await self.heartbeats.run('imap_idle', mailbox.name, IMAP_EXECUTOR.run, client.idle_check, IDLE_CHECK_TIMEOUT, on_stall=mailbox.abort)
+                    mailbox.last_check = time.time()
+                    if any(len(r) > 1 and r[1] == b'EXISTS' for r in responses) or mailbox.sync_requested:
+                        woke = True
+                        break
                 
-                logger.debug(f"🔇 Code {code} ignored (already sent in the past)")
+                await self.heartbeats.run('imap_idle', mailbox.name, IMAP_EXECUTOR.run, client.idle_done, on_stall=mailbox.abort)
+                mailbox.last_used = time.time()
                 
-            await asyncio.sleep(CHECK_INTERVAL)
-    
-
-class RefreshView(discord.ui.View):
-    def __init__(self, bot):
-        super().__init__(timeout=None) 
-        self.bot = bot
+                if woke:
+                    await self.deliver_mailbox_codes(mailbox, await self.run_mailbox_sync(mailbox))
+                        
+        except (imap_exceptions.IMAPClientError, ssl.SSLError, EOFError, OSError, asyncio.TimeoutError) as e:
+            logger.error(f"❌ IMAP IDLE connection lost ({mailbox.name}): {e}. Reconnecting in {IDLE_RECONNECT_DELAY}s...")
+            mailbox.last_error = str(e)
+            await mailbox.disconnect()
+            mailbox.resolve_requests([])
+            await asyncio.sleep(IDLE_RECONNECT_DELAY)
+        return True
 
-    @discord.ui.button(label="Force Update", style=discord.ButtonStyle.primary, custom_id="force_refresh_all", emoji="🔄")
-    async def refresh_button(self, interaction: discord.Interaction, button: discord.ui.Button):
+    async def email_poll_loop(self, mailbox):
         
-        if interaction.guild_id != AUTH_GUILD_ID:
-            return await interaction.response.send_message("❌ Command not authorized in this server.", ephemeral=True)
+        while not self.is_closed():
             
-        if self.bot.is_updating:
-            return await interaction.response.send_message("⚠️ Update already in progress, please wait...", ephemeral=True)
+            
+            
+            mailbox.last_check = time.time()
+            
+            found_codes = []
+            if await mailbox.ensure_connected():
+                mailbox.mode = "polling"
+                try:
+                    found_codes = await self.run_mailbox_sync(mailbox)
+                except (imap_exceptions.IMAPClientError, ssl.SSLError, EOFError, OSError, asyncio.TimeoutError) as e:
+                    logger.error(f"❌ Email sync error ({mailbox.name}, connection lost?): {e}")
+                    mailbox.last_error = str(e)
+                    await mailbox.disconnect()
+            
+            await self.deliver_mailbox_codes(mailbox, found_codes)
+            await mailbox.wait_for_request(CHECK_INTERVAL)
+
+    async def watch_mailbox(self, mailbox):
+        
+        while not self.is_closed():
+            try:
+                if USE_IMAP_IDLE:
+                    while not self.is_closed():
+                        if not await self.email_idle_loop(mailbox):
+                            break
+                
+                await self.email_poll_loop(mailbox)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ Mailbox loop crash ({mailbox.name}): {e}")
+                await mailbox.disconnect()
+                mailbox.resolve_requests([])
+                await self.send_crash_log(f"EMAIL LOOP ({mailbox.name})", e)
+                await asyncio.sleep(60)
+
+    
+    async def check_email_for_codes(self):
         
-        await interaction.response.send_message("🚀 Manual update started!", ephemeral=True)
         
-        asyncio.create_task(self.bot.update_all_users())
+        await asyncio.gather(*(self.watch_mailbox(mailbox) for mailbox in self.mailboxes))
 
     async def close(self):
         
@@ -1960,6 +4008,7 @@ class RefreshView(discord.ui.View):
             self.email_task.cancel()
         if self.watchdog_task and not self.watchdog_task.done():
              self.watchdog_task.cancel()
+        self.loop_monitor.stop()
         
         
         if self.session and not getattr(self.session, "closed", False):
@@ -1967,15 +4016,48 @@ class RefreshView(discord.ui.View):
             logger.info("✅ HTTP session closed")
         
         
-        if self.email_client:
-            try:
-                
-                await asyncio.to_thread(self.email_client.logout)
-                logger.info("✅ Email client closed")
-            except Exception as e:
-                logger.error(f"❌ Email closing error: {e}")
+        await self.webhook_sink.close()
+        
+        
+        if self.persistence_loop.is_running():
+            self.persistence_loop.cancel()
+        if self.heartbeat_loop.is_running():
+            self.heartbeat_loop.cancel()
+        for store in (self.message_store, self.state):
+            store.flush()
+        await self.db.close()
+        logger.info("✅ Persistent state flushed")
+        
+        
+        try:
+            await self.mailboxes.close()
+            logger.info("✅ Email clients closed")
+        except Exception as e:
+            logger.error(f"❌ Email closing error: {e}")
+        
+        for executor in (IMAP_EXECUTOR, RENDER_EXECUTOR, IO_EXECUTOR):
+            executor.shutdown()
         
         await super().close()
+    
+
+class RefreshView(discord.ui.View):
+    def __init__(self, bot):
+        super().__init__(timeout=None) 
+        self.bot = bot
+
+    @discord.ui.button(label="Force Update", style=discord.ButtonStyle.primary, custom_id="force_refresh_all", emoji="🔄")
+    async def refresh_button(self, interaction: discord.Interaction, button: discord.ui.Button):
+        
+        if interaction.guild_id != AUTH_GUILD_ID:
+            return await interaction.response.send_message("❌ Command not authorized in this server.", ephemeral=True)
+            
+        if self.bot.is_updating:
+            await interaction.response.send_message("⏳ Update already in progress, your request joined it.", ephemeral=True)
+        else:
+            await interaction.response.send_message("🚀 Manual update started!", ephemeral=True)
+        
+        asyncio.create_task(self.bot.update_all_users())
 
 
 bot = ValorantBot()
@@ -2021,17 +4103,12 @@ async def forceupdate(interaction: discord.Interaction):
     try:
         await interaction.response.defer(ephemeral=True)
         
-        if bot.is_updating:
-            
-            logger.warning("⚠️ Forceupdate called with update already in progress. Forcing flag reset and proceeding.")
-            bot.is_updating = False
-            
-        
         if not bot.channel:
             await interaction.followup.send("❌ Unable to find configured channel.", ephemeral=True)
             return
         
-        success = await bot.update_all_users()
+        
+        success = await bot.update_all_users(fresh=True)
         
         if success:
             try:
@@ -2056,14 +4133,72 @@ async def forceupdate(interaction: discord.Interaction):
             await interaction.followup.send(error_msg, ephemeral=True)
         except:
             pass
-    finally:
+
+async def account_autocomplete(interaction: discord.Interaction, current: str):
+    
+    current = current.lower()
+    return [
+        app_commands.Choice(name=u['name'], value=u['puuid'])
+        for u in USERS if current in u['name'].lower()
+    ][:25]
+
+@bot.tree.command(name="refresh", description="Refresh a single account's card and leaderboard row")
+@app_commands.describe(account="Account to refresh")
+@app_commands.autocomplete(account=account_autocomplete)
+async def refresh(interaction: discord.Interaction, account: str):
+    
+    if interaction.user.id != ADMIN_USER_ID:
+        await interaction.response.send_message("❌ Only admin can use this command!", ephemeral=True)
+        return
+    
+    user = USERS_BY_PUUID.get(account) or USERS_BY_NAME.get(account.lower())
+    if not user:
+        await interaction.response.send_message(f"❌ Unknown account `{account}`.", ephemeral=True)
+        return
+    
+    if not bot.is_updating and not bot.scheduler.running:
+        await interaction.response.send_message("❌ The refresh scheduler is not running (update loop down or still starting). Try again shortly or use /forceupdate.", ephemeral=True)
+        return
+    
+    try:
+        await interaction.response.defer(ephemeral=True)
+        
         
         try:
-            bot.restart_update_timer()
-        except Exception as e:
-            logger.error(f"❌ Timer restart error after forceupdate: {e}")
+            if bot.is_updating:
+                success = await asyncio.wait_for(bot.update_all_users(), timeout=600)
+                await interaction.followup.send(
+                    f"{'✅' if success else '❌'} A full update was already running and covered **{user['name']}**: "
+                    f"{'completed' if success else 'failed, check logs'}.",
+                    ephemeral=True
+                )
+                return
+            edited = await asyncio.wait_for(asyncio.shield(bot.scheduler.request(user['puuid'])), timeout=120)
+        except asyncio.TimeoutError:
+            await interaction.followup.send(f"⏳ Refresh of **{user['name']}** is queued but still running, check the channel shortly.", ephemeral=True)
+            return
+        
+        if edited is None:
+            await interaction.followup.send(f"⚠️ Refresh of **{user['name']}** failed. Check logs.", ephemeral=True)
+            return
+        
+        user_data = bot.account_data.get(user['puuid'], {})
+        await interaction.followup.send(
+            f"✅ **{user['name']}**: {user_data.get('rank_name', '?')} {user_data.get('ranking_in_tier', 0)}RR "
+            f"({'card updated' if edited else 'no changes'})",
+            ephemeral=True
+        )
+    
+    except discord.NotFound:
+        logger.error("❌ Interaction expired during refresh")
+    except Exception as e:
+        logger.error(f"❌ refresh command error: {e}")
+        try:
+            await interaction.followup.send(f"❌ Error during refresh: {str(e)[:100]}", ephemeral=True)
+        except:
+            pass
 
-@bot.tree.command(name="fastcode", description="Force immediate email check (last 24h)")
+@bot.tree.command(name="fastcode", description="Force an immediate sync of new emails on every mailbox")
 async def fast_code(interaction: discord.Interaction):
     
     if interaction.user.id != ADMIN_USER_ID:
@@ -2074,24 +4209,22 @@ async def fast_code(interaction: discord.Interaction):
         await interaction.response.defer(ephemeral=True)
         
         
-        code = await bot.check_email_once()
+        found_codes = await bot.mailboxes.request_sync(timeout=IDLE_CHECK_TIMEOUT + 30)
         
-        if code:
-             
-            if code not in bot.codes_history:
-                
-                bot.save_code_to_history(code)
-                await bot.send_code_to_discord(code)
-                await interaction.followup.send(f"✅ **Found and sent!** Code: `{code}`", ephemeral=True)
+        if found_codes:
+            sent = [found['code'] for found in found_codes if found.get('delivered')]
+            codes_str = ", ".join(f"`{found['code']}`" for found in found_codes)
+            if sent:
+                await interaction.followup.send(f"✅ **Found and sent!** Code: {codes_str}", ephemeral=True)
             else:
-                await interaction.followup.send(f"⚠️ Code found `{code}`, but already sent (in History).", ephemeral=True)
+                await interaction.followup.send(f"⚠️ Code found {codes_str}, but already sent (in History).", ephemeral=True)
         else:
             
             if bot.codes_channel:
                 
                 embed = discord.Embed(
                     title="🚫 No Code Found",
-                    description="**No valid code found**\n\nNo email with valid code in the last 24h.",
+                    description="**No valid code found**\n\nNo new email with a valid code since the last sync.",
                     color=0xFF0000, 
                     timestamp=datetime.utcnow()
                 )
@@ -2129,7 +4262,7 @@ async def status(interaction: discord.Interaction):
         
         embed.add_field(
             name="📊 General", 
-            value=f"✅ Online\n🔄 Update: {'In progress' if bot.is_updating else 'Idle'}", 
+            value=f"✅ Online\n🔄 Update: {'In progress' if bot.is_updating else 'Idle'} ({bot.updates.cycles} cycles, {bot.updates.joined} joined)", 
             inline=True
         )
         
@@ -2158,7 +4291,9 @@ async def status(interaction: discord.Interaction):
         )
         
         
-        email_status = "✅ Connected" if bot.email_client else "❌ Disconnected"
+        email_status = f"{'✅' if bot.mailboxes.connected else '❌'} {bot.mailboxes.connected}/{len(bot.mailboxes)} connected"
+        for mailbox in bot.mailboxes:
+            email_status += f"\n`{mailbox.name}`: {mailbox.mode}"
         embed.add_field(
             name="📧 Email Monitoring", 
             value=email_status, 
@@ -2166,10 +4301,10 @@ async def status(interaction: discord.Interaction):
         )
         
         
-        email_heartbeat = "Never"
-        if bot.last_email_check_time > 0:
-            secs_ago = int(time.time() - bot.last_email_check_time)
-            email_heartbeat = f"{secs_ago}s ago"
+        email_heartbeat = "\n".join(
+            f"`{mailbox.name}`: {int(time.time() - mailbox.last_check)}s ago" if mailbox.last_check else f"`{mailbox.name}`: Never"
+            for mailbox in bot.mailboxes
+        ) or "Never"
         
         embed.add_field(
             name="❤️ Email Heartbeat", 
@@ -2197,13 +4332,83 @@ async def status(interaction: discord.Interaction):
         )
         
         
-        history_count = len(bot.codes_history)
+        db_status = f"{bot.db.commits} commits, {bot.db.pending} pending"
+        embed.add_field(
+            name="🗄️ State DB", 
+            value=db_status, 
+            inline=True
+        )
+        
+        
+        history_count = len(bot.code_log)
         embed.add_field(
             name="📚 Code History", 
-            value=f"{history_count} saved", 
+            value=f"{history_count} in last {CODE_DEDUPE_WINDOW_MINUTES}m", 
+            inline=True
+        )
+        
+        
+        publish_mode = "Webhook" if bot.webhook_sink.webhooks else "Bot"
+        embed.add_field(
+            name="📤 Last Publish", 
+            value=f"{bot.publish_stats['edited']} edited / {bot.publish_stats['skipped']} skipped\nMode: {publish_mode}", 
             inline=True
         )
         
+        
+        latency_lines = []
+        for stage, histogram in bot.code_latency.items():
+            summary = histogram.summary()
+            if summary['count']:
+                latency_lines.append(f"`{stage}` p50 {summary['p50']:.1f}s · p95 {summary['p95']:.1f}s · p99 {summary['p99']:.1f}s (n={summary['count']})")
+        embed.add_field(
+            name=f"⏱️ Code Latency ({LATENCY_WINDOW_MINUTES}m)", 
+            value="\n".join(latency_lines) or "No codes delivered yet", 
+            inline=False
+        )
+        
+        
+        executor_lines = []
+        for executor in bot.executors:
+            wait = executor.wait_time.summary()
+            wait_str = f"wait p95 {wait['p95'] * 1000:.0f}ms" if wait['count'] else "idle"
+            executor_lines.append(f"`{executor.name}` {executor.active}/{executor.max_workers} busy · queue {executor.queued} (peak {executor.peak_queued}) · {wait_str}")
+        embed.add_field(
+            name="🧵 Executors", 
+            value="\n".join(executor_lines), 
+            inline=False
+        )
+        
+        
+        loop_lag = bot.loop_monitor.summary()
+        loop_lines = [
+            f"p50 {loop_lag['p50'] * 1000:.1f}ms · p95 {loop_lag['p95'] * 1000:.1f}ms · p99 {loop_lag['p99'] * 1000:.1f}ms · max {loop_lag['max'] * 1000:.0f}ms"
+            if loop_lag['count'] else "No samples yet",
+            f"Stalls ≥{bot.loop_monitor.threshold * 1000:.0f}ms: {bot.loop_monitor.stall_count}",
+        ]
+        if bot.loop_monitor.stalls:
+            loop_lines.append("Last: " + bot.loop_monitor.describe_stall(bot.loop_monitor.stalls[-1], limit=600))
+        embed.add_field(
+            name="🐢 Event Loop", 
+            value="\n".join(loop_lines), 
+            inline=False
+        )
+        
+        
+        stage_lines = bot.heartbeats.stage_lines()
+        embed.add_field(
+            name=f"⏱️ Time in Stage ({bot.heartbeats.stall_count} stalled units)", 
+            value="\n".join(stage_lines)[:1024] if stage_lines else "No samples yet", 
+            inline=False
+        )
+        
+        
+        embed.add_field(
+            name="🏭 Update Pipeline", 
+            value=bot.update_pipeline.describe().replace(" | ", "\n"), 
+            inline=False
+        )
+        
         await interaction.response.send_message(embed=embed, ephemeral=True)
         
     except discord.NotFound:
@@ -2215,6 +4420,56 @@ async def status(interaction: discord.Interaction):
         except discord.NotFound:
             logger.error("❌ Unable to send response - interaction expired")
 
+@bot.tree.command(name="stats", description="Show aggregated match stats for all accounts")
+async def stats(interaction: discord.Interaction):
+    
+    if interaction.user.id != ADMIN_USER_ID:
+        await interaction.response.send_message("❌ Only admin can use this command!", ephemeral=True)
+        return
+    
+    try:
+        account_stats = bot.stats_engine.compute()
+        
+        embed = discord.Embed(
+            title="📈 Account Stats",
+            color=0x7289DA,
+            timestamp=datetime.utcnow()
+        )
+        
+        if not account_stats:
+            embed.description = "No matches stored yet. Stats fill up as new games are tracked."
+        
+        for user in USERS:
+            user_stats = account_stats.get(user['puuid'])
+            if not user_stats:
+                continue
+            
+            streak = user_stats['current_streak']
+            streak_str = f"{abs(streak)}{'W' if streak > 0 else 'L' if streak < 0 else 'D'}"
+            embed.add_field(
+                name=user['name'],
+                value=(
+                    f"Games: {user_stats['games']} ({user_stats['wins']}W/{user_stats['losses']}L)\n"
+                    f"Win rate: {user_stats['win_rate']:.1f}%\n"
+                    f"Top agent: {user_stats['top_agent']} ({user_stats['top_agent_games']})\n"
+                    f"Avg RR: {user_stats['avg_rr']:+.1f}\n"
+                    f"Streak: {streak_str} (best {user_stats['best_win_streak']}W)"
+                ),
+                inline=True
+            )
+        
+        embed.set_footer(text=f"{len(bot.stats_engine)} matches stored")
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+        
+    except discord.NotFound:
+        logger.error("❌ Interaction expired during stats")
+    except Exception as e:
+        logger.error(f"❌ stats command error: {e}")
+        try:
+            await interaction.response.send_message(f"❌ Error during stats: {str(e)}", ephemeral=True)
+        except discord.NotFound:
+            logger.error("❌ Unable to send response - interaction expired")
+
 @bot.tree.command(name="sendtest", description="[ADMIN] Send a test message in current channel")
 async def sendtest(interaction: discord.Interaction):
     
@@ -2240,9 +4495,6 @@ async def restart(interaction: discord.Interaction):
         await interaction.response.defer(ephemeral=True)
         
         
-        bot.is_updating = False
-
-        
         if bot.update_task and not bot.update_task.done():
             bot.update_task.cancel()
         if bot.email_task and not bot.email_task.done():
@@ -2251,8 +4503,9 @@ async def restart(interaction: discord.Interaction):
              bot.watchdog_task.cancel()
         
         
-        bot.email_client = None
-        bot.last_email_check_time = 0
+        await bot.mailboxes.close()
+        for mailbox in bot.mailboxes:
+            mailbox.last_check = 0
         
         
         if not bot.session or getattr(bot.session, "closed", False):
@@ -2308,7 +4561,7 @@ async def sync_commands(interaction: discord.Interaction):
 if __name__ == "__main__":
     try:
         logger.info("🚀 Starting Valorant Tracker Bot...")
-        bot.run(DISCORD_TOKEN)
+        bot.run(DISCORD_TOKEN, log_handler=None)
     except KeyboardInterrupt:
         logger.info("🛑 Bot stopped by user")
     except Exception as e:
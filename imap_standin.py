@@ -0,0 +1,350 @@
+import asyncio
+import email
+import random
+import re
+import threading
+import time
+from datetime import datetime
+from email import policy
+
+
+TOKEN_RE = re.compile(rb'"(?:[^"\\]|\\.)*"|\(|\)|[^\s()]+')
+SEARCH_KEYS_WITH_ARG = {b'FROM', b'SINCE', b'SUBJECT', b'BEFORE', b'ON', b'UID', b'TO', b'BODY', b'TEXT'}
+
+
+def quote(value):
+
+    if value is None:
+        return b'NIL'
+    if isinstance(value, str):
+        value = value.encode('utf-8')
+    if b'\r' in value or b'\n' in value or any(b > 127 for b in value):
+        return b'{%d}\r\n' % len(value) + value
+    return b'"' + value.replace(b'\\', b'\\\\').replace(b'"', b'\\"') + b'"'
+
+
+def parse_uid_set(text, max_uid):
+
+    uids = set()
+    for chunk in text.split(b','):
+        if b':' in chunk:
+            low, high = chunk.split(b':')
+            low = max_uid if low == b'*' else int(low)
+            high = max_uid if high == b'*' else int(high)
+            low, high = min(low, high), max(low, high)
+            uids.update(range(low, high + 1))
+        else:
+            uids.add(max_uid if chunk == b'*' else int(chunk))
+    return uids
+
+
+class StoredMessage:
+
+    def __init__(self, uid, raw, received=None):
+        self.uid = uid
+        self.raw = raw
+        self.received = received or time.time()
+        self.message = email.message_from_bytes(raw, policy=policy.compat32)
+
+    def part(self, section):
+
+        part = self.message
+        for index in section.split('.'):
+            if part.is_multipart():
+                part = part.get_payload()[int(index) - 1]
+            elif index != '1':
+                raise KeyError(section)
+        return part
+
+    def section_bytes(self, section):
+
+        part = self.part(section)
+        if part.is_multipart():
+            return part.as_bytes()
+        return self.payload_bytes(part)
+
+    def envelope(self):
+
+        def addresses(header):
+            value = self.message.get(header)
+            if not value:
+                return b'NIL'
+            items = []
+            for name, address in email.utils.getaddresses([value]):
+                mailbox, _, host = address.partition('@')
+                items.append(b'(' + b' '.join([quote(name or None), b'NIL', quote(mailbox), quote(host)]) + b')')
+            return b'(' + b''.join(items) + b')'
+
+        fields = [
+            quote(self.message.get('Date')),
+            quote(self.message.get('Subject')),
+            addresses('From'), addresses('From'), addresses('From'),
+            addresses('To'), b'NIL', b'NIL', b'NIL',
+            quote(self.message.get('Message-ID')),
+        ]
+        return b'(' + b' '.join(fields) + b')'
+
+    def bodystructure(self, part=None):
+
+        part = part or self.message
+        if part.is_multipart():
+            children = b''.join(self.bodystructure(child) for child in part.get_payload())
+            return b'(' + children + b' ' + quote(part.get_content_subtype()) + b')'
+
+        maintype, subtype = part.get_content_maintype(), part.get_content_subtype()
+        params = [quote(k) + b' ' + quote(v) for k, v in part.get_params()[1:]] if part.get_params() else []
+        body = self.payload_bytes(part)
+        fields = [
+            quote(maintype), quote(subtype),
+            b'(' + b' '.join(params) + b')' if params else b'NIL',
+            b'NIL', b'NIL',
+            quote(part.get('Content-Transfer-Encoding', '7bit')),
+            str(len(body)).encode(),
+        ]
+        if maintype == 'text':
+            fields.append(str(body.count(b'\n') + 1).encode())
+        return b'(' + b' '.join(fields) + b')'
+
+    @staticmethod
+    def payload_bytes(part):
+        payload = part.get_payload(decode=False)
+        return payload.encode('utf-8', errors='surrogateescape') if isinstance(payload, str) else payload
+
+
+class IMAPStandIn:
+
+    def __init__(self, host='127.0.0.1', port=0, drop_rate=0.0, eof_rate=0.0, latency=0.0, seed=None):
+        self.host = host
+        self.port = port
+        self.drop_rate = drop_rate
+        self.eof_rate = eof_rate
+        self.latency = latency
+        self.rng = random.Random(seed)
+        self.messages = {}
+        self.uidvalidity = int(time.time())
+        self.uidnext = 1
+        self.bytes_sent = 0
+        self.commands = 0
+        self.faults = 0
+        self.loop = None
+        self.server = None
+        self._changed = None
+        self._ready = threading.Event()
+        self._thread = None
+
+    def start(self):
+
+        self._thread = threading.Thread(target=self._run, name="imap-standin", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        return self
+
+    def _run(self):
+
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self._changed = asyncio.Event()
+        self.server = self.loop.run_until_complete(asyncio.start_server(self._handle, self.host, self.port))
+        self.port = self.server.sockets[0].getsockname()[1]
+        self._ready.set()
+        self.loop.run_forever()
+
+    def stop(self):
+
+        if self.loop:
+            asyncio.run_coroutine_threadsafe(self._shutdown(), self.loop).result(timeout=5)
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self._thread.join(timeout=5)
+
+    async def _shutdown(self):
+
+        self.server.close()
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def append(self, raw):
+
+        future = asyncio.run_coroutine_threadsafe(self._append(raw), self.loop)
+        return future.result()
+
+    async def _append(self, raw):
+
+        uid = self.uidnext
+        self.uidnext += 1
+        self.messages[uid] = StoredMessage(uid, raw)
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+        return uid
+
+    async def _handle(self, reader, writer):
+
+        session = {'selected': False, 'known': len(self.messages)}
+
+        def send(data):
+            self.bytes_sent += len(data)
+            writer.write(data)
+
+        try:
+            send(b'* OK [CAPABILITY IMAP4rev1 IDLE] IMAP stand-in ready\r\n')
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                while line.rstrip().endswith(b'}') and b'{' in line:
+                    size = int(line.rstrip()[line.rindex(b'{') + 1:-1])
+                    send(b'+ Ready for literal\r\n')
+                    await writer.drain()
+                    literal = await reader.readexactly(size)
+                    line = line[:line.rindex(b'{')] + b'"' + literal + b'"' + await reader.readline()
+
+                self.commands += 1
+                if self.latency:
+                    await asyncio.sleep(self.latency)
+                if self.drop_rate and self.rng.random() < self.drop_rate:
+                    self.faults += 1
+                    break
+
+                tag, _, rest = line.strip().partition(b' ')
+                command, _, args = rest.partition(b' ')
+                command = command.upper()
+                if command == b'UID':
+                    command, _, args = args.partition(b' ')
+                    command = command.upper()
+
+                if command == b'CAPABILITY':
+                    send(b'* CAPABILITY IMAP4rev1 IDLE\r\n' + tag + b' OK CAPABILITY completed\r\n')
+                elif command == b'LOGIN':
+                    send(tag + b' OK [CAPABILITY IMAP4rev1 IDLE] LOGIN completed\r\n')
+                elif command in (b'SELECT', b'EXAMINE'):
+                    session['selected'] = True
+                    session['known'] = len(self.messages)
+                    send(
+                        b'* FLAGS (\\Seen \\Deleted)\r\n'
+                        + b'* %d EXISTS\r\n* 0 RECENT\r\n' % len(self.messages)
+                        + b'* OK [UIDVALIDITY %d] UIDs valid\r\n' % self.uidvalidity
+                        + b'* OK [UIDNEXT %d] Predicted next UID\r\n' % self.uidnext
+                        + tag + b' OK [READ-WRITE] SELECT completed\r\n'
+                    )
+                elif command == b'NOOP':
+                    send(self._exists_update(session) + tag + b' OK NOOP completed\r\n')
+                elif command == b'SEARCH':
+                    uids = self._search(args)
+                    send(self._exists_update(session) + b'* SEARCH' + b''.join(b' %d' % uid for uid in uids) + b'\r\n' + tag + b' OK SEARCH completed\r\n')
+                elif command == b'FETCH':
+                    if not await self._fetch(tag, args, send, writer):
+                        self.faults += 1
+                        break
+                elif command == b'IDLE':
+                    if not await self._idle(tag, session, reader, writer, send):
+                        break
+                elif command == b'LOGOUT':
+                    send(b'* BYE logging out\r\n' + tag + b' OK LOGOUT completed\r\n')
+                    await writer.drain()
+                    break
+                else:
+                    send(tag + b' BAD unsupported command\r\n')
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+    def _exists_update(self, session):
+
+        if len(self.messages) != session['known']:
+            session['known'] = len(self.messages)
+            return b'* %d EXISTS\r\n' % session['known']
+        return b''
+
+    def _search(self, args):
+
+        tokens = [t.strip(b'"') for t in TOKEN_RE.findall(args) if t not in (b'(', b')')]
+        uids = sorted(self.messages)
+        max_uid = uids[-1] if uids else 0
+        i = 0
+        while i < len(tokens):
+            key = tokens[i].upper()
+            value = tokens[i + 1] if key in SEARCH_KEYS_WITH_ARG and i + 1 < len(tokens) else None
+            if key == b'UID':
+                wanted = parse_uid_set(value, max_uid)
+                uids = [uid for uid in uids if uid in wanted]
+            elif key == b'FROM':
+                needle = value.decode().lower()
+                uids = [uid for uid in uids if needle in (self.messages[uid].message.get('From') or '').lower()]
+            elif key == b'SINCE':
+                since = datetime.strptime(value.decode(), "%d-%b-%Y").timestamp()
+                uids = [uid for uid in uids if self.messages[uid].received >= since]
+            i += 2 if value is not None else 1
+        return uids
+
+    async def _fetch(self, tag, args, send, writer):
+
+        uid_set, _, items = args.partition(b' ')
+        items = items.strip().strip(b'()').split()
+        uids = sorted(self.messages)
+        wanted = parse_uid_set(uid_set, uids[-1] if uids else 0)
+        seq_of = {uid: seq for seq, uid in enumerate(uids, start=1)}
+
+        for uid in sorted(wanted):
+            if uid not in self.messages:
+                continue
+            message = self.messages[uid]
+            parts = [b'UID %d' % uid]
+            for item in items:
+                name = item.upper()
+                if name == b'ENVELOPE':
+                    parts.append(b'ENVELOPE ' + message.envelope())
+                elif name == b'BODYSTRUCTURE':
+                    parts.append(b'BODYSTRUCTURE ' + message.bodystructure())
+                elif name in (b'RFC822', b'BODY[]', b'BODY.PEEK[]'):
+                    parts.append(b'RFC822 {%d}\r\n' % len(message.raw) + message.raw)
+                elif name == b'RFC822.SIZE':
+                    parts.append(b'RFC822.SIZE %d' % len(message.raw))
+                elif name.startswith((b'BODY.PEEK[', b'BODY[')):
+                    match = re.match(rb'BODY(?:\.PEEK)?\[([\d.]+)\](?:<(\d+)\.(\d+)>)?', name)
+                    section, offset, length = match.group(1).decode(), match.group(2), match.group(3)
+                    data = message.section_bytes(section)
+                    key = b'BODY[%s]' % match.group(1)
+                    if offset is not None:
+                        data = data[int(offset):int(offset) + int(length)]
+                        key += b'<%s>' % offset
+                    parts.append(key + b' {%d}\r\n' % len(data) + data)
+            response = b'* %d FETCH (' % seq_of[uid] + b' '.join(parts) + b')\r\n'
+
+            if self.eof_rate and self.rng.random() < self.eof_rate:
+                send(response[:len(response) // 2])
+                await writer.drain()
+                return False
+            send(response)
+
+        send(tag + b' OK FETCH completed\r\n')
+        return True
+
+    async def _idle(self, tag, session, reader, writer, send):
+
+        send(b'+ idling\r\n')
+        await writer.drain()
+        done = asyncio.ensure_future(reader.readline())
+        try:
+            while True:
+                update = self._exists_update(session)
+                if update:
+                    send(update)
+                    await writer.drain()
+
+                waiter = asyncio.ensure_future(self._changed.wait())
+                finished, _ = await asyncio.wait({done, waiter}, return_when=asyncio.FIRST_COMPLETED)
+                if waiter not in finished:
+                    waiter.cancel()
+
+                if done in finished:
+                    line = done.result()
+                    if not line:
+                        return False
+                    send(tag + b' OK IDLE terminated\r\n')
+                    return True
+        finally:
+            if not done.done():
+                done.cancel()
@@ -1,10 +1,14 @@
 import os
-from flask import Flask, render_template
+import json
+from flask import Flask, Response, render_template
 import subprocess
 import threading
 
 app = Flask(__name__)
 
+with open("config.json", encoding="utf-8") as f:
+    METRICS_FILE = json.load(f)["file_paths"].get("metrics_file", "metrics.prom")
+
 def run_discord_bot():
     subprocess.call(["python3", "ds.py"])
 
@@ -12,6 +16,14 @@ def run_discord_bot():
 def index():
     return render_template("index.html")
 
+@app.route("/metrics")
+def metrics():
+    # Espone le metriche scritte dal bot (formato testo Prometheus)
+    if not os.path.exists(METRICS_FILE):
+        return Response("", mimetype="text/plain")
+    with open(METRICS_FILE, encoding="utf-8") as f:
+        return Response(f.read(), mimetype="text/plain; version=0.0.4")
+
 if __name__ == "__main__":
     # Avvia il bot Discord in un thread separato
     threading.Thread(target=run_discord_bot, daemon=True).start()
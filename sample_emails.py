@@ -0,0 +1,95 @@
+import random
+
+
+RIOT_SENDER = "Riot Games <noreply@mail.accounts.riotgames.com>"
+
+CODE_TEMPLATES = {
+    "en": [
+        ("Your Riot Games verification code", "Hi,\n\nYour verification code is {code}.\n\nIf you didn't request this, you can ignore this email.\n\nRiot Games"),
+        ("Riot Games sign-in", "Hello,\n\nUse this code: {code} to finish signing in.\n\nThanks,\nTeam Riot Games"),
+        ("Confirm your sign-in", "Enter this code {code} on the login page.\n\nRiot Games, Inc."),
+        ("Your access code", "Your access code is: {code}\n\n— Riot Games Support"),
+    ],
+    "it": [
+        ("Il tuo codice Riot Games", "Ciao,\n\nIl tuo codice di verifica: {code}\n\nRiot Games"),
+        ("Codice di accesso", "Codice di accesso: {code}\n\nSe non hai richiesto questo codice ignora questa email.\nRiot Games"),
+    ],
+    "ar": [
+        ("رمز تسجيل الدخول", "مرحبًا،\n\nإليك رمز تسجيل الدخول: {code}\n\nRiot Games"),
+        ("Riot Games", "رمز تسجيل الدخول {code}\n\nRiot Games"),
+    ],
+}
+
+NOISE_TEMPLATES = [
+    ("Monitor Riot Games is DOWN", "notification@uptime.example.com", "Uptime monitor alert: Riot Games login monitor is down.\nStatus change detected at {code}."),
+    ("Your Riot Points receipt", RIOT_SENDER, "Thanks for your purchase from Riot Games. Order number {code}. Keep this receipt for your records."),
+    ("Patch notes are live", RIOT_SENDER, "The latest patch notes from Riot Games are out now. Check out what's new in the agent pool."),
+    ("Your weekly digest", "digest@news.example.com", "Here are the stories you missed this week. Order #{code} has shipped."),
+    ("Invoice {code}", "billing@example.com", "Thanks for your purchase. Your invoice number is {code}."),
+    ("Security alert", "alerts@example.com", "Automated alert: new sign-in from Chrome on Windows. Reference {code}."),
+]
+
+FILLER = (
+    "You're receiving this email because you have an account with us. "
+    "Please do not reply to this message. Privacy Policy | Terms of Service | Unsubscribe. "
+)
+
+
+def random_code(rng):
+    return f"{rng.randrange(1000000):06d}"
+
+
+def build_corpus(size=2000, code_ratio=0.3, seed=1234, locales=None):
+
+    rng = random.Random(seed)
+    locales = locales or list(CODE_TEMPLATES)
+    corpus = []
+
+    for _ in range(size):
+        code = random_code(rng)
+        padding = FILLER * rng.randint(1, 6)
+
+        if rng.random() < code_ratio:
+            locale = rng.choice(locales)
+            subject, body = rng.choice(CODE_TEMPLATES[locale])
+            corpus.append({
+                'locale': locale,
+                'sender': RIOT_SENDER,
+                'subject': subject,
+                'body': body.format(code=code) + "\n\n" + padding,
+                'expected_code': code,
+            })
+        else:
+            subject, sender, body = rng.choice(NOISE_TEMPLATES)
+            corpus.append({
+                'locale': None,
+                'sender': sender,
+                'subject': subject.format(code=code),
+                'body': body.format(code=code) + "\n\n" + padding,
+                'expected_code': None,
+            })
+
+    return corpus
+
+
+def build_message(sample, attachment_bytes=0, rng=None):
+
+    from email.message import EmailMessage
+    from email.utils import formatdate, make_msgid
+
+    rng = rng or random.Random()
+    message = EmailMessage()
+    message['From'] = sample['sender']
+    message['To'] = "smurf.farm@example.com"
+    message['Subject'] = sample['subject']
+    message['Date'] = formatdate(localtime=True)
+    message['Message-ID'] = make_msgid(domain="standin.local")
+
+    message.set_content(sample['body'])
+    html_body = sample['body'].replace("\n", "<br>\n")
+    message.add_alternative(f"<html><body><table><tr><td>{html_body}</td></tr></table>{FILLER * 8}</body></html>", subtype='html')
+
+    if attachment_bytes:
+        message.add_attachment(rng.randbytes(attachment_bytes), maintype='image', subtype='png', filename='logo.png')
+
+    return message.as_bytes(policy=message.policy.clone(linesep='\r\n'))
@@ -0,0 +1,11 @@
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORKDIR = tempfile.mkdtemp(prefix="ds-tests-")
+
+for name in ("config.json", "fonts", "assets"):
+    os.symlink(os.path.join(ROOT, name), os.path.join(WORKDIR, name))
+os.chdir(WORKDIR)
+sys.path.insert(0, ROOT)
@@ -0,0 +1,140 @@
+import asyncio
+import time
+
+import ds
+
+
+def test_spread_orders_accounts_across_the_interval():
+    async def scenario():
+        scheduler = ds.AccountScheduler(interval=300, jitter_ratio=0)
+        start = time.time() - 1000
+        scheduler.spread(["a", "b", "c"], start=start)
+        assert len(scheduler) == 3
+        assert scheduler.spacing == 100
+        assert scheduler.next_due() == start
+        return [await scheduler.next() for _ in range(3)]
+    
+    picked = asyncio.run(scenario())
+    assert [puuid for puuid, _ in picked] == ["a", "b", "c"]
+    assert [slot[0] - picked[0][1][0] for _, slot in picked] == [0, 100, 200]
+
+
+def test_jitter_stays_within_the_spacing_ratio():
+    scheduler = ds.AccountScheduler(interval=400, jitter_ratio=0.1)
+    scheduler.spread(["a", "b", "c", "d"], start=0)
+    for priority, due, seq, puuid in scheduler._heap:
+        base = scheduler._periodic[puuid][0]
+        assert abs(due - base) <= 10
+
+
+def test_priority_requests_jump_ahead_and_share_one_future():
+    async def scenario():
+        scheduler = ds.AccountScheduler(interval=300, jitter_ratio=0)
+        scheduler.spread(["a", "b"], start=time.time() - 1000)
+        first = scheduler.request("b")
+        second = scheduler.request("b")
+        assert first is second
+        assert scheduler.is_pending("b")
+        
+        puuid, slot = await scheduler.next()
+        assert not scheduler.is_pending("b")
+        return puuid, slot is first, (await scheduler.next())[0]
+    
+    assert asyncio.run(scenario()) == ("b", True, "a")
+
+
+def test_request_wakes_a_waiting_scheduler():
+    async def scenario():
+        scheduler = ds.AccountScheduler(interval=300, jitter_ratio=0)
+        scheduler.spread(["a"], start=time.time() + 60)
+        waiter = asyncio.ensure_future(scheduler.next())
+        await asyncio.sleep(0.01)
+        assert not waiter.done()
+        
+        scheduler.request("a")
+        puuid, slot = await asyncio.wait_for(waiter, 1)
+        return puuid, isinstance(slot, asyncio.Future)
+    
+    assert asyncio.run(scenario()) == ("a", True)
+
+
+def test_next_waits_until_the_slot_is_due():
+    async def scenario():
+        scheduler = ds.AccountScheduler(interval=300, jitter_ratio=0)
+        due = time.time() + 0.05
+        scheduler.spread(["a"], start=due)
+        await scheduler.next()
+        return time.time() - due
+    
+    assert asyncio.run(scenario()) >= -0.01
+
+
+def test_reschedule_skips_missed_intervals_and_ignores_stale_slots():
+    scheduler = ds.AccountScheduler(interval=100, jitter_ratio=0)
+    now = time.time()
+    scheduler.spread(["a"], start=now - 250)
+    slot = scheduler._periodic["a"]
+    
+    scheduler.reschedule("a", slot)
+    base = scheduler._periodic["a"][0]
+    assert base == now - 250 + 300
+    
+    scheduler.reschedule("a", slot)
+    assert scheduler._periodic["a"][0] == base
+    
+    scheduler.spread(["b"], start=now)
+    scheduler.reschedule("a", slot)
+    assert "a" not in scheduler._periodic
+    assert [entry[3] for entry in scheduler._heap] == ["b"]
+
+
+def test_run_passes_priority_resolves_requests_and_reschedules():
+    async def scenario():
+        scheduler = ds.AccountScheduler(interval=300, jitter_ratio=0)
+        start = time.time() - 10
+        scheduler.spread(["a"], start=start)
+        calls = []
+        
+        async def handler(puuid, priority):
+            calls.append((puuid, priority))
+            return f"card-{puuid}"
+        
+        request = scheduler.request("b")
+        runner = asyncio.ensure_future(scheduler.run(handler))
+        result = await asyncio.wait_for(request, 1)
+        await asyncio.sleep(0.01)
+        assert scheduler.running
+        runner.cancel()
+        await asyncio.gather(runner, return_exceptions=True)
+        return calls, result, scheduler._periodic["a"][0] - start, scheduler.running
+    
+    calls, result, shift, running = asyncio.run(scenario())
+    assert calls == [("b", True), ("a", False)]
+    assert result == "card-b"
+    assert shift == 300
+    assert not running
+
+
+def test_handler_errors_still_resolve_and_reschedule():
+    async def scenario():
+        scheduler = ds.AccountScheduler(interval=300, jitter_ratio=0)
+        start = time.time() - 10
+        scheduler.spread(["a"], start=start)
+        
+        async def handler(puuid, priority):
+            raise RuntimeError("boom")
+        
+        try:
+            await scheduler.run(handler)
+        except RuntimeError:
+            pass
+        shift = scheduler._periodic["a"][0] - start
+        
+        request = scheduler.request("a")
+        try:
+            await scheduler.run(handler)
+        except RuntimeError:
+            pass
+        return shift, request.done() and request.result(), scheduler.is_pending("a"), scheduler.running
+    
+    assert asyncio.run(scenario()) == (300, None, False, False)
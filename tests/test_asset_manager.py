@@ -0,0 +1,63 @@
+import asyncio
+from io import BytesIO
+
+from PIL import Image
+
+import ds
+
+
+class FakeResponse:
+    
+    def __init__(self, status, data):
+        self.status = status
+        self.data = data
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def read(self):
+        return self.data
+
+
+class FakeSession:
+    
+    def __init__(self, status=200):
+        self.status = status
+        self.requests = []
+        buffer = BytesIO()
+        Image.new("RGB", (16, 8), (200, 30, 30)).save(buffer, format="PNG")
+        self.png = buffer.getvalue()
+
+    def get(self, url, timeout=None):
+        self.requests.append(url)
+        return FakeResponse(self.status, self.png)
+
+
+def test_images_are_decoded_and_resized_on_the_render_executor():
+    async def scenario():
+        assets = ds.AsyncAssetManager()
+        session = FakeSession()
+        completed = ds.RENDER_EXECUTOR.completed
+        
+        small = await assets.get_image(session, "https://cdn/icon.png", width=4, height=4)
+        large = await assets.get_image(session, "https://cdn/icon.png", width=32, height=32)
+        again = await assets.get_image(session, "https://cdn/icon.png", width=4, height=4)
+        return small, large, again, session.requests, ds.RENDER_EXECUTOR.completed - completed
+    
+    small, large, again, requests, executor_calls = asyncio.run(scenario())
+    assert small.mode == "RGBA" and small.size == (4, 4)
+    assert large.size == (32, 32)
+    assert again is small
+    assert requests == ["https://cdn/icon.png"]
+    assert executor_calls == 3
+
+
+def test_failed_downloads_return_none():
+    async def scenario():
+        assets = ds.AsyncAssetManager()
+        return await assets.get_image(FakeSession(status=404), "https://cdn/missing.png"), await assets.get_image(None, None)
+    
+    assert asyncio.run(scenario()) == (None, None)
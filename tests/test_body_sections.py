@@ -0,0 +1,46 @@
+import base64
+
+from imapclient.response_types import BodyData
+
+import ds
+
+
+def leaf(maintype, subtype, encoding=b'7bit', charset=b'utf-8'):
+    params = (b'charset', charset) if charset else None
+    return (maintype, subtype, params, None, None, encoding, 120, 4)
+
+
+def test_single_part_text_plain_is_section_one():
+    structure = BodyData.create(leaf(b'TEXT', b'PLAIN', b'QUOTED-PRINTABLE', b'ISO-8859-1'))
+    assert ds.find_text_section(structure) == ('1', 'quoted-printable', 'ISO-8859-1')
+
+
+def test_single_part_html_has_no_text_section():
+    structure = BodyData.create(leaf(b'text', b'html'))
+    assert ds.find_text_section(structure) is None
+    assert ds.body_section_info(structure, '1') == ('1', '7bit', 'utf-8')
+
+
+def test_alternative_prefers_the_plain_part():
+    structure = BodyData.create((leaf(b'text', b'html'), leaf(b'text', b'plain', b'base64'), b'alternative', None))
+    assert ds.find_text_section(structure) == ('2', 'base64', 'utf-8')
+
+
+def test_nested_multipart_returns_a_dotted_section():
+    alternative = (leaf(b'text', b'plain', charset=None), leaf(b'text', b'html'), b'alternative', None)
+    attachment = leaf(b'image', b'png', b'base64', None)
+    structure = BodyData.create((alternative, attachment, b'mixed', None))
+    assert ds.find_text_section(structure) == ('1.1', '7bit', 'utf-8')
+
+
+def test_multipart_without_plain_text_returns_none():
+    structure = BodyData.create((leaf(b'text', b'html'), leaf(b'image', b'png', b'base64', None), b'mixed', None))
+    assert ds.find_text_section(structure) is None
+
+
+def test_decode_body_section_handles_transfer_encodings():
+    encoded = base64.encodebytes("Il tuo codice: 123456".encode('utf-8'))
+    assert ds.decode_body_section(encoded, 'base64', 'utf-8') == "Il tuo codice: 123456"
+    assert ds.decode_body_section(encoded[:-6], 'base64', 'utf-8').startswith("Il tuo codice")
+    assert ds.decode_body_section(b'caf=E9 code', 'quoted-printable', 'iso-8859-1') == "café code"
+    assert ds.decode_body_section(b'code 123456', '7bit', 'x-unknown') == "code 123456"
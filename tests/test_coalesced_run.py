@@ -0,0 +1,139 @@
+import asyncio
+
+import pytest
+
+import ds
+
+
+class Cycle:
+    
+    def __init__(self, fail_on=None):
+        self.calls = 0
+        self.fail_on = fail_on
+        self.release = None
+
+    async def __call__(self):
+        self.calls += 1
+        call = self.calls
+        self.release = asyncio.Event()
+        await self.release.wait()
+        if call == self.fail_on:
+            raise RuntimeError(f"cycle {call} failed")
+        return call
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_requests_join_the_in_flight_cycle():
+    async def scenario():
+        cycle = Cycle()
+        run = ds.CoalescedRun("update", cycle)
+        first = run.request()
+        second = run.request()
+        await settle()
+        assert run.running
+        cycle.release.set()
+        return await asyncio.gather(first, second), cycle.calls, run.cycles, run.joined, run.running
+    
+    assert asyncio.run(scenario()) == ([1, 1], 1, 1, 1, False)
+
+
+def test_fresh_requests_queue_a_single_follow_up():
+    async def scenario():
+        cycle = Cycle()
+        run = ds.CoalescedRun("update", cycle)
+        current = run.request()
+        await settle()
+        fresh = [run.request(fresh=True) for _ in range(3)]
+        
+        cycle.release.set()
+        assert await current == 1
+        await settle()
+        assert run.running
+        assert not any(f.done() for f in fresh)
+        
+        cycle.release.set()
+        return await asyncio.gather(*fresh), cycle.calls, run.cycles
+    
+    assert asyncio.run(scenario()) == ([2, 2, 2], 2, 2)
+
+
+def test_follow_up_receives_the_follow_up_cycle_error():
+    async def scenario():
+        cycle = Cycle(fail_on=2)
+        run = ds.CoalescedRun("update", cycle)
+        current = run.request()
+        await settle()
+        fresh = run.request(fresh=True)
+        cycle.release.set()
+        await settle()
+        cycle.release.set()
+        assert await current == 1
+        with pytest.raises(RuntimeError, match="cycle 2"):
+            await fresh
+    
+    asyncio.run(scenario())
+
+
+def test_cancelling_a_caller_does_not_cancel_the_cycle():
+    async def scenario():
+        cycle = Cycle()
+        run = ds.CoalescedRun("update", cycle)
+        caller = asyncio.ensure_future(run.request())
+        await settle()
+        caller.cancel()
+        await settle()
+        assert caller.cancelled()
+        assert run.running
+        
+        joined = run.request()
+        cycle.release.set()
+        return await joined
+    
+    assert asyncio.run(scenario()) == 1
+
+
+def test_wait_idle_covers_the_follow_up_cycle():
+    async def scenario():
+        cycle = Cycle()
+        run = ds.CoalescedRun("update", cycle)
+        run.request()
+        await settle()
+        run.request(fresh=True)
+        
+        idle = asyncio.ensure_future(run.wait_idle())
+        cycle.release.set()
+        await settle()
+        assert not idle.done()
+        
+        cycle.release.set()
+        await asyncio.wait_for(idle, 1)
+        return cycle.calls, run.running
+    
+    assert asyncio.run(scenario()) == (2, False)
+
+
+def test_cancel_stops_the_cycle_and_its_follow_up():
+    async def scenario():
+        cycle = Cycle()
+        run = ds.CoalescedRun("update", cycle)
+        current = run.request()
+        await settle()
+        fresh = run.request(fresh=True)
+        
+        assert run.cancel()
+        await settle()
+        with pytest.raises(asyncio.CancelledError):
+            await current
+        assert run.running
+        
+        assert run.cancel()
+        await settle()
+        with pytest.raises(asyncio.CancelledError):
+            await fresh
+        return run.cancel(), run.running
+    
+    assert asyncio.run(scenario()) == (False, False)
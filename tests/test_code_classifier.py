@@ -0,0 +1,68 @@
+import pytest
+
+import ds
+from sample_emails import build_corpus
+
+
+@pytest.fixture
+def classifier():
+    return ds.CodeClassifier(ds.DEFAULT_CODE_PATTERNS)
+
+
+@pytest.mark.parametrize("text, code, locale, rule", [
+    ("Hi,\n\nYour verification code is 123456.", "123456", "en", "labelled_code"),
+    ("Use this code: 654321 to finish signing in.", "654321", "en", "use_code"),
+    ("ENTER THIS CODE 111222 on the login page.", "111222", "en", "enter_code"),
+    ("Ciao, codice di verifica: 987654", "987654", "it", "codice"),
+    ("إليك رمز تسجيل الدخول: 246810", "246810", "ar", "login_code"),
+])
+def test_match_code_reports_code_locale_and_rule(classifier, text, code, locale, rule):
+    assert classifier.match_code(text) == {'code': code, 'locale': locale, 'rule': rule}
+
+
+def test_match_code_ignores_unlabelled_numbers(classifier):
+    assert classifier.match_code("Order number 123456 has shipped.") is None
+    assert classifier.match_code("Your code is 12345.") is None
+    assert classifier.match_code("") is None
+    assert classifier.match_code(None) is None
+
+
+def test_match_code_only_searches_near_a_six_digit_anchor(classifier):
+    far = "Your verification code is " + "x" * (classifier.context + 10) + " ref 123456"
+    assert classifier.match_code(far) is None
+    
+    near = "Your verification code is 123456" + " filler" * 100
+    assert classifier.match_code(near)['code'] == "123456"
+
+
+def test_sender_and_exclude_rules(classifier):
+    assert classifier.match_sender("From: Riot Games <noreply@riotgames.com>") == "riot_games"
+    assert classifier.match_sender("From: Valve <noreply@steampowered.com>") is None
+    assert classifier.match_exclude("Subject: Monitor is DOWN") == "monitor_up_down"
+    assert classifier.match_exclude("Subject: Your verification code") is None
+    assert classifier.match_sender(None) is None
+
+
+def test_patterns_without_a_capture_group_are_rejected():
+    with pytest.raises(ValueError, match="xx/bad"):
+        ds.CodeClassifier({'codes': {'xx': {'bad': r"code \d{6}"}}})
+
+
+def test_custom_anchor_and_locales():
+    classifier = ds.CodeClassifier({
+        'anchor': r"[A-Z0-9]{8}",
+        'codes': {'de': {'code': r"bestätigungscode[:\s]*([A-Z0-9]{8})"}},
+    })
+    assert classifier.locales == ['de']
+    assert classifier.match_code("Ihr Bestätigungscode: AB12CD34") == {'code': "AB12CD34", 'locale': "de", 'rule': "code"}
+
+
+def test_sample_corpus_is_classified_exactly(classifier):
+    for sample in build_corpus(size=400, seed=7):
+        text = f"From: {sample['sender']}\nSubject: {sample['subject']}\n{sample['body']}"
+        if not classifier.match_sender(text) or classifier.match_exclude(text):
+            code = None
+        else:
+            match = classifier.match_code(sample['body']) or classifier.match_code(sample['subject'])
+            code = match['code'] if match else None
+        assert code == sample['expected_code'], sample['subject']
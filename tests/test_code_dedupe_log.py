@@ -0,0 +1,92 @@
+import asyncio
+import time
+
+import ds
+
+
+class FakeClock:
+    
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def make_log(tmp_path, monkeypatch, window_minutes=10):
+    clock = FakeClock(1_000_000.0)
+    monkeypatch.setattr(ds.time, "time", clock)
+    return ds.CodeDedupeLog(ds.StateDB(str(tmp_path / "state.db")), window_minutes), clock
+
+
+def test_codes_and_uids_are_seen_inside_the_window(tmp_path, monkeypatch):
+    log, clock = make_log(tmp_path, monkeypatch)
+    log.add("123456", uid=42)
+    
+    clock.now += 599
+    assert log.seen("123456")
+    assert log.seen("654321", uid=42)
+    assert not log.seen("654321", uid=43)
+    assert len(log) == 1
+
+
+def test_entries_expire_after_the_window(tmp_path, monkeypatch):
+    log, clock = make_log(tmp_path, monkeypatch)
+    log.add("111111", uid=1)
+    clock.now += 300
+    log.add("222222", uid=2)
+    
+    clock.now += 301
+    assert not log.seen("111111")
+    assert not log.seen("000000", uid=1)
+    assert log.seen("222222")
+    assert len(log) == 1
+    
+    clock.now += 300
+    assert not log.seen("222222")
+    assert len(log) == 0
+
+
+def test_a_repeated_code_stays_seen_until_its_latest_entry_expires(tmp_path, monkeypatch):
+    log, clock = make_log(tmp_path, monkeypatch)
+    log.add("123456", uid=1)
+    clock.now += 300
+    log.add("123456", uid=2)
+    
+    clock.now += 301
+    assert log.seen("123456")
+    clock.now += 300
+    assert not log.seen("123456")
+
+
+def test_compaction_prunes_the_db_once_enough_entries_expire(tmp_path, monkeypatch):
+    log, clock = make_log(tmp_path, monkeypatch)
+    monkeypatch.setattr(ds.CodeDedupeLog, "COMPACT_THRESHOLD", 3)
+    for i in range(3):
+        log.add(f"{i:06d}")
+    clock.now += 601
+    log.add("999999")
+    
+    assert log._stale_lines == 0
+    assert log.db._pending[-1] == (ds.StateDB.CODE_PRUNE, (clock.now - 600,))
+
+
+def test_load_skips_entries_outside_the_window(tmp_path):
+    async def scenario():
+        db = ds.StateDB(str(tmp_path / "state.db"))
+        await db.open()
+        now = time.time()
+        db.queue(ds.StateDB.CODE_INSERT, ("111111", "1", None, now - 3600))
+        db.queue(ds.StateDB.CODE_INSERT, ("222222", "2", None, now - 60))
+        await db.commit()
+        
+        log = ds.CodeDedupeLog(db, 10)
+        await log.load()
+        await db.close()
+        return log
+    
+    log = asyncio.run(scenario())
+    assert len(log) == 1
+    assert log.seen("222222")
+    assert not log.seen("111111")
+    assert not log.seen("000000", uid=1)
@@ -0,0 +1,219 @@
+import asyncio
+
+import pytest
+
+import ds
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+async def reap_soon(monitor, delay=0.01):
+    await asyncio.sleep(delay)
+    return monitor.reap()
+
+
+def test_completed_unit_returns_its_result_and_beats():
+    async def scenario():
+        monitor = ds.HeartbeatMonitor({"render": 30})
+        
+        async def work(value):
+            assert [u['label'] for u in monitor.in_flight("render")] == ["card"]
+            return value * 2
+        
+        result = await monitor.run("render", "card", work, 21)
+        return result, monitor.units, monitor.age("render"), monitor.stage_time["render"].summary()['count']
+    
+    result, units, age, samples = asyncio.run(scenario())
+    assert result == 42
+    assert units == {}
+    assert 0 <= age < 1
+    assert samples == 1
+
+
+def test_unit_errors_propagate_without_a_heartbeat():
+    async def scenario():
+        monitor = ds.HeartbeatMonitor({})
+        
+        async def work():
+            raise ValueError("broken")
+        
+        with pytest.raises(ValueError, match="broken"):
+            await monitor.run("http", "fetch", work, retries=2)
+        return monitor.age("http"), monitor.units
+    
+    assert asyncio.run(scenario()) == (None, {})
+
+
+def test_reaped_unit_is_retried():
+    async def scenario():
+        monitor = ds.HeartbeatMonitor({"http": 0})
+        stalls = []
+        attempts = []
+        
+        async def work():
+            attempts.append(len(attempts) + 1)
+            if len(attempts) == 1:
+                await asyncio.sleep(60)
+            return "ok"
+        
+        reaper = asyncio.ensure_future(reap_soon(monitor))
+        result = await monitor.run("http", "fetch", work, retries=1, on_stall=lambda: stalls.append("stalled"))
+        return result, attempts, stalls, await reaper, monitor.stall_count
+    
+    result, attempts, stalls, reaped, stall_count = asyncio.run(scenario())
+    assert result == "ok"
+    assert attempts == [1, 2]
+    assert stalls == ["stalled"]
+    assert [(e['stage'], e['label'], e['attempt']) for e in reaped] == [("http", "fetch", 1)]
+    assert stall_count == 1
+
+
+def test_exhausted_retries_raise_timeout_error():
+    async def scenario():
+        monitor = ds.HeartbeatMonitor({"publish": 0})
+        
+        async def work():
+            await asyncio.sleep(60)
+        
+        async def reaper():
+            while True:
+                await asyncio.sleep(0.01)
+                monitor.reap()
+        
+        reaping = asyncio.ensure_future(reaper())
+        try:
+            with pytest.raises(asyncio.TimeoutError, match="2 attempt"):
+                await monitor.run("publish", "slot 1", work, retries=1)
+        finally:
+            reaping.cancel()
+        return monitor.stall_count, monitor.units, monitor.age("publish")
+    
+    assert asyncio.run(scenario()) == (2, {}, None)
+
+
+def test_unit_that_cancels_itself_is_not_retried():
+    async def scenario():
+        monitor = ds.HeartbeatMonitor({})
+        attempts = []
+        
+        async def work():
+            attempts.append(1)
+            raise asyncio.CancelledError()
+        
+        with pytest.raises(asyncio.CancelledError):
+            await monitor.run("http", "fetch", work, retries=3)
+        return attempts, monitor.stall_count
+    
+    assert asyncio.run(scenario()) == ([1], 0)
+
+
+def test_cancelling_the_caller_cancels_the_unit():
+    async def scenario():
+        monitor = ds.HeartbeatMonitor({})
+        started = asyncio.Event()
+        unit_cancelled = asyncio.Event()
+        
+        async def work():
+            started.set()
+            try:
+                await asyncio.sleep(60)
+            except asyncio.CancelledError:
+                unit_cancelled.set()
+                raise
+        
+        caller = asyncio.ensure_future(monitor.run("http", "fetch", work, retries=3))
+        await started.wait()
+        caller.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await caller
+        await settle()
+        return unit_cancelled.is_set(), monitor.units, monitor.stall_count
+    
+    assert asyncio.run(scenario()) == (True, {}, 0)
+
+
+def test_nested_unit_stall_surfaces_as_timeout_in_the_outer_unit():
+    async def scenario():
+        monitor = ds.HeartbeatMonitor({"cycle": 30, "http": 0})
+        
+        async def fetch():
+            await asyncio.sleep(60)
+        
+        async def cycle():
+            try:
+                await monitor.run("http", "fetch", fetch)
+            except asyncio.TimeoutError:
+                return "fetch timed out"
+        
+        reaper = asyncio.ensure_future(reap_soon(monitor))
+        result = await monitor.run("cycle", "full update", cycle)
+        return result, [e['stage'] for e in await reaper], monitor.age("cycle") is not None
+    
+    assert asyncio.run(scenario()) == ("fetch timed out", ["http"], True)
+
+
+def test_cancelling_the_outer_unit_cancels_nested_units():
+    async def scenario():
+        monitor = ds.HeartbeatMonitor({})
+        started = asyncio.Event()
+        
+        async def fetch():
+            started.set()
+            await asyncio.sleep(60)
+        
+        async def cycle():
+            return await monitor.run("http", "fetch", fetch, retries=2)
+        
+        caller = asyncio.ensure_future(monitor.run("cycle", "full update", cycle))
+        await started.wait()
+        inner = monitor.in_flight("http")[0]['task']
+        caller.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await caller
+        await settle()
+        return inner.cancelled(), monitor.units
+    
+    assert asyncio.run(scenario()) == (True, {})
+
+
+def test_expire_reaps_only_the_matching_unit():
+    async def scenario():
+        monitor = ds.HeartbeatMonitor({"http": 30})
+        
+        async def work():
+            await asyncio.sleep(60)
+        
+        stuck = asyncio.ensure_future(monitor.run("http", "stuck", work))
+        healthy = asyncio.ensure_future(monitor.run("http", "healthy", work))
+        await settle()
+        reaped = monitor.expire("stuck")
+        with pytest.raises(asyncio.TimeoutError):
+            await stuck
+        remaining = [u['label'] for u in monitor.in_flight()]
+        healthy.cancel()
+        await asyncio.gather(healthy, return_exceptions=True)
+        return [e['label'] for e in reaped], remaining, monitor.reap()
+    
+    assert asyncio.run(scenario()) == (["stuck"], ["healthy"], [])
+
+
+def test_stall_handler_errors_do_not_stop_the_reaper():
+    async def scenario():
+        monitor = ds.HeartbeatMonitor({"http": 0})
+        
+        async def work():
+            await asyncio.sleep(60)
+        
+        def on_stall():
+            raise RuntimeError("handler failed")
+        
+        unit = asyncio.ensure_future(monitor.run("http", "fetch", work, on_stall=on_stall))
+        reaped = await reap_soon(monitor)
+        with pytest.raises(asyncio.TimeoutError):
+            await unit
+        return len(reaped), len(monitor.stalls)
+    
+    assert asyncio.run(scenario()) == (1, 1)
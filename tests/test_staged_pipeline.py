@@ -0,0 +1,89 @@
+import asyncio
+
+import ds
+
+
+def run_pipeline(pipeline, items, context=None):
+    return asyncio.run(pipeline.run(items, context))
+
+
+def test_items_flow_through_every_stage():
+    async def double(item, context):
+        return item * 2
+    
+    async def label(item, context):
+        return f"{context}-{item}"
+    
+    pipeline = ds.StagedPipeline("test", [("double", double, 1), ("label", label, 1)])
+    assert run_pipeline(pipeline, range(5), "x") == ["x-0", "x-2", "x-4", "x-6", "x-8"]
+    assert pipeline.last_run["double"]['count'] == 5
+    assert pipeline.last_run["label"]['count'] == 5
+    assert pipeline.busy_time["label"].summary()['count'] == 5
+    assert "double×1" in pipeline.describe()
+
+
+def test_none_and_errors_drop_the_item():
+    async def filter_odd(item, context):
+        if item == 3:
+            raise ValueError("bad item")
+        return item if item % 2 == 0 else None
+    
+    async def keep(item, context):
+        return item
+    
+    pipeline = ds.StagedPipeline("test", [("filter", filter_odd, 2), ("keep", keep, 1)])
+    assert sorted(run_pipeline(pipeline, range(7))) == [0, 2, 4, 6]
+    assert pipeline.last_run["keep"]['count'] == 4
+
+
+def test_concurrent_workers_overlap_slow_stages():
+    active = 0
+    peak = 0
+    
+    async def slow(item, context):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.02)
+        active -= 1
+        return item
+    
+    pipeline = ds.StagedPipeline("test", [("slow", slow, 3)], queue_size=2)
+    assert sorted(run_pipeline(pipeline, range(9))) == list(range(9))
+    assert peak == 3
+
+
+def test_batched_stage_receives_lists_up_to_the_batch_size():
+    batches = []
+    
+    async def fetch(item, context):
+        return None if item == 3 else item
+    
+    async def publish(batch, context):
+        batches.append(batch)
+        return [item * 10 for item in batch]
+    
+    pipeline = ds.StagedPipeline("test", [("fetch", fetch, 1), ("publish", publish, 1)], batch_sizes={"publish": 3})
+    assert run_pipeline(pipeline, range(8)) == [0, 10, 20, 40, 50, 60, 70]
+    assert all(1 <= len(batch) <= 3 for batch in batches)
+    assert [item for batch in batches for item in batch] == [0, 1, 2, 4, 5, 6, 7]
+    assert pipeline.last_run["publish"]['count'] == 7
+
+
+def test_failed_batch_is_dropped_without_stopping_the_run():
+    async def publish(batch, context):
+        if 0 in batch:
+            raise RuntimeError("publish failed")
+        return batch
+    
+    pipeline = ds.StagedPipeline("test", [("publish", publish, 1)], batch_sizes={"publish": 2})
+    assert run_pipeline(pipeline, range(5)) == [2, 3, 4]
+
+
+def test_empty_input_finishes():
+    async def keep(item, context):
+        return item
+    
+    pipeline = ds.StagedPipeline("test", [("a", keep, 2), ("b", keep, 1)], batch_sizes={"b": 4})
+    assert run_pipeline(pipeline, []) == []
+    assert pipeline.describe().startswith("0.0s wall")
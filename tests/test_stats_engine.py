@@ -0,0 +1,103 @@
+import asyncio
+
+import ds
+
+
+def make_record(puuid, match_id, result, start, rr_change=None, agent="Jett", competitive=True):
+    return {
+        'puuid': puuid, 'match_id': match_id, 'result': result, 'game_start': start,
+        'rr_change': rr_change, 'agent': agent, 'competitive': competitive,
+    }
+
+
+def make_engine(tmp_path):
+    return ds.StatsEngine(ds.StateDB(str(tmp_path / "state.db")))
+
+
+def test_streaks_follow_game_start_order(tmp_path):
+    engine = make_engine(tmp_path)
+    for i, result in reversed(list(enumerate("WWLWWWL"))):
+        engine.add_match(make_record("a", f"m{i}", result, 100 + i))
+    engine.add_match(make_record("a", "m7", "W", 107))
+    
+    stats = engine.compute()["a"]
+    assert stats['games'] == 8
+    assert stats['wins'] == 6
+    assert stats['losses'] == 2
+    assert stats['win_rate'] == 75.0
+    assert stats['current_streak'] == 1
+    assert stats['best_win_streak'] == 3
+
+
+def test_losing_streak_is_negative_and_accounts_are_independent(tmp_path):
+    engine = make_engine(tmp_path)
+    for i, result in enumerate("WLL"):
+        engine.add_match(make_record("a", f"a{i}", result, i))
+    for i, result in enumerate("LWWD"):
+        engine.add_match(make_record("b", f"b{i}", result, i))
+    
+    stats = engine.compute()
+    assert stats["a"]['current_streak'] == -2
+    assert stats["a"]['best_win_streak'] == 1
+    assert stats["b"]['current_streak'] == 0
+    assert stats["b"]['best_win_streak'] == 2
+    assert round(stats["b"]['win_rate'], 2) == 66.67
+
+
+def test_average_rr_only_counts_known_competitive_changes(tmp_path):
+    engine = make_engine(tmp_path)
+    engine.add_match(make_record("a", "m0", "W", 0, rr_change=20))
+    engine.add_match(make_record("a", "m1", "L", 1, rr_change=-14))
+    engine.add_match(make_record("a", "m2", "W", 2, rr_change=None))
+    engine.add_match(make_record("a", "m3", "W", 3, rr_change=0))
+    engine.add_match(make_record("a", "m4", "W", 4, rr_change=50, competitive=False))
+    
+    assert engine.compute()["a"]['avg_rr'] == 2.0
+
+
+def test_top_agent_and_duplicates(tmp_path):
+    engine = make_engine(tmp_path)
+    assert engine.add_match(make_record("a", "m0", "W", 0, agent="Sova"))
+    assert engine.add_match(make_record("a", "m1", "W", 1, agent="Jett"))
+    assert engine.add_match(make_record("a", "m2", "L", 2, agent="Sova"))
+    assert not engine.add_match(make_record("a", "m2", "L", 2, agent="Sova"))
+    assert not engine.add_match(make_record(None, "m3", "W", 3))
+    
+    stats = engine.compute()["a"]
+    assert len(engine) == 3
+    assert stats['top_agent'] == "Sova"
+    assert stats['top_agent_games'] == 2
+
+
+def test_compute_is_cached_until_a_new_match(tmp_path):
+    engine = make_engine(tmp_path)
+    assert engine.compute() == {}
+    
+    engine.add_match(make_record("a", "m0", "W", 0))
+    first = engine.compute()
+    assert engine.compute() is first
+    
+    engine.add_match(make_record("a", "m1", "W", 1))
+    assert engine.compute() is not first
+    assert engine.compute()["a"]['current_streak'] == 2
+
+
+def test_load_restores_committed_matches(tmp_path):
+    async def scenario():
+        db = ds.StateDB(str(tmp_path / "state.db"))
+        await db.open()
+        writer = ds.StatsEngine(db)
+        writer.add_match(make_record("a", "m1", "L", 2, rr_change=-10))
+        writer.add_match(make_record("a", "m0", "W", 1, rr_change=30))
+        await db.commit()
+        
+        reader = ds.StatsEngine(db)
+        await reader.load()
+        await db.close()
+        return reader
+    
+    reader = asyncio.run(scenario())
+    stats = reader.compute()["a"]
+    assert len(reader) == 2
+    assert stats['avg_rr'] == 10.0
+    assert stats['current_streak'] == -1
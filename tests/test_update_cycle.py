@@ -0,0 +1,71 @@
+import asyncio
+
+import ds
+
+
+def make_users(count):
+    return [{'puuid': f"p{i}", 'name': f"Player{i}#EUW", 'login': f"login{i}", 'password': f"pw{i}"} for i in range(count)]
+
+
+def make_bot(monkeypatch, users, failing=()):
+    monkeypatch.setattr(ds, "USERS", users)
+    monkeypatch.setattr(ds, "USERS_INDEX", {u['puuid']: i for i, u in enumerate(users)})
+    monkeypatch.setattr(ds, "PIPELINE_SETTINGS", {'fetch_delay': 0})
+    bot = ds.ValorantBot()
+    publishes = []
+    
+    async def fetch_account(user, active_bans):
+        user_data = user.copy()
+        user_data.update({
+            'rank_name': 'UNRANKED', 'elo': 0, 'ranking_in_tier': 0, 'current_tier': 0,
+            'rank_icon_cache': None, 'rank_icon_lb': None, 'agent_img_cache': None, 'data_signature': (user['puuid'],),
+        })
+        return user_data
+    
+    async def render_card(user_data, ban_text=None):
+        if user_data['puuid'] in failing:
+            raise RuntimeError("render failed")
+        await asyncio.sleep(0.001 * (len(users) - int(user_data['puuid'][1:])))
+        return b"png"
+    
+    async def publish_slots(fetched_users, active_bans):
+        publishes.append([u['puuid'] for u in fetched_users])
+        return 0, len(fetched_users)
+    
+    async def flush_persistence():
+        pass
+    
+    monkeypatch.setattr(bot, "fetch_account", fetch_account)
+    monkeypatch.setattr(bot, "render_card", render_card)
+    monkeypatch.setattr(bot, "publish_slots", publish_slots)
+    monkeypatch.setattr(bot, "flush_persistence", flush_persistence)
+    monkeypatch.setattr(bot, "save_snapshot", lambda: None)
+    return bot, publishes
+
+
+def test_failed_render_keeps_the_account_in_its_slot(monkeypatch):
+    users = make_users(5)
+    bot, publishes = make_bot(monkeypatch, users, failing={"p4"})
+    
+    assert asyncio.run(bot.run_update_cycle())
+    assert publishes[-1] == ["p0", "p1", "p2", "p3", "p4"]
+    assert [u['puuid'] for u in bot.users_data_cache] == ["p0", "p1", "p2", "p3", "p4"]
+
+
+def test_tied_accounts_keep_the_same_slots_across_publishes(monkeypatch):
+    users = make_users(3)
+    bot, publishes = make_bot(monkeypatch, users)
+    
+    assert asyncio.run(bot.run_update_cycle())
+    assert publishes == [["p0", "p1", "p2"], ["p0", "p1", "p2"]]
+
+
+def test_rank_sort_key_breaks_ties_by_config_order(monkeypatch):
+    monkeypatch.setattr(ds, "USERS_INDEX", {"a": 0, "b": 1, "c": 2})
+    users = [
+        {'puuid': "c", 'current_tier': 0},
+        {'puuid': "b", 'current_tier': 12, 'ranking_in_tier': 40},
+        {'puuid': "a", 'current_tier': 0},
+        {'puuid': "x", 'current_tier': 0},
+    ]
+    assert [u['puuid'] for u in sorted(users, key=ds.rank_sort_key, reverse=True)] == ["b", "a", "c", "x"]